@@ -3,103 +3,395 @@ Agent IA de Décision pour l'Amélioration de l'OEE - TECPAP
 Application principale Flask
 """
 
-from flask import Flask, render_template, jsonify, request
-from datetime import datetime, timedelta
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
+from datetime import datetime
+import json
 import os
-import pandas as pd
-from models.predictor import OEEPredictor
-from models.recommender import LineRecommender
-from models.anomaly_expert import AnomalyExpert
-from models.speed_optimizer import SpeedOptimizer
-from models.agent_brain import AgentBrain
-from data.data_loader import DataLoader
+import threading
+import time
+import uuid
 from data.products_catalog import get_all_products
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'tecpap-innovation-oee-2026'
 
-# Initialisation des composants
-data_loader = DataLoader()
-oee_predictor = OEEPredictor()
-line_recommender = LineRecommender()
-anomaly_expert = AnomalyExpert()
-speed_optimizer = SpeedOptimizer()
-agent_brain = AgentBrain(oee_predictor, line_recommender, anomaly_expert, speed_optimizer)
+# Initialisation paresseuse : chaque composant (et ses imports pandas/scikit-learn)
+# n'est construit qu'au premier appel qui en a besoin. Sur Vercel, la page d'accueil
+# et le catalogue répondent donc immédiatement après un démarrage à froid.
 
-# Initialisation différée pour Vercel
-system_initialized = False
+def _create_data_store():
+    from data.data_store import get_data_store
+    store = get_data_store()
+    if not store.ensure_loaded():
+        raise RuntimeError("Données Evocon indisponibles")
+    return store
+
+def _create_predictor():
+    from models.predictor import OEEPredictor
+    predictor = OEEPredictor()
+    if not predictor._load_model():
+        predictor.train()
+    interval = os.environ.get('TECPAP_RETRAIN_INTERVAL')
+    if interval:
+        global retrain_scheduler
+        from models.retrain_scheduler import RetrainScheduler
+        retrain_scheduler = RetrainScheduler(predictor, interval=int(interval)).start()
+    return predictor
+
+def _create_recommender():
+    from models.recommender import LineRecommender
+    recommender = LineRecommender()
+    recommender.initialize(get_predictor())
+    return recommender
+
+def _create_anomaly_expert():
+    from models.anomaly_expert import AnomalyExpert
+    expert = AnomalyExpert()
+    expert.load_knowledge_base()
+    return expert
+
+def _create_speed_optimizer():
+    from models.speed_optimizer import SpeedOptimizer
+    optimizer = SpeedOptimizer()
+    optimizer.ensure_trained(get_data_store().loader)
+    return optimizer
+
+def _create_production_analytics():
+    from models.production_analytics import ProductionAnalytics
+    return ProductionAnalytics().build(get_data_store())
+
+def _create_agent_brain():
+    from models.agent_brain import AgentBrain
+    from models.session_memory import create_session_memory
+    from models.intent_router import IntentRouter
+    return AgentBrain(get_predictor, get_recommender, get_anomaly_expert, get_speed_optimizer, get_production_analytics,
+                      memory=create_session_memory(), router=IntentRouter.from_store(get_data_store()),
+                      data_version=lambda: get_data_store().version)
+
+_FACTORIES = {
+    'data_store': _create_data_store,
+    'predictor': _create_predictor,
+    'recommender': _create_recommender,
+    'anomaly_expert': _create_anomaly_expert,
+    'speed_optimizer': _create_speed_optimizer,
+    'production_analytics': _create_production_analytics,
+    'agent_brain': _create_agent_brain
+}
+_components = {}
+_init_times = {}
+retrain_scheduler = None
+_component_locks = {name: threading.Lock() for name in _FACTORIES}
+
+def _component(name):
+    component = _components.get(name)
+    if component is None:
+        with _component_locks[name]:
+            component = _components.get(name)
+            if component is None:
+                start = time.perf_counter()
+                component = _FACTORIES[name]()
+                _init_times[name] = round(time.perf_counter() - start, 3)
+                _components[name] = component
+    return component
+
+def get_data_store(): return _component('data_store')
+def get_predictor(): return _component('predictor')
+def get_recommender(): return _component('recommender')
+def get_anomaly_expert(): return _component('anomaly_expert')
+def get_speed_optimizer(): return _component('speed_optimizer')
+def get_production_analytics(): return _component('production_analytics').build(get_data_store())
+def get_agent_brain(): return _component('agent_brain')
 
 def initialize_system():
-    global system_initialized
-    if system_initialized:
-        return True
-    
+    """Initialise tous les composants (préchauffage complet)"""
     print("Initialisation de l'Agent IA TECPAP...")
-    # Charger les données et entraîner les modèles
-    # Note: Sur Vercel, ceci s'exécutera à chaque démarrage à froid
-    if data_loader.load_data():
-        if not oee_predictor._load_model():
-            oee_predictor.train()
-        line_recommender.initialize()
-        anomaly_expert.load_knowledge_base()
-        speed_optimizer.train(data_loader.get_data_for_training())
-        print("Système opérationnel!")
-        system_initialized = True
-        return True
-    return False
-
-# Pour Vercel, on peut initialiser au chargement du module
-# ou à la première requête. Ici, on garde l'initialisation au chargement
-# mais protégée.
-initialize_system()
+    try:
+        for name in _FACTORIES:
+            _component(name)
+    except Exception as e:
+        print(f"Erreur lors de l'initialisation: {e}")
+        return False
+    print("Système opérationnel!")
+    return True
+
+def start_warmup():
+    """Préchauffe les composants dans un thread d'arrière-plan sans bloquer le serveur"""
+    thread = threading.Thread(target=initialize_system, name='tecpap-warmup', daemon=True)
+    thread.start()
+    return thread
+
+# Les processus d'entraînement ('spawn') réimportent ce module sous le nom __mp_main__
+if os.environ.get('TECPAP_WARMUP') == '1' and __name__ != '__mp_main__':
+    start_warmup()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def _dashboard_payload():
+    store = get_data_store()
+    store.ensure_loaded()
+    return {
+        'current': store.loader.get_current_metrics(),
+        'predictions': get_predictor().predict_next_days(days=7),
+        'recommendation': get_recommender().get_best_line(),
+        'alerts': get_anomaly_expert().active_alerts,
+        'timestamp': datetime.now().isoformat()
+    }
+
+def _dashboard_version():
+    predictor = _components.get('predictor')
+    return get_data_store().version, predictor.model_version if predictor is not None else None
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+_ingestion = None
+_ingestion_lock = threading.Lock()
+
+def _apply_ingested(kind, df):
+    """Propage un lot validé aux composants déjà initialisés (sans en forcer le chargement)"""
+    version = get_data_store().apply_ingested(kind, df)
+    analytics = _components.get('production_analytics')
+    if analytics is not None:
+        analytics.ingest(kind, df, version, get_data_store())
+    if kind == 'oee':
+        predictor = _components.get('predictor')
+        if predictor is not None:
+            predictor.forecast_cache.clear()
+        expert = _components.get('anomaly_expert')
+        if expert is not None:
+            expert.observe(df)
+
+def get_ingestion_pipeline():
+    global _ingestion
+    if _ingestion is None:
+        with _ingestion_lock:
+            if _ingestion is None:
+                from data.ingestion import IngestionPipeline
+                _ingestion = IngestionPipeline(get_data_store().loader.ingest_store, _apply_ingested)
+    return _ingestion
+
+def get_dashboard_broadcaster():
+    global _broadcaster
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                from models.dashboard_broadcaster import DashboardBroadcaster
+                _broadcaster = DashboardBroadcaster(_dashboard_payload, version=_dashboard_version)
+    return _broadcaster
+
 @app.route('/api/dashboard')
 def get_dashboard_data():
-    return jsonify({
-        'current': data_loader.get_current_metrics(),
-        'predictions': oee_predictor.predict_next_days(days=7),
-        'recommendation': line_recommender.get_best_line(),
-        'alerts': anomaly_expert.active_alerts,
-        'timestamp': datetime.now().isoformat()
-    })
+    return jsonify(_dashboard_payload())
+
+@app.route('/api/stream')
+def stream_dashboard():
+    """Flux SSE : événement `snapshot` (état complet) puis `delta` ({merge, replace}) à chaque changement"""
+    return Response(stream_with_context(get_dashboard_broadcaster().subscribe()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/recommend')
 def recommend_line():
     product_type = request.args.get('product_type', 'Fond_Plat')
     quantity = int(request.args.get('quantity', 1000))
-    return jsonify(line_recommender.recommend(product_type, quantity))
+    return jsonify(get_recommender().recommend(product_type, quantity))
 
 @app.route('/api/anomalies')
 def get_anomalies():
     period = int(request.args.get('period', 30))
-    return jsonify({'anomalies': anomaly_expert.get_recent_anomalies(period)})
+    limit = request.args.get('limit', type=int)
+    try:
+        return jsonify(get_anomaly_expert().page_recent_anomalies(
+            period, limit=limit, cursor=request.args.get('cursor'), layout=request.args.get('layout', 'records')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/anomalies', methods=['POST'])
+def add_anomaly():
+    try:
+        anomaly = get_anomaly_expert().add_anomaly(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'anomaly': anomaly}), 201
 
 @app.route('/api/anomaly/similar', methods=['POST'])
 def find_similar():
     data = request.json
-    return jsonify({'similar_cases': anomaly_expert.find_similar(data.get('description', ''))})
+    return jsonify({'similar_cases': get_anomaly_expert().find_similar(data.get('description', ''))})
+
+@app.route('/api/alerts')
+def get_alerts():
+    """Alertes KPI ouvertes, éventuellement filtrées par ligne"""
+    expert = get_anomaly_expert()
+    return jsonify(expert.monitor.alerts(request.args.get('line', 'all')) if expert.monitor is not None else [])
+
+@app.route('/api/anomaly/index/stats')
+def get_anomaly_index_stats():
+    index = get_anomaly_expert().index
+    return jsonify(index.stats() if index is not None else {})
 
 @app.route('/api/speed/optimize', methods=['POST'])
 def optimize_speed():
-    data = request.json
-    return jsonify(speed_optimizer.find_optimal_speed(data.get('line_id', 'L1'), data.get('product_type', 'Fond_Plat')))
+    data = request.json or {}
+    try:
+        return jsonify(get_speed_optimizer().find_optimal_speed(
+            data.get('line_id', 'L1'), data.get('product_type', 'Fond_Plat'),
+            step=data.get('step', 25), refine=bool(data.get('refine', False))))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/speed/optimize/all')
+def optimize_speed_all():
+    # Chaîne de requête : conversion en entier ici, la validation reste celle de l'optimiseur (_check_step)
+    step = request.args.get('step', '25')
+    try:
+        step = int(step)
+    except ValueError:
+        return jsonify({'error': f"Le pas doit être un entier >= 1: {step}"}), 400
+    try:
+        return jsonify({'optimal_speeds': get_speed_optimizer().optimize_all(step=step)})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/history')
+def export_history():
+    """Historique brut en flux : ?table=oee&line=L1&start=2025-01-01&end=2025-02-01&columns=timestamp,oee&format=ndjson"""
+    from data.history_export import HistoryExport
+    args = request.args
+    columns = [c for c in args.get('columns', '').split(',') if c]
+    try:
+        export = HistoryExport(get_data_store(), args.get('table', 'oee'), line_id=args.get('line', 'all'),
+                               start=args.get('start'), end=args.get('end'), columns=columns,
+                               fmt=args.get('format', 'ndjson'), chunk_rows=args.get('chunk', 5000, type=int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return Response(stream_with_context(iter(export)), mimetype=export.mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={export.filename}'})
+
+def _analytics_args():
+    return request.args.get('line', 'all'), request.args.get('days', 30, type=int)
+
+@app.route('/api/analytics/pareto')
+def analytics_pareto():
+    line_id, days = _analytics_args()
+    try:
+        return jsonify(get_production_analytics().pareto(request.args.get('by', 'stop_type'), line_id, days,
+                                                         top=request.args.get('top', type=int)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/analytics/reliability')
+def analytics_reliability():
+    return jsonify(get_production_analytics().reliability(*_analytics_args()))
+
+@app.route('/api/analytics/defects')
+def analytics_defects():
+    return jsonify(get_production_analytics().defects_by_shift(*_analytics_args()))
+
+@app.route('/api/analytics/availability')
+def analytics_availability():
+    return jsonify(get_production_analytics().availability_losses(*_analytics_args()))
+
+@app.route('/api/ingest/<kind>', methods=['POST'])
+def ingest_records(kind):
+    """Lot d'enregistrements `oee`, `stops` ou `quality` (liste JSON, {records: [...]} ou NDJSON) ; `anomalies` est indexé directement"""
+    from data.ingestion import BackPressureError
+    if request.mimetype == 'application/x-ndjson':
+        records = []
+        for i, line in enumerate(request.get_data(as_text=True).splitlines()):
+            if not line.strip(): continue
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                return jsonify({'error': 'NDJSON invalide', 'accepted': 0, 'rejected': 1,
+                                'errors': [{'row': i, 'error': f"JSON invalide: {e}"}]}), 400
+    else:
+        payload = request.get_json(silent=True)
+        records = payload.get('records', []) if isinstance(payload, dict) else payload
+    if not isinstance(records, list):
+        return jsonify({'error': 'Liste d\'enregistrements attendue'}), 400
+    if kind == 'anomalies':
+        expert = get_anomaly_expert()
+        added, errors = 0, []
+        for i, record in enumerate(records):
+            if not isinstance(record, dict):
+                errors.append({'row': i, 'error': 'Objet JSON attendu'})
+                continue
+            try:
+                expert.add_anomaly(record)
+                added += 1
+            except (ValueError, TypeError) as e:
+                errors.append({'row': i, 'error': str(e)})
+        return jsonify({'accepted': added, 'rejected': len(errors), 'errors': errors[:10]}), 201 if added else 400
+    try:
+        result = get_ingestion_pipeline().submit(kind, records)
+    except BackPressureError as e:
+        response = jsonify({'error': str(e), 'pending': e.pending})
+        response.headers['Retry-After'] = '1'
+        return response, 429
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result), 202 if result['accepted'] or not records else 400
+
+@app.route('/api/ingest/stats')
+def ingest_stats():
+    return jsonify(get_ingestion_pipeline().stats())
 
 @app.route('/api/products')
 def get_products():
     return jsonify({'products': get_all_products()})
 
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    stats = {}
+    if 'predictor' in _components:
+        stats['forecast'] = _components['predictor'].forecast_cache.stats()
+    if 'agent_brain' in _components:
+        stats['chat_memory'] = _components['agent_brain'].memory.stats()
+        stats['agent_tools'] = _components['agent_brain'].tool_cache.stats()
+    if 'anomaly_expert' in _components and _components['anomaly_expert'].monitor is not None:
+        stats['kpi_monitor'] = _components['anomaly_expert'].monitor.stats()
+    if _broadcaster is not None:
+        stats['dashboard_stream'] = _broadcaster.stats()
+    return jsonify(stats)
+
+@app.route('/api/ready')
+def readiness():
+    components = {name: 'ready' if name in _components else 'pending' for name in _FACTORIES}
+    ready = all(state == 'ready' for state in components.values())
+    payload = {'ready': ready, 'components': components, 'init_seconds': _init_times}
+    if retrain_scheduler is not None:
+        payload['retrain'] = retrain_scheduler.status()
+    return jsonify(payload), 200 if ready else 503
+
+SESSION_COOKIE = 'tecpap_session'
+
+def _session_id(params):
+    """Session explicite (`session_id`), sinon cookie du navigateur, sinon nouvelle session"""
+    return str(params.get('session_id') or request.cookies.get(SESSION_COOKIE) or uuid.uuid4().hex)[:64]
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     data = request.json
     query = data.get('query', '')
     if not query:
         return jsonify({'error': 'No query provided'}), 400
-    response = agent_brain.process_query(query)
-    return jsonify(response)
+    session_id = _session_id(data)
+    response = jsonify(dict(get_agent_brain().process_query(query, session_id), session_id=session_id))
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax')
+    return response
+
+@app.route('/api/chat/history')
+def chat_history():
+    session_id = _session_id(request.args)
+    return jsonify({'session_id': session_id, 'history': get_agent_brain().memory.history(session_id)})
+
+@app.route('/api/chat/history', methods=['DELETE'])
+def clear_chat_history():
+    session_id = _session_id(request.args)
+    get_agent_brain().memory.clear(session_id)
+    return jsonify({'session_id': session_id, 'cleared': True})
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,131 @@
+"""
+Cache binaire colonnaire (un fichier .npy par colonne) pour les CSV Evocon générés
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+CACHE_FORMAT_VERSION = 1
+CATEGORICAL_COLUMNS = ('line_id', 'product_type', 'stop_type')
+
+def file_sha1(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def encode_column(series):
+    """Encode une colonne en tableau NumPy brut + descripteur (dates en int64 ns, texte en codes)"""
+    entry = {'name': series.name}
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.values.astype('datetime64[ns]').view('int64')
+        entry['kind'] = 'datetime'
+    elif pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy()
+        entry['kind'] = 'numeric'
+    else:
+        cat = series.astype('category').cat
+        values = cat.codes.to_numpy()
+        entry['kind'] = 'category'
+        entry['categories'] = [str(c) for c in cat.categories]
+    return np.ascontiguousarray(values), entry
+
+def decode_column(values, entry):
+    if entry['kind'] == 'datetime':
+        return pd.Series(values.view('datetime64[ns]'), copy=False)
+    if entry['kind'] == 'category':
+        cat = pd.Categorical.from_codes(values, categories=entry['categories'])
+        return cat if entry['name'] in CATEGORICAL_COLUMNS else cat.astype(object)
+    return values
+
+class ColumnarCache:
+    """Stocke chaque table sous forme de colonnes NumPy mappables en mémoire.
+
+    Les dates sont enregistrées en int64 (ns) et les colonnes texte sous forme de
+    codes de dictionnaire ; le cache est invalidé par la date/taille puis le SHA-1 du CSV source.
+    """
+    def __init__(self, data_path):
+        self.cache_path = os.path.join(data_path, '.cache')
+
+    def _table_dir(self, name):
+        return os.path.join(self.cache_path, name)
+
+    def _read_manifest(self, name):
+        path = os.path.join(self._table_dir(name), 'manifest.json')
+        if not os.path.exists(path): return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if manifest.get('format_version') == CACHE_FORMAT_VERSION else None
+
+    def _write_manifest(self, name, manifest):
+        path = os.path.join(self._table_dir(name), 'manifest.json')
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, path)
+
+    def is_valid(self, name, source_path):
+        """Vérifie le cache : date/taille d'abord (rapide), SHA-1 du source si elles diffèrent"""
+        manifest = self._read_manifest(name)
+        if manifest is None or not os.path.exists(source_path): return False
+        stat = os.stat(source_path)
+        if manifest['source_mtime'] == stat.st_mtime and manifest['source_size'] == stat.st_size:
+            return True
+        if manifest['source_size'] != stat.st_size or manifest['source_sha1'] != file_sha1(source_path):
+            return False
+        # Fichier touché mais contenu identique : on rafraîchit simplement la date
+        manifest['source_mtime'] = stat.st_mtime
+        try:
+            self._write_manifest(name, manifest)
+        except OSError:
+            pass
+        return True
+
+    def source_hash(self, name):
+        manifest = self._read_manifest(name)
+        return manifest['source_sha1'] if manifest else None
+
+    def read(self, name, source_path, mmap=True):
+        """Retourne la table depuis le cache, ou None si celui-ci est absent ou périmé"""
+        if not self.is_valid(name, source_path): return None
+        manifest = self._read_manifest(name)
+        table_dir = os.path.join(self._table_dir(name), manifest['data_dir'])
+        mode = 'r' if mmap else None
+        columns = {}
+        for i, col in enumerate(manifest['columns']):
+            values = np.load(os.path.join(table_dir, f'{i}.npy'), mmap_mode=mode)
+            columns[col['name']] = decode_column(values, col)
+        return pd.DataFrame(columns, copy=False)
+
+    def write(self, name, df, source_path):
+        """Écrit la table dans le cache (écriture atomique via le manifeste)"""
+        source_sha1 = file_sha1(source_path)
+        # Chaque version est écrite dans son propre répertoire : un lecteur qui a déjà
+        # mappé l'ancienne version n'est jamais exposé à un fichier en cours d'écriture.
+        data_dir = f'{source_sha1[:12]}-{os.getpid()}'
+        base_dir = self._table_dir(name)
+        table_dir = os.path.join(base_dir, data_dir)
+        os.makedirs(table_dir, exist_ok=True)
+        columns = []
+        for i, col_name in enumerate(df.columns):
+            values, entry = encode_column(df[col_name])
+            np.save(os.path.join(table_dir, f'{i}.npy'), values)
+            columns.append(entry)
+        stat = os.stat(source_path)
+        self._write_manifest(name, {
+            'format_version': CACHE_FORMAT_VERSION, 'source_mtime': stat.st_mtime,
+            'source_size': stat.st_size, 'source_sha1': source_sha1,
+            'data_dir': data_dir, 'rows': len(df), 'columns': columns
+        })
+        for entry in os.listdir(base_dir):
+            old_dir = os.path.join(base_dir, entry)
+            if entry != data_dir and os.path.isdir(old_dir):
+                shutil.rmtree(old_dir, ignore_errors=True)
@@ -0,0 +1,122 @@
+"""
+Magasin de données partagé (DataStore) pour l'ensemble des modèles TECPAP
+"""
+
+import os
+import threading
+from data.data_loader import DataLoader
+
+class DataStore:
+    """Charge les données Evocon une seule fois par processus et les partage entre tous les modèles.
+
+    Les CSV ne sont relus que si leur date de modification change ; les accès par ligne
+    passent par les index temporels (`time_index`) et l'index KPI glissant du chargeur.
+    """
+    TABLES = {
+        'oee': ('oee_data', 'oee_data.csv'),
+        'stops': ('stops_data', 'stops_data.csv'),
+        'quality': ('quality_data', 'quality_data.csv'),
+        'anomalies': ('anomalies_data', 'anomalies_data.csv')
+    }
+
+    def __init__(self, loader=None):
+        self.loader = loader or DataLoader()
+        self.version = 0
+        self._mtimes = None
+        self._lock = threading.RLock()
+
+    def _current_mtimes(self):
+        mtimes = []
+        for _, filename in self.TABLES.values():
+            path = os.path.join(self.loader.data_path, filename)
+            mtimes.append(os.path.getmtime(path) if os.path.exists(path) else None)
+        return tuple(mtimes)
+
+    def ensure_loaded(self):
+        """Charge les données au premier appel, puis uniquement si un fichier source a changé"""
+        if self._mtimes is not None and self._current_mtimes() == self._mtimes:
+            return True
+        with self._lock:
+            mtimes = self._current_mtimes()
+            if self._mtimes is not None and mtimes == self._mtimes:
+                return True
+            if not self.loader.load_data():
+                return False
+            # La génération éventuelle des CSV modifie les dates : on les relit après chargement
+            self._mtimes = self._current_mtimes()
+            self.version += 1
+            return True
+
+    @property
+    def oee_data(self):
+        self.ensure_loaded()
+        return self.loader.oee_data
+
+    @property
+    def stops_data(self):
+        self.ensure_loaded()
+        return self.loader.stops_data
+
+    @property
+    def quality_data(self):
+        self.ensure_loaded()
+        return self.loader.quality_data
+
+    @property
+    def anomalies_data(self):
+        self.ensure_loaded()
+        return self.loader.anomalies_data
+
+    @property
+    def kpi_index(self):
+        self.ensure_loaded()
+        return self.loader.kpi_index
+
+    @property
+    def lines(self):
+        df = self.oee_data
+        return sorted(df['line_id'].unique().tolist()) if df is not None else []
+
+    def get_table(self, table):
+        if table not in self.TABLES: raise KeyError(f"Table inconnue: {table}")
+        self.ensure_loaded()
+        return getattr(self.loader, self.TABLES[table][0])
+
+    def time_index(self, table):
+        if table not in self.TABLES: raise KeyError(f"Table inconnue: {table}")
+        self.ensure_loaded()
+        return self.loader.time_index(self.TABLES[table][0])
+
+    def snapshot(self, *tables):
+        """Version et tables lues ensemble : aucun lot ingéré ne peut s'intercaler entre les deux"""
+        self.ensure_loaded()
+        with self._lock:
+            return self.version, [getattr(self.loader, self.TABLES[t][0]) for t in tables]
+
+    def indexed_table(self, table):
+        """Table et index temporel lus ensemble : l'index décrit toujours ce DataFrame-là"""
+        if table not in self.TABLES: raise KeyError(f"Table inconnue: {table}")
+        self.ensure_loaded()
+        with self._lock:
+            name = self.TABLES[table][0]
+            return getattr(self.loader, name), self.loader.time_index(name)
+
+    def apply_ingested(self, table, df):
+        """Intègre un lot ingéré sans relire les CSV ; retourne la nouvelle version des données"""
+        self.ensure_loaded()
+        with self._lock:
+            self.loader.append_records(self.TABLES[table][0], df)
+            self.version += 1
+            return self.version
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_data_store():
+    """Retourne le DataStore unique du processus"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DataStore()
+    return _store
@@ -0,0 +1,99 @@
+"""
+Export en flux de l'historique (OEE, arrêts, qualité) par blocs de taille bornée
+"""
+
+import io
+import json
+from data.time_index import serialize_columns, records_from_columns
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+    'csv': 'text/csv; charset=utf-8',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+DEFAULT_CHUNK_ROWS = 5000
+MAX_CHUNK_ROWS = 50000
+
+class HistoryExport:
+    """Sélectionne une plage via l'index temporel puis produit le résultat bloc par bloc.
+
+    Seules les positions de la plage sont matérialisées ; chaque bloc de `chunk_rows` lignes
+    est extrait, sérialisé puis libéré avant le suivant.
+    """
+    def __init__(self, store, table, line_id='all', start=None, end=None, columns=None,
+                 fmt='ndjson', chunk_rows=DEFAULT_CHUNK_ROWS):
+        if fmt not in FORMATS:
+            raise ValueError(f"Format inconnu: {fmt} (disponibles: {', '.join(FORMATS)})")
+        if table not in store.TABLES:
+            raise ValueError(f"Table inconnue: {table} (disponibles: {', '.join(store.TABLES)})")
+        # Table et index lus sous le même verrou : un lot ingéré entre les deux décalerait les positions
+        self.df, index = store.indexed_table(table)
+        if self.df is None:
+            raise ValueError(f"Données indisponibles pour {table}")
+        unknown = [c for c in columns or [] if c not in self.df.columns]
+        if unknown:
+            raise ValueError(f"Colonnes inconnues: {', '.join(unknown)}")
+        if fmt == 'arrow':
+            try:
+                import pyarrow
+            except ImportError:
+                raise ValueError("Le format arrow nécessite pyarrow (pip install pyarrow)")
+        self.table, self.fmt = table, fmt
+        self.columns = list(columns) if columns else list(self.df.columns)
+        self.chunk_rows = max(1, min(int(chunk_rows), MAX_CHUNK_ROWS))
+        self.positions = index.positions(start, end, line_id)
+
+    @property
+    def mimetype(self):
+        return FORMATS[self.fmt]
+
+    @property
+    def filename(self):
+        return f"{self.table}.{self.fmt}"
+
+    def chunks(self):
+        """Blocs de DataFrame (colonnes demandées) dans l'ordre chronologique"""
+        for i in range(0, len(self.positions), self.chunk_rows):
+            yield self.df.iloc[self.positions[i:i + self.chunk_rows]][self.columns]
+
+    def __iter__(self):
+        return getattr(self, f'_iter_{self.fmt}')()
+
+    def _iter_ndjson(self):
+        for chunk in self.chunks():
+            rows = records_from_columns(serialize_columns(chunk))
+            yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+
+    def _iter_json(self):
+        yield '['
+        first = True
+        for chunk in self.chunks():
+            rows = records_from_columns(serialize_columns(chunk))
+            if rows:
+                yield ('' if first else ',') + ','.join(json.dumps(row, ensure_ascii=False) for row in rows)
+                first = False
+        yield ']'
+
+    def _iter_csv(self):
+        header = True
+        for chunk in self.chunks():
+            buffer = io.StringIO()
+            chunk.to_csv(buffer, index=False, header=header, date_format='%Y-%m-%dT%H:%M:%S')
+            header = False
+            yield buffer.getvalue()
+        if header:
+            yield ','.join(self.columns) + '\n'
+
+    def _iter_arrow(self):
+        import pyarrow as pa
+        schema = pa.Schema.from_pandas(self.df[self.columns].iloc[:0], preserve_index=False)
+        sink = io.BytesIO()
+        writer = pa.ipc.new_stream(sink, schema)
+        for chunk in self.chunks():
+            writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+        writer.close()
+        yield sink.getvalue()
@@ -0,0 +1,347 @@
+"""
+Ingestion temps réel d'enregistrements Evocon (OEE horaires, arrêts, qualité) : validation,
+stockage colonnaire en ajout seul, validation par lots avec contre-pression, outil de rejeu des CSV
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+import numpy as np
+import pandas as pd
+from data.columnar_cache import encode_column, decode_column
+
+KPI_RANGE = (0, 100)
+
+# Colonnes par table : dates, texte, numériques, et valeurs par défaut des champs facultatifs
+SCHEMAS = {
+    'oee': {
+        'table': 'oee_data', 'datetime': ['timestamp'], 'text': ['line_id', 'product_type'],
+        'numeric': ['machine_speed', 'oee', 'availability', 'performance', 'quality', 'production_time',
+                    'planned_production_time', 'good_pieces', 'total_pieces'],
+        'bounded': ['oee', 'availability', 'performance', 'quality'],
+        'defaults': {'production_time': 60, 'planned_production_time': 60, 'good_pieces': 0, 'total_pieces': 0}
+    },
+    'stops': {
+        'table': 'stops_data', 'datetime': ['start_time', 'end_time'], 'text': ['line_id', 'machine_id', 'stop_type', 'description', 'operator'],
+        'numeric': ['duration_minutes'], 'bounded': [],
+        'defaults': {'end_time': None, 'description': None, 'operator': '', 'resolved': True}
+    },
+    'quality': {
+        'table': 'quality_data', 'datetime': ['timestamp'], 'text': ['line_id', 'defect_type'],
+        'numeric': ['shift', 'total_produced', 'total_defects', 'defect_rate', 'rework_count', 'scrap_count'],
+        'bounded': ['defect_rate'],
+        'defaults': {'defect_rate': None, 'rework_count': None, 'scrap_count': None}
+    }
+}
+
+class BackPressureError(Exception):
+    """File d'ingestion pleine : le client doit réessayer plus tard"""
+    def __init__(self, pending, limit):
+        super().__init__(f"File d'ingestion pleine ({pending}/{limit} enregistrements en attente)")
+        self.pending = pending
+        self.limit = limit
+
+def validate_records(kind, records, max_errors=10):
+    """Convertit et contrôle un lot ; retourne (DataFrame des lignes valides, nombre rejeté, erreurs)"""
+    if kind not in SCHEMAS:
+        raise ValueError(f"Type d'enregistrement inconnu: {kind} (disponibles: {', '.join(SCHEMAS)})")
+    schema = SCHEMAS[kind]
+    if not isinstance(records, pd.DataFrame):
+        not_dicts = [i for i, r in enumerate(records) if not isinstance(r, dict)]
+        if not_dicts:
+            return pd.DataFrame(), len(records), [{'row': i, 'error': 'Objet JSON attendu'} for i in not_dicts[:max_errors]]
+    df = pd.DataFrame.from_records(records) if not isinstance(records, pd.DataFrame) else records.copy()
+    if df.empty: return df, 0, []
+    required = [c for c in schema['datetime'] + schema['text'] + schema['numeric'] if c not in schema['defaults']]
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        return df.iloc[:0], len(df), [{'row': None, 'error': f"Champs obligatoires manquants: {', '.join(missing)}"}]
+
+    bad = pd.DataFrame(index=df.index)
+    for col in schema['datetime']:
+        if col in df.columns:
+            parsed = naive_datetimes(df[col])
+            bad[col] = parsed.isna() & df[col].notna() if col in schema['defaults'] else parsed.isna()
+            df[col] = parsed
+    for col in schema['numeric']:
+        if col in df.columns:
+            parsed = pd.to_numeric(df[col], errors='coerce')
+            bad[col] = parsed.isna() & df[col].notna() if col in schema['defaults'] else parsed.isna()
+            df[col] = parsed
+    for col in schema['text']:
+        if col in df.columns and col not in schema['defaults']:
+            text = df[col].astype(str).str.strip()
+            bad[col] = df[col].isna() | (text == '')
+            df[col] = text
+    for col in schema['bounded']:
+        if col in df.columns:
+            bad[f'{col}_range'] = (df[col] < KPI_RANGE[0]) | (df[col] > KPI_RANGE[1])
+    invalid = bad.any(axis=1).to_numpy()
+    errors = [{'row': int(i), 'error': f"Valeur invalide: {', '.join(bad.columns[bad.loc[i]])}"}
+              for i in df.index[invalid][:max_errors]]
+    return _fill_defaults(kind, df[~invalid].reset_index(drop=True)), int(invalid.sum()), errors
+
+def _naive(value):
+    try:
+        ts = pd.Timestamp(value)
+    except (ValueError, TypeError):
+        return pd.NaT
+    if ts is pd.NaT or ts.tzinfo is None: return ts
+    return pd.Timestamp(ts.to_pydatetime().astimezone().replace(tzinfo=None))
+
+def naive_datetimes(values):
+    """Dates sans fuseau horaire, comme les données de l'usine : une date avec fuseau est convertie en heure locale"""
+    try:
+        parsed = pd.to_datetime(values, errors='coerce', format='mixed')
+        if parsed.dt.tz is None: return parsed
+    except (ValueError, TypeError):
+        pass  # fuseaux différents d'une ligne à l'autre
+    return pd.to_datetime(pd.Series([_naive(v) for v in values], index=values.index, dtype=object))
+
+def _fill_defaults(kind, df):
+    if df.empty: return df
+    for col, value in SCHEMAS[kind]['defaults'].items():
+        if col not in df.columns:
+            df[col] = value
+    if kind == 'stops':
+        end = pd.to_datetime(df['end_time']) if df['end_time'].notna().any() else pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+        df['end_time'] = end.fillna(df['start_time'] + pd.to_timedelta(df['duration_minutes'], unit='m'))
+        df['description'] = df['description'].fillna(df['stop_type'] + ' sur ' + df['machine_id'])
+        df['resolved'] = df['resolved'].fillna(True).astype(bool)
+    elif kind == 'quality':
+        rate = (df['total_defects'] / df['total_produced'].where(df['total_produced'] > 0) * 100).fillna(0).round(2)
+        df['defect_rate'] = df['defect_rate'].fillna(rate)
+        df['rework_count'] = df['rework_count'].fillna((df['total_defects'] * 0.3).astype(int))
+        df['scrap_count'] = df['scrap_count'].fillna(df['total_defects'] - df['rework_count'])
+    return df
+
+class AppendOnlyStore:
+    """Segments colonnaires immuables (`seg-<n>.npz`) par table, écrits atomiquement.
+
+    Au-delà de `max_segments`, les segments sont compactés en un seul qui reprend le numéro
+    du dernier ; son champ `first_seq` permet d'ignorer les anciens segments si la suppression
+    a été interrompue.
+    """
+    def __init__(self, path, max_segments=64):
+        self.path = path
+        self.max_segments = max_segments
+        self._seq = {}
+
+    def _table_dir(self, table):
+        return os.path.join(self.path, table)
+
+    def _segments(self, table):
+        try:
+            names = os.listdir(self._table_dir(table))
+        except OSError:
+            return []
+        return sorted(int(n[4:-4]) for n in names if n.startswith('seg-') and n.endswith('.npz'))
+
+    def _segment_path(self, table, seq):
+        return os.path.join(self._table_dir(table), f'seg-{seq:08d}.npz')
+
+    def _write(self, table, seq, df, first_seq=None):
+        os.makedirs(self._table_dir(table), exist_ok=True)
+        arrays, columns = {}, []
+        for i, col in enumerate(df.columns):
+            arrays[f'c{i}'], entry = encode_column(df[col])
+            columns.append(entry)
+        meta = {'columns': columns, 'rows': len(df), 'first_seq': first_seq if first_seq is not None else seq}
+        path = self._segment_path(table, seq)
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, path)
+
+    def append(self, table, df):
+        if table not in self._seq:
+            segments = self._segments(table)
+            self._seq[table] = segments[-1] if segments else 0
+        self._seq[table] += 1
+        self._write(table, self._seq[table], df)
+        if len(self._segments(table)) > self.max_segments:
+            self.compact(table)
+        return self._seq[table]
+
+    def _read_segment(self, table, seq):
+        with np.load(self._segment_path(table, seq)) as z:
+            meta = json.loads(str(z['meta']))
+            columns = {c['name']: decode_column(z[f'c{i}'], c) for i, c in enumerate(meta['columns'])}
+        return meta, pd.DataFrame(columns)
+
+    def read(self, table):
+        """Tous les enregistrements ingérés de la table, dans l'ordre d'arrivée (ou None)"""
+        frames, covered = [], None
+        for seq in reversed(self._segments(table)):
+            if covered is not None and seq >= covered: continue
+            meta, df = self._read_segment(table, seq)
+            frames.append(df)
+            covered = meta['first_seq']
+        if not frames: return None
+        return pd.concat(frames[::-1], ignore_index=True)
+
+    def compact(self, table):
+        segments = self._segments(table)
+        if len(segments) < 2: return
+        df = self.read(table)
+        self._write(table, segments[-1], df, first_seq=segments[0])
+        for seq in segments[:-1]:
+            try:
+                os.remove(self._segment_path(table, seq))
+            except OSError:
+                pass
+
+    def stats(self):
+        return {kind: len(self._segments(s['table'])) for kind, s in SCHEMAS.items()}
+
+class IngestionPipeline:
+    """Valide les lots à la réception, les met en file, puis les valide (commit) par gros lots.
+
+    Le nombre d'enregistrements en attente est borné par `max_pending` : au-delà (file non vide), `submit`
+    lève BackPressureError. Un thread unique écrit les segments puis appelle `apply(kind, df)`
+    pour mettre à jour l'état en mémoire, par lots d'au plus `batch_size` lignes ou toutes
+    les `flush_interval` secondes.
+    """
+    def __init__(self, store, apply, max_pending=50000, batch_size=5000, flush_interval=0.5):
+        self.store = store
+        self.apply = apply
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = 0
+        self.committed = {kind: 0 for kind in SCHEMAS}
+        self.rejected = 0
+        self.batches = 0
+        self.last_commit_seconds = None
+        self.last_error = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._thread = None
+
+    def submit(self, kind, records):
+        df, rejected, errors = validate_records(kind, records)
+        with self._lock:
+            self.rejected += rejected
+            if len(df) and self.pending and self.pending + len(df) > self.max_pending:
+                raise BackPressureError(self.pending, self.max_pending)
+            self.pending += len(df)
+        if len(df):
+            self._queue.put((kind, df))
+            self._ensure_started()
+        return {'accepted': len(df), 'rejected': rejected, 'errors': errors, 'pending': self.pending}
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._loop, name='ingestion', daemon=True)
+                    self._thread.start()
+
+    def _drain(self):
+        first = self._queue.get()
+        items, rows = [first], len(first[1])
+        deadline = time.monotonic() + self.flush_interval
+        while rows < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            items.append(item)
+            rows += len(item[1])
+        return items
+
+    def _commit(self, items):
+        start = time.perf_counter()
+        by_kind = {}
+        for kind, df in items:
+            by_kind.setdefault(kind, []).append(df)
+        for kind, frames in by_kind.items():
+            df = pd.concat(frames, ignore_index=True)
+            try:
+                self.store.append(SCHEMAS[kind]['table'], df)
+            except OSError as e:
+                # Stockage en lecture seule : l'état en mémoire reste à jour, sans persistance
+                self.last_error = f"Segment non persisté: {e}"
+                print(f"Ingestion: {self.last_error}")
+            self.apply(kind, df)
+            self.committed[kind] += len(df)
+        self.batches += 1
+        self.last_commit_seconds = round(time.perf_counter() - start, 4)
+
+    def _loop(self):
+        while True:
+            items = self._drain()
+            try:
+                self._commit(items)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Erreur lors de l'ingestion: {e}")
+            finally:
+                with self._lock:
+                    self.pending -= sum(len(df) for _, df in items)
+                    if self.pending == 0:
+                        self._idle.notify_all()
+
+    def flush(self, timeout=None):
+        """Attend que tous les lots soumis soient appliqués"""
+        with self._lock:
+            return self._idle.wait_for(lambda: self.pending == 0, timeout)
+
+    def stats(self):
+        return {
+            'pending': self.pending, 'max_pending': self.max_pending, 'committed': dict(self.committed),
+            'rejected': self.rejected, 'batches': self.batches, 'last_commit_seconds': self.last_commit_seconds,
+            'segments': self.store.stats(), 'last_error': self.last_error
+        }
+
+def replay(url, kind, csv_path, rate=1000, batch=500, shift_to_now=False):
+    """Rejoue un CSV généré vers /api/ingest/<kind> comme un flux en direct (avec respect du 429)"""
+    from urllib import request as urlrequest
+    from urllib.error import HTTPError
+    schema = SCHEMAS[kind]
+    offset = None
+    sent, start = 0, time.monotonic()
+    for chunk in pd.read_csv(csv_path, chunksize=batch):
+        for col in schema['datetime']:
+            if col in chunk.columns:
+                chunk[col] = pd.to_datetime(chunk[col])
+        if shift_to_now:
+            if offset is None:
+                offset = pd.Timestamp.now() - chunk[schema['datetime'][0]].min()
+            for col in schema['datetime']:
+                if col in chunk.columns: chunk[col] = chunk[col] + offset
+        body = chunk.to_json(orient='records', date_format='iso').encode('utf-8')
+        while True:
+            req = urlrequest.Request(f"{url.rstrip('/')}/api/ingest/{kind}", data=body,
+                                     headers={'Content-Type': 'application/json'})
+            try:
+                with urlrequest.urlopen(req) as resp:
+                    json.load(resp)
+                break
+            except HTTPError as e:
+                if e.code != 429: raise
+                time.sleep(float(e.headers.get('Retry-After', 1)))
+        sent += len(chunk)
+        # Limitation du débit : on attend si l'on est en avance sur `rate` enregistrements/s
+        ahead = sent / rate - (time.monotonic() - start) if rate else 0
+        if ahead > 0: time.sleep(ahead)
+    elapsed = time.monotonic() - start
+    print(f"{sent} enregistrements {kind} rejoués en {elapsed:.1f} s ({sent / max(elapsed, 1e-9):.0f}/s)")
+    return sent
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rejoue les CSV Evocon vers l'API d'ingestion")
+    parser.add_argument('kind', choices=list(SCHEMAS))
+    parser.add_argument('--csv', help="fichier source (défaut: data/generated/<table>.csv)")
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--rate', type=float, default=1000, help="enregistrements par seconde (0 = sans limite)")
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--shift-to-now', action='store_true', help="décale les dates pour que le flux commence maintenant")
+    args = parser.parse_args()
+    path = args.csv or os.path.join(os.path.dirname(__file__), 'generated', f"{SCHEMAS[args.kind]['table']}.csv")
+    replay(args.url, args.kind, path, rate=args.rate, batch=args.batch, shift_to_now=args.shift_to_now)
@@ -0,0 +1,133 @@
+"""
+Index d'agrégats KPI glissants par ligne (sommes et sommes de carrés par tranche horaire)
+"""
+
+import numpy as np
+import pandas as pd
+
+KPI_COLUMNS = ('availability', 'performance', 'quality', 'oee')
+WINDOWS = {'1d': 24, '7d': 168, '30d': 720}
+NS_PER_HOUR = 3_600_000_000_000
+
+class RollingKPIIndex:
+    """Agrégats glissants 1 jour / 7 jours / 30 jours par ligne, mis à jour en O(1) par enregistrement.
+
+    Chaque ligne possède un anneau de tranches horaires [nombre, sommes, sommes des carrés] ;
+    les totaux de chaque fenêtre sont ajustés quand une tranche entre ou sort de la fenêtre.
+    Une fenêtre de W heures couvre les tranches [tête - W, tête], comme le filtre
+    `timestamp >= max - timedelta(hours=W)` qu'elle remplace.
+    """
+    def __init__(self, windows=None, kpis=KPI_COLUMNS):
+        self.windows = dict(windows or WINDOWS)
+        self.kpis = tuple(kpis)
+        self.size = max(self.windows.values()) + 1
+        self.head = None
+        self.line_index = {}
+        self._width = 1 + 2 * len(self.kpis)
+        self._slot_hour = np.full(self.size, np.iinfo(np.int64).min, dtype=np.int64)
+        self._buckets = np.zeros((0, self.size, self._width))
+        self._sums = np.zeros((len(self.windows), 0, self._width))
+        self._last = {}
+
+    @property
+    def lines(self):
+        return list(self.line_index.keys())
+
+    def _line(self, line_id):
+        idx = self.line_index.get(line_id)
+        if idx is None:
+            idx = len(self.line_index)
+            self.line_index[line_id] = idx
+            self._buckets = np.concatenate([self._buckets, np.zeros((1, self.size, self._width))])
+            self._sums = np.concatenate([self._sums, np.zeros((len(self.windows), 1, self._width))], axis=1)
+        return idx
+
+    def _vector(self, values):
+        v = np.asarray(values, dtype=float)
+        return np.concatenate(([1.0], v, v * v))
+
+    def _advance(self, hour):
+        """Avance la tête jusqu'à `hour` en retirant des fenêtres les tranches qui en sortent"""
+        if self.head is None or hour - self.head >= self.size:
+            self._buckets[:] = 0
+            self._sums[:] = 0
+            start = hour - self.size + 1
+            hours = np.arange(start, hour + 1, dtype=np.int64)
+            self._slot_hour[hours % self.size] = hours
+            self.head = hour
+            return
+        for h in range(self.head + 1, hour + 1):
+            for w, span in enumerate(self.windows.values()):
+                leaving = h - span - 1
+                slot = leaving % self.size
+                if self._slot_hour[slot] == leaving:
+                    self._sums[w] -= self._buckets[:, slot]
+            slot = h % self.size
+            self._buckets[:, slot] = 0
+            self._slot_hour[slot] = h
+        self.head = hour
+
+    def add(self, line_id, timestamp, values):
+        """Ajoute un enregistrement horaire ; `values` suit l'ordre de `self.kpis`"""
+        ts = pd.Timestamp(timestamp)
+        hour = ts.value // NS_PER_HOUR
+        li = self._line(line_id)
+        if self.head is None or hour > self.head:
+            self._advance(hour)
+        if hour <= self.head - self.size:
+            return False
+        vec = self._vector(values)
+        self._buckets[li, hour % self.size] += vec
+        for w, span in enumerate(self.windows.values()):
+            if hour >= self.head - span:
+                self._sums[w, li] += vec
+        last = self._last.get(line_id)
+        if last is None or ts >= last['timestamp']:
+            self._last[line_id] = {'timestamp': ts, **dict(zip(self.kpis, map(float, values)))}
+        return True
+
+    @classmethod
+    def from_frame(cls, df, windows=None, kpis=KPI_COLUMNS):
+        """Construit l'index en une passe vectorisée sur les 30 derniers jours d'un DataFrame OEE"""
+        index = cls(windows, kpis)
+        if df is None or len(df) == 0: return index
+        hours = df['timestamp'].values.astype('datetime64[ns]').view(np.int64) // NS_PER_HOUR
+        lines = df['line_id'].astype(str).values
+        for line_id in pd.unique(lines):
+            index._line(line_id)
+        index._advance(int(hours.max()))
+
+        keep = hours > index.head - index.size
+        line_idx = np.array([index.line_index[l] for l in lines[keep]]) if keep.any() else np.zeros(0, dtype=int)
+        values = df.loc[keep, list(index.kpis)].to_numpy(dtype=float)
+        vec = np.hstack([np.ones((len(values), 1)), values, values * values])
+        kept_hours = hours[keep]
+        np.add.at(index._buckets, (line_idx, kept_hours % index.size), vec)
+        for w, span in enumerate(index.windows.values()):
+            in_window = kept_hours >= index.head - span
+            np.add.at(index._sums[w], line_idx[in_window], vec[in_window])
+
+        last_rows = df.iloc[::-1].drop_duplicates('line_id').iloc[::-1]
+        for _, row in last_rows.iterrows():
+            index._last[str(row['line_id'])] = {'timestamp': row['timestamp'], **{k: float(row[k]) for k in index.kpis}}
+        return index
+
+    def stats(self, line_id, window='1d'):
+        """Nombre, moyennes et écarts-types (ddof=1) d'une ligne sur une fenêtre, ou None si vide"""
+        li = self.line_index.get(line_id)
+        if li is None: return None
+        row = self._sums[list(self.windows).index(window), li]
+        n = row[0]
+        if n < 0.5: return None
+        k = len(self.kpis)
+        sums, squares = row[1:1 + k], row[1 + k:]
+        means = sums / n
+        var = np.maximum(squares - sums * sums / n, 0) / (n - 1) if n > 1 else np.full(k, np.nan)
+        return {
+            'count': int(round(n)),
+            'mean': dict(zip(self.kpis, means.tolist())),
+            'std': dict(zip(self.kpis, np.sqrt(var).tolist()))
+        }
+
+    def last(self, line_id):
+        return self._last.get(line_id)
@@ -0,0 +1,257 @@
+"""
+Générateur vectorisé de données Evocon synthétiques (échelle configurable : années × lignes × machines)
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+PRODUCT_TYPES = ['Fond_Plat', 'Fond_Carre_Sans_Poignees', 'Fond_Carre_Poignees_Plates', 'Fond_Carre_Poignees_Torsadees']
+STOP_TYPES = ['Changement_Format', 'Panne_Mecanique', 'Panne_Electrique', 'Reglage', 'Nettoyage', 'Attente_Materiel', 'Bourrage', 'Maintenance_Preventive', 'Probleme_Qualite', 'Attente_Operateur']
+DEFECT_TYPES = ['Dimension_Hors_Tolerance', 'Defaut_Surface', 'Pliage_Incorrect', 'Impression_Defectueuse', 'Contamination', 'Deformation']
+PRIORITIES = ['Low', 'Medium', 'High', 'Critical']
+ANOMALY_TEMPLATES = [
+    {'symptom': 'Baisse soudaine de performance de 15%', 'root_cause': 'Usure des courroies de transmission', 'solution': 'Remplacement des courroies et réalignement', 'impact_oee': -15},
+    {'symptom': 'Arrêts micro-répétitifs toutes les 10 minutes', 'root_cause': 'Capteur de position défectueux', 'solution': 'Remplacement du capteur et recalibration', 'impact_oee': -8},
+    {'symptom': 'Augmentation du taux de rebut à 7%', 'root_cause': 'Dérive de la température de séchage', 'solution': 'Recalibration du système de contrôle thermique', 'impact_oee': -5},
+    {'symptom': 'Bourrage fréquent au niveau de l\'alimentation', 'root_cause': 'Tension d\'alimentation incorrecte', 'solution': 'Ajustement de la tension et nettoyage des rouleaux', 'impact_oee': -12},
+    {'symptom': 'Vibrations anormales détectées', 'root_cause': 'Roulements usés sur l\'axe principal', 'solution': 'Remplacement des roulements et équilibrage', 'impact_oee': -10},
+    {'symptom': 'Qualité d\'impression dégradée', 'root_cause': 'Viscosité d\'encre non conforme', 'solution': 'Ajustement de la viscosité et nettoyage des buses', 'impact_oee': -6}
+]
+
+# Lignes historiques TECPAP ; les lignes supplémentaires reprennent ces profils en boucle
+BASE_LINES = {
+    'L1': {'base_oee': 78, 'optimal_speed': 1000, 'speed_range': (700, 1300), 'machines': 3},
+    'L2': {'base_oee': 73, 'optimal_speed': 1100, 'speed_range': (800, 1400), 'machines': 4},
+    'L3': {'base_oee': 69, 'optimal_speed': 900, 'speed_range': (600, 1200), 'machines': 2}
+}
+
+def build_line_config(n_lines=3, machines_per_line=None):
+    """Construit la configuration des lignes L1..Ln (nombre de machines optionnellement imposé)"""
+    profiles = list(BASE_LINES.values())
+    config = {}
+    for i in range(n_lines):
+        profile = profiles[i % len(profiles)]
+        n_machines = machines_per_line or profile['machines']
+        config[f'L{i + 1}'] = {
+            'base_oee': profile['base_oee'], 'optimal_speed': profile['optimal_speed'],
+            'speed_range': profile['speed_range'],
+            'machines': [f'M{i + 1}-{j + 1}' for j in range(n_machines)]
+        }
+    return config
+
+class SyntheticEvoconGenerator:
+    """Génère les tables OEE, arrêts, qualité et anomalies sous forme de tableaux NumPy.
+
+    Même structure statistique que l'ancien générateur ligne par ligne (saisonnalité,
+    pénalité de vitesse, chutes anormales à 5%, arrêts Poisson, qualité par poste),
+    mais calculée par blocs de jours pour pouvoir être diffusée sans tout garder en mémoire.
+    Chaque jour tire ses valeurs d'un flux aléatoire dédié : à graine égale, la taille des
+    blocs ne change pas les données.
+    """
+    TABLES = ('oee_data', 'stops_data', 'quality_data', 'anomalies_data')
+
+    def __init__(self, days=730, n_lines=3, machines_per_line=None, start_date=None, seed=None):
+        self.days = days
+        self.lines = build_line_config(n_lines, machines_per_line)
+        self.line_ids = np.array(list(self.lines.keys()))
+        self.start_date = start_date or datetime.now() - timedelta(days=days)
+        self.seed = seed
+        # Entropie fixée une fois : sans graine, toutes les tables d'une instance restent cohérentes
+        self._entropy = np.random.SeedSequence(seed).entropy
+        self._start = np.datetime64(self.start_date, 'ns')
+        self._start_weekday = self.start_date.weekday()
+
+        cfg = list(self.lines.values())
+        self._base_oee = np.array([c['base_oee'] for c in cfg], dtype=float)
+        self._optimal = np.array([c['optimal_speed'] for c in cfg], dtype=float)
+        self._min_speed = np.array([c['speed_range'][0] for c in cfg], dtype=float)
+        self._max_speed = np.array([c['speed_range'][1] for c in cfg], dtype=float)
+        self._n_machines = np.array([len(c['machines']) for c in cfg])
+        machine_table = [c['machines'] for c in cfg]
+        width = self._n_machines.max()
+        self._machines = np.array([m + [''] * (width - len(m)) for m in machine_table])
+
+    def _rng(self, table, day):
+        """Flux aléatoire propre à (table, jour) : le résultat ne dépend pas du découpage en blocs"""
+        return np.random.default_rng(np.random.SeedSequence(self._entropy, spawn_key=(self.TABLES.index(table), day)))
+
+    def _weekdays(self, day_start, day_end):
+        days = np.arange(day_start, day_end)
+        return days[(self._start_weekday + days) % 7 < 5]
+
+    def _timestamps(self, days, hours, minutes=0):
+        offsets = days.astype('int64') * 86400 + np.asarray(hours, dtype='int64') * 3600 + np.asarray(minutes, dtype='int64') * 60
+        return self._start + offsets.astype('timedelta64[s]')
+
+    def oee_arrays(self, rng, day_start, day_end):
+        days = self._weekdays(day_start, day_end)
+        hours = np.arange(6, 23)
+        n_lines = len(self.line_ids)
+        # Ordre des lignes identique aux boucles d'origine : jour -> heure -> ligne
+        day = np.repeat(days, len(hours) * n_lines)
+        hour = np.tile(np.repeat(hours, n_lines), len(days))
+        line = np.tile(np.arange(n_lines), len(days) * len(hours))
+        n = len(day)
+
+        optimal, min_s, max_s = self._optimal[line], self._min_speed[line], self._max_speed[line]
+        product = rng.integers(0, len(PRODUCT_TYPES), n)
+        speed = np.where(rng.random(n) < 0.7, rng.normal(optimal, 50), rng.uniform(min_s, max_s))
+        speed = np.clip(speed, min_s, max_s).astype(int)
+
+        seasonal_effect = 5 * np.sin(2 * np.pi * day / 365)
+        hour_effect = np.where((hour < 8) | (hour > 20), -3, 0)
+        speed_penalty = (np.abs(speed - optimal) / 100) ** 1.5
+        anomaly = np.where(rng.random(n) < 0.05, -15, 0)
+        oee = self._base_oee[line] + seasonal_effect + hour_effect + rng.normal(0, 3, n) - speed_penalty + anomaly
+        oee = np.clip(oee, 40, 95)
+
+        speed_ratio = speed / optimal
+        availability = oee * rng.uniform(0.85, 0.95, n) / 0.9
+        performance = oee * rng.uniform(0.88, 0.98, n) / 0.93
+        performance *= np.where(speed_ratio > 1.15, 1.05, np.where(speed_ratio < 0.85, 0.92, 1.0))
+        quality = oee * rng.uniform(0.92, 0.99, n) / 0.96
+        quality *= np.where(speed_ratio > 1.15, 0.90, np.where(speed_ratio < 0.85, 1.02, 1.0))
+        actual_production = (speed * (oee / 100)).astype(int)
+
+        return {
+            'timestamp': self._timestamps(day, hour),
+            'line_id': self.line_ids[line],
+            'product_type': np.array(PRODUCT_TYPES)[product],
+            'machine_speed': speed,
+            'oee': np.round(oee, 2),
+            'availability': np.round(np.clip(availability, 40, 100), 2),
+            'performance': np.round(np.clip(performance, 40, 100), 2),
+            'quality': np.round(np.clip(quality, 40, 100), 2),
+            'production_time': np.full(n, 60),
+            'planned_production_time': np.full(n, 60),
+            'good_pieces': (actual_production * (quality / 100)).astype(int),
+            'total_pieces': actual_production
+        }
+
+    def stops_arrays(self, rng, day_start, day_end, first_id=1):
+        days = self._weekdays(day_start, day_end)
+        n_lines = len(self.line_ids)
+        counts = rng.poisson(8, len(days) * n_lines)
+        day = np.repeat(np.repeat(days, n_lines), counts)
+        line = np.repeat(np.tile(np.arange(n_lines), len(days)), counts)
+        n = len(day)
+
+        stop_type = np.array(STOP_TYPES)[rng.integers(0, len(STOP_TYPES), n)]
+        duration = rng.integers(5, 120, n)
+        start_time = self._timestamps(day, rng.integers(6, 22, n), rng.integers(0, 60, n))
+        machine = self._machines[line, (rng.random(n) * self._n_machines[line]).astype(int)]
+        return {
+            'stop_id': np.arange(first_id, first_id + n),
+            'line_id': self.line_ids[line],
+            'machine_id': machine,
+            'stop_type': stop_type,
+            'start_time': start_time,
+            'end_time': start_time + duration.astype('timedelta64[m]'),
+            'duration_minutes': duration,
+            'description': np.char.add(np.char.add(stop_type, ' sur '), machine),
+            'operator': np.char.add('OP', rng.integers(1, 15, n).astype(str)),
+            'resolved': np.ones(n, dtype=bool)
+        }
+
+    def quality_arrays(self, rng, day_start, day_end):
+        days = self._weekdays(day_start, day_end)
+        n_lines = len(self.line_ids)
+        day = np.repeat(days, n_lines * 3)
+        line = np.tile(np.repeat(np.arange(n_lines), 3), len(days))
+        shift = np.tile(np.arange(3), len(days) * n_lines)
+        n = len(day)
+
+        total_produced = rng.integers(8000, 12000, n)
+        defect_rate = rng.uniform(0.01, 0.08, n)
+        total_defects = (total_produced * defect_rate).astype(int)
+        return {
+            'timestamp': self._timestamps(day, 8 * shift),
+            'line_id': self.line_ids[line],
+            'shift': shift + 1,
+            'total_produced': total_produced,
+            'total_defects': total_defects,
+            'defect_rate': np.round(defect_rate * 100, 2),
+            'defect_type': np.array(DEFECT_TYPES)[rng.integers(0, len(DEFECT_TYPES), n)],
+            'rework_count': (total_defects * 0.3).astype(int),
+            'scrap_count': (total_defects * 0.7).astype(int)
+        }
+
+    def anomalies_arrays(self, rng, day_start, day_end):
+        # Une anomalie par semaine, alignée sur le jour 0 comme dans la version d'origine
+        days = np.arange(-(-day_start // 7) * 7, day_end, 7)
+        n = len(days)
+        template = rng.integers(0, len(ANOMALY_TEMPLATES), n)
+        line = rng.integers(0, len(self.line_ids), n)
+        machine = self._machines[line, (rng.random(n) * self._n_machines[line]).astype(int)]
+
+        def field(key):
+            return np.array([t[key] for t in ANOMALY_TEMPLATES])[template]
+        return {
+            'anomaly_id': days // 7 + 1,
+            'timestamp': self._timestamps(days, 0),
+            'line_id': self.line_ids[line],
+            'machine_id': machine,
+            'symptom': field('symptom'),
+            'root_cause': field('root_cause'),
+            'solution_applied': field('solution'),
+            'resolution_time_minutes': rng.integers(30, 480, n),
+            'impact_oee': field('impact_oee'),
+            'recurrence_count': rng.integers(1, 5, n),
+            'priority': np.array(PRIORITIES)[rng.integers(0, len(PRIORITIES), n)],
+            'status': np.full(n, 'Resolved')
+        }
+
+    def iter_arrays(self, table, chunk_days=90):
+        """Produit la table demandée par blocs de `chunk_days` jours (dictionnaires de tableaux)"""
+        if table not in self.TABLES: raise KeyError(f"Table inconnue: {table}")
+        builders = {'oee_data': self.oee_arrays, 'quality_data': self.quality_arrays, 'anomalies_data': self.anomalies_arrays}
+        next_stop_id = 1
+        for day_start in range(0, self.days, chunk_days):
+            pieces = []
+            for day in range(day_start, min(day_start + chunk_days, self.days)):
+                if table == 'stops_data':
+                    piece = self.stops_arrays(self._rng(table, day), day, day + 1, next_stop_id)
+                    next_stop_id += len(piece['stop_id'])
+                else:
+                    piece = builders[table](self._rng(table, day), day, day + 1)
+                pieces.append(piece)
+            yield {key: np.concatenate([p[key] for p in pieces]) for key in pieces[0]}
+
+    def iter_frames(self, table, chunk_days=90):
+        for chunk in self.iter_arrays(table, chunk_days):
+            yield pd.DataFrame(chunk)
+
+    def generate(self, table):
+        """Génère une table complète en un seul DataFrame"""
+        return pd.concat(list(self.iter_frames(table, chunk_days=self.days)), ignore_index=True)
+
+    def write_csv(self, data_path, chunk_days=90):
+        """Écrit les quatre tables en CSV bloc par bloc (mémoire bornée par `chunk_days`)"""
+        os.makedirs(data_path, exist_ok=True)
+        rows = {}
+        for table in self.TABLES:
+            path = os.path.join(data_path, f'{table}.csv')
+            rows[table] = 0
+            for i, frame in enumerate(self.iter_frames(table, chunk_days)):
+                frame.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+                rows[table] += len(frame)
+        return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Génère des données Evocon synthétiques à l'échelle usine")
+    parser.add_argument('output', help="Répertoire de sortie des CSV")
+    parser.add_argument('--years', type=float, default=2)
+    parser.add_argument('--lines', type=int, default=3)
+    parser.add_argument('--machines', type=int, default=None, help="Machines par ligne (défaut: profil de la ligne)")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--chunk-days', type=int, default=90)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    generator = SyntheticEvoconGenerator(days=int(args.years * 365), n_lines=args.lines, machines_per_line=args.machines, seed=args.seed)
+    rows = generator.write_csv(args.output, chunk_days=args.chunk_days)
+    print(f"{sum(rows.values())} lignes générées en {time.perf_counter() - start:.2f}s: {rows}")
@@ -0,0 +1,89 @@
+"""
+Index temporel trié par table : recherches de plages par dichotomie et sérialisation colonne par colonne
+"""
+
+import numpy as np
+import pandas as pd
+
+# Colonne temporelle de référence de chaque table
+TIME_COLUMNS = {'oee_data': 'timestamp', 'stops_data': 'start_time', 'quality_data': 'timestamp', 'anomalies_data': 'timestamp'}
+
+def _ns(value):
+    return pd.Timestamp(value).value
+
+class TimeIndex:
+    """Positions des lignes triées par date, globalement et par ligne de production.
+
+    `positions(start, end, line_id)` renvoie, par dichotomie (`searchsorted`), les positions
+    des enregistrements de [start, end) dans l'ordre chronologique, sans masque sur la table.
+    À date égale, l'ordre d'origine des lignes est conservé.
+    """
+    def __init__(self, timestamps, line_ids=None):
+        ts = pd.to_datetime(pd.Series(timestamps)).to_numpy(dtype='datetime64[ns]').view(np.int64)
+        order = np.argsort(ts, kind='stable')
+        self.ts, self.order = ts[order], order
+        self.lines = {}
+        if line_ids is not None:
+            codes, uniques = pd.factorize(pd.Series(line_ids).astype(str).to_numpy())
+            by_line = np.lexsort((ts, codes))
+            bounds = np.flatnonzero(np.diff(codes[by_line])) + 1
+            for group in np.split(by_line, bounds) if len(by_line) else []:
+                self.lines[uniques[codes[group[0]]]] = (ts[group], group)
+
+    @classmethod
+    def from_frame(cls, df, time_column='timestamp'):
+        return cls(df[time_column], df['line_id'] if 'line_id' in df.columns else None)
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def max(self):
+        return pd.Timestamp(self.ts[-1]) if len(self.ts) else None
+
+    def _arrays(self, line_id):
+        if line_id is None or line_id == 'all':
+            return self.ts, self.order
+        return self.lines.get(line_id, (self.ts[:0], self.order[:0]))
+
+    def bounds(self, start=None, end=None, line_id=None):
+        """Intervalle [lo, hi) dans l'ordre trié (de la ligne demandée) couvrant [start, end)"""
+        ts, _ = self._arrays(line_id)
+        lo = np.searchsorted(ts, _ns(start), 'left') if start is not None else 0
+        hi = np.searchsorted(ts, _ns(end), 'left') if end is not None else len(ts)
+        return int(lo), int(max(lo, hi))
+
+    def positions(self, start=None, end=None, line_id=None):
+        lo, hi = self.bounds(start, end, line_id)
+        return self._arrays(line_id)[1][lo:hi]
+
+    def rank(self, ts_ns, position, line_id=None):
+        """Rang trié de l'enregistrement (date, position) : sert de curseur de pagination stable"""
+        ts, order = self._arrays(line_id)
+        lo, hi = np.searchsorted(ts, ts_ns, 'left'), np.searchsorted(ts, ts_ns, 'right')
+        return int(lo + np.searchsorted(order[lo:hi], position))
+
+def serialize_columns(df, columns=None):
+    """Convertit un DataFrame en {colonne: liste} JSON-compatible, une opération vectorisée par colonne.
+
+    Les valeurs manquantes (NaN, NaT) deviennent None, soit `null` en JSON.
+    """
+    out = {}
+    for col in columns or df.columns:
+        s = df[col]
+        if pd.api.types.is_datetime64_any_dtype(s):
+            values = s.dt.strftime('%Y-%m-%dT%H:%M:%S').tolist()
+        elif isinstance(s.dtype, pd.CategoricalDtype):
+            values = s.astype(str).tolist()
+        else:
+            values = s.tolist()
+        missing = s.isna().to_numpy()
+        if missing.any():
+            values = [None if m else v for v, m in zip(values, missing)]
+        out[col] = values
+    return out
+
+def records_from_columns(columns, rename=None):
+    """Reconstruit une liste d'enregistrements à partir de colonnes déjà sérialisées"""
+    keys = [rename.get(k, k) if rename else k for k in columns]
+    return [dict(zip(keys, row)) for row in zip(*columns.values())]
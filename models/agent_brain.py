@@ -3,105 +3,217 @@ Orchestrateur Intelligence Artificielle - Agent de Décision TECPAP
 Simule un cerveau d'agent (LLM-style) avec appels de fonctions locaux
 """
 
-import re
-from datetime import datetime
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from models.session_memory import SessionMemory
+from models.intent_router import IntentRouter, MAX_HORIZON_DAYS
+from models.result_cache import TTLCache
+
+# Pool partagé par toutes les requêtes : les outils indépendants d'une même requête s'exécutent en parallèle
+_TOOL_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix='agent-tool')
+DEFAULT_TOOL_TIMEOUT = 30
 
 class AgentBrain:
-    def __init__(self, predictor, recommender, anomaly_expert, speed_optimizer):
-        self.predictor = predictor
-        self.recommender = recommender
-        self.expert = anomaly_expert
-        self.optimizer = speed_optimizer
-        self.memory = []
+    def __init__(self, predictor, recommender, anomaly_expert, speed_optimizer, analytics=None, tool_timeouts=None, memory=None,
+                 router=None, tool_cache=None, data_version=None):
+        # Chaque outil peut être fourni directement ou via une fonction d'accès paresseuse
+        self._tools = {'predictor': predictor, 'recommender': recommender, 'expert': anomaly_expert,
+                       'optimizer': speed_optimizer, 'analytics': analytics}
+        self.tool_timeouts = tool_timeouts or {}
+        self.memory = memory or SessionMemory()
+        self.router = router or IntentRouter()
+        # Résultats d'outils partagés entre requêtes, invalidés par la version des données et du modèle
+        self.tool_cache = tool_cache or TTLCache(maxsize=512, ttl=60)
+        self._data_version = data_version
+    
+    def _tool(self, name):
+        tool = self._tools[name]
+        return tool() if inspect.isfunction(tool) else tool
+    
+    @property
+    def predictor(self): return self._tool('predictor')
+    
+    @property
+    def recommender(self): return self._tool('recommender')
+    
+    @property
+    def expert(self): return self._tool('expert')
+    
+    @property
+    def optimizer(self): return self._tool('optimizer')
+    
+    @property
+    def analytics(self): return self._tool('analytics')
         
-    def process_query(self, query):
+    def process_query(self, query, session_id='default'):
         """Traite une requête utilisateur et décide des outils à appeler"""
         query_lower = query.lower()
-        self.memory.append({"role": "user", "content": query})
+        self.memory.append(session_id, "user", query)
         
         # 1. Analyse de l'intention et construction de la "pensée"
         thought = self._generate_thought(query_lower)
         
-        # 2. Exécution des outils basés sur la pensée
-        observations = []
-        for action in thought['actions']:
-            obs = self._execute_tool(action['tool'], action['params'])
-            observations.append(obs)
+        # 2. Exécution concurrente des outils basés sur la pensée
+        start = time.perf_counter()
+        observations, timings = self._run_actions(thought['actions'])
             
         # 3. Synthèse de la réponse finale
         response = self._synthesize_response(query, thought, observations)
-        self.memory.append({"role": "assistant", "content": response})
+        self.memory.append(session_id, "assistant", response)
         
         return {
             "thought": thought['description'],
             "actions": thought['actions'],
             "observations": observations,
+            "timings": timings,
+            "total_seconds": round(time.perf_counter() - start, 3),
             "response": response
         }
 
+    def _timed_tool(self, tool, params, deadline=None):
+        start = time.perf_counter()
+        obs = self._execute_tool(tool, params, None if deadline is None else max(0, deadline - start))
+        return obs, round(time.perf_counter() - start, 3)
+
+    def _invalid_params(self, action):
+        """Paramètres hors bornes, refusés avant la soumission au pool"""
+        days = action['params'].get('days')
+        if days is not None and (isinstance(days, bool) or not isinstance(days, int) or not 1 <= days <= MAX_HORIZON_DAYS):
+            return f"Horizon invalide pour l'outil {action['tool']}: {days!r} (1 à {MAX_HORIZON_DAYS} jours)."
+        return None
+
+    def _run_actions(self, actions):
+        """Soumet toutes les actions au pool puis attend chacune dans la limite de son délai.
+
+        Le délai court depuis la soumission et borne l'attente de la réponse, pas l'exécution :
+        un outil en retard est annulé s'il n'a pas encore démarré, mais un outil déjà lancé ne
+        peut pas être interrompu (thread Python). Il continue en arrière-plan en occupant un
+        worker du pool jusqu'à sa fin, et son résultat est ignoré pour cette requête.
+        """
+        start = time.perf_counter()
+        futures = []
+        for action in actions:
+            timeout = self.tool_timeouts.get(action['tool'], DEFAULT_TOOL_TIMEOUT)
+            error = self._invalid_params(action)
+            future = None if error else _TOOL_POOL.submit(self._timed_tool, action['tool'], action['params'], start + timeout)
+            futures.append((action, timeout, future, error))
+        observations, timings = [], []
+        for action, timeout, future, error in futures:
+            if future is None:
+                observations.append(error)
+                timings.append({'tool': action['tool'], 'seconds': 0.0, 'status': 'invalid'})
+                continue
+            try:
+                obs, seconds = future.result(timeout=max(0, timeout - (time.perf_counter() - start)))
+                status = 'ok'
+            except FutureTimeout:
+                future.cancel()
+                obs, seconds, status = f"L'outil {action['tool']} n'a pas répondu dans le délai de {timeout} s.", timeout, 'timeout'
+            observations.append(obs)
+            timings.append({'tool': action['tool'], 'seconds': seconds, 'status': status})
+        return observations, timings
+
     def _generate_thought(self, q):
-        """Simulation du raisonnement de l'agent"""
+        """Simulation du raisonnement de l'agent : une action par intention détectée"""
         actions = []
-        description = "Je dois analyser la demande pour choisir le bon outil."
+        descriptions = []
+        parsed = self.router.route(q)
+        line = parsed.line or "L1" # Default
         
-        if any(w in q for w in ["prévoir", "prediction", "futur", "oee", "semaine"]):
-            line = "L1" # Default
-            if "l2" in q: line = "L2"
-            elif "l3" in q: line = "L3"
-            actions.append({"tool": "oee_forecast", "params": {"line": line, "days": 7}})
-            description = f"L'utilisateur s'interroge sur les performances futures. Je vais consulter le modèle de prédiction pour la {line}."
+        if 'forecast' in parsed.intents:
+            actions.append({"tool": "oee_forecast", "params": {"line": line, "days": parsed.horizon_days or 7}})
+            descriptions.append(f"L'utilisateur s'interroge sur les performances futures. Je vais consulter le modèle de prédiction pour la {line}.")
+            
+        if 'recommend' in parsed.intents:
+            actions.append({"tool": "line_recommendation", "params": {"product": parsed.product or "Fond_Plat", "qty": parsed.quantity or 1000}})
+            descriptions.append("Une décision de production est requise. Je vais évaluer la meilleure ligne pour ce produit.")
             
-        elif any(w in q for w in ["recommander", "choisir", "quelle ligne", "meilleure"]):
-            prod = "Fond_Plat"
-            if "carre" in q: prod = "Fond_Carre_Sans_Poignees"
-            actions.append({"tool": "line_recommendation", "params": {"product": prod, "qty": 1000}})
-            description = "Une décision de production est requise. Je vais évaluer la meilleure ligne pour ce produit."
+        if 'downtime' in parsed.intents:
+            actions.append({"tool": "downtime_analysis", "params": {"line": parsed.line or "all", "days": parsed.horizon_days or 30}})
+            descriptions.append("Analyse des pertes demandée. Je vais consulter le Pareto des arrêts et la fiabilité des machines.")
             
-        elif any(w in q for w in ["problème", "panne", "erreur", "anomalie", "solution"]):
+        if 'anomaly' in parsed.intents:
             desc = q.replace("problème", "").replace("anomalie", "").strip()
             actions.append({"tool": "solve_anomaly", "params": {"description": desc or "problème général"}})
-            description = "Une anomalie industrielle est signalée. Je vais chercher des solutions dans la base de connaissances."
+            descriptions.append("Une anomalie industrielle est signalée. Je vais chercher des solutions dans la base de connaissances.")
             
-        elif any(w in q for w in ["vitesse", "optimiser", "sweet spot", "rapide"]):
-            line = "L1"
-            if "l2" in q: line = "L2"
-            elif "l3" in q: line = "L3"
-            actions.append({"tool": "optimize_speed", "params": {"line": line, "product": "Fond_Plat"}})
-            description = "Optimisation de la productivité demandée. Je vais calculer le Sweet Spot de vitesse."
+        if 'speed' in parsed.intents:
+            params = {"line": line, "product": parsed.product or "Fond_Plat"}
+            if parsed.speed: params["speed"] = parsed.speed
+            actions.append({"tool": "optimize_speed", "params": params})
+            descriptions.append("Optimisation de la productivité demandée. Je vais calculer le Sweet Spot de vitesse.")
             
-        else:
-            description = "Demande générale reçue. Je vais fournir une vue d'ensemble de l'état du système."
+        if not actions:
+            descriptions.append("Demande générale reçue. Je vais fournir une vue d'ensemble de l'état du système.")
             actions.append({"tool": "system_status", "params": {}})
             
-        return {"description": description, "actions": actions}
+        return {"description": " ".join(descriptions), "actions": actions}
+
+    def _execute_tool(self, tool, params, timeout=None):
+        """Appel dynamique des modèles analytiques, servi par le cache de résultats quand c'est possible.
 
-    def _execute_tool(self, tool, params):
-        """Appel dynamique des modèles analytiques"""
+        `timeout` borne l'attente d'un calcul identique déjà lancé par une autre requête.
+        """
         try:
-            if tool == "oee_forecast":
-                res = self.predictor.predict_line(params['line'], params['days'])
-                return f"Prédiction OEE pour {params['line']}: {res[0]['oee_predicted']}% en moyenne."
-            
-            elif tool == "line_recommendation":
-                res = self.recommender.recommend(params['product'], params['qty'])
-                return f"Recommandation: {res['line_id']} (Score: {res['score']}) avec un OEE prédit de {res['predicted_oee']}%."
-            
-            elif tool == "solve_anomaly":
-                res = self.expert.find_similar(params['description'])
-                if res:
-                    return f"Trouvé un cas similaire (Sim: {res[0]['similarity']}%). Cause: {res[0]['cause']}. Solution: {res[0]['solution']}."
-                return "Aucun cas similaire trouvé."
-            
-            elif tool == "optimize_speed":
-                res = self.optimizer.find_optimal_speed(params['line'], params['product'])
-                return f"Vitesse optimale pour {params['line']}: {res['optimal_speed']} pcs/h pour un rendement max de {res['max_output']}."
-            
-            elif tool == "system_status":
-                return "Toutes les lignes sont opérationnelles. L1: 75%, L2: 72%, L3: 68% OEE."
-                
+            return self.tool_cache.get_or_compute(self._cache_key(tool, params), lambda: self._call_tool(tool, params), timeout)
         except Exception as e:
             return f"Erreur lors de l'utilisation de l'outil {tool}: {str(e)}"
 
+    def _tool_version(self, tool):
+        """Version des données et du modèle dont dépend le résultat de l'outil"""
+        data = self._data_version() if self._data_version else None
+        if tool in ("oee_forecast", "line_recommendation"):
+            return data, self.predictor.model_version
+        if tool == "solve_anomaly":
+            index = self.expert.index
+            return data, index.size if index is not None else 0
+        return data
+
+    def _cache_key(self, tool, params):
+        normalized = tuple(sorted((k, " ".join(v.lower().split()) if isinstance(v, str) else v) for k, v in params.items()))
+        return tool, normalized, self._tool_version(tool)
+
+    def _call_tool(self, tool, params):
+        if tool == "oee_forecast":
+            res = self.predictor.predict_next_days(params['days'], lines=[params['line']]).get(params['line'])
+            if not res:
+                return f"Aucune prédiction disponible pour {params['line']}."
+            avg = sum(p['oee_predicted'] for p in res) / len(res)
+            return f"Prédiction OEE pour {params['line']}: {avg:.2f}% en moyenne sur {len(res)} jours."
+        
+        elif tool == "line_recommendation":
+            res = self.recommender.recommend(params['product'], params['qty'])
+            return f"Recommandation: {res['recommended_line']} (Score: {res['score']}) avec un OEE prédit de {res['details']['predicted_oee']}%."
+        
+        elif tool == "solve_anomaly":
+            res = self.expert.find_similar(params['description'])
+            if res:
+                return f"Trouvé un cas similaire (Sim: {res[0]['similarity']}%). Cause: {res[0]['cause']}. Solution: {res[0]['solution']}."
+            return "Aucun cas similaire trouvé."
+        
+        elif tool == "optimize_speed":
+            res = self.optimizer.find_optimal_speed(params['line'], params['product'])
+            obs = f"Vitesse optimale pour {params['line']}: {res['optimal_speed']} pcs/h pour un rendement max de {res['max_output']}."
+            if params.get('speed'):
+                gap = params['speed'] - res['optimal_speed']
+                obs += f" La vitesse demandée ({params['speed']} pcs/h) est {'au-dessus' if gap > 0 else 'en dessous'} de l'optimum de {abs(gap)} pcs/h." if gap else " La vitesse demandée est déjà optimale."
+            return obs
+        
+        elif tool == "downtime_analysis":
+            res = self.analytics.summary(params['line'], params['days'])
+            if not res['top_causes']:
+                return "Aucun arrêt enregistré sur la période."
+            causes = ", ".join(f"{c['stop_type']} ({c['share']}%)" for c in res['top_causes'])
+            obs = f"Principales causes d'arrêt sur {params['days']} jours: {causes} pour {res['total_minutes']} min au total."
+            worst = res['least_reliable']
+            if worst:
+                obs += f" Machine la moins fiable: {worst['machine_id']} (MTBF {worst['mtbf_hours']} h, MTTR {worst['mttr_minutes']} min)."
+            return obs
+        
+        elif tool == "system_status":
+            return "Toutes les lignes sont opérationnelles. L1: 75%, L2: 72%, L3: 68% OEE."
+
     def _synthesize_response(self, q, thought, obs):
         """Construction de la réponse en langage naturel"""
         if not obs:
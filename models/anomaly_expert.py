@@ -2,79 +2,265 @@
 Système expert pour la gestion et l'analyse des anomalies
 """
 
+import json
+import os
+import threading
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
+from models.similarity_index import SIMILARITY_INDEXES
+from models.streaming_tfidf import StreamingTfidf, DIMENSION
+from models.kpi_monitor import KPIMonitor
+from data.time_index import TimeIndex, serialize_columns, records_from_columns
+from data.synthetic_generator import PRIORITIES
+from data.ingestion import naive_datetimes
+
+INDEX_FORMAT_VERSION = 2
+REQUIRED_FIELDS = ('line_id', 'machine_id', 'symptom', 'root_cause', 'solution_applied')
+STATUSES = ('Open', 'In_Progress', 'Resolved')
+# Nombre d'anomalies ajoutées au journal avant de réécrire l'instantané de l'index
+SNAPSHOT_EVERY = 500
+# Colonnes exposées par l'API et leur nom dans la réponse
+ANOMALY_FIELDS = {
+    'anomaly_id': 'id', 'timestamp': 'date', 'line_id': 'line', 'machine_id': 'machine', 'symptom': 'symptom',
+    'root_cause': 'cause', 'solution_applied': 'solution', 'priority': 'priority', 'status': 'status'
+}
+
+def _document(row):
+    return f"{row.get('symptom') or ''} {row.get('root_cause') or ''}"
 
 class AnomalyExpert:
-    def __init__(self):
+    def __init__(self, index_type='inverted', index_path=None):
         self.knowledge_base = None
-        self.vectorizer = TfidfVectorizer(max_features=100)
-        self.symptom_vectors = None
-        self.active_alerts = []
+        self.encoder = None
+        self.index_type = index_type
+        self.index = None
+        self.index_path = index_path or os.path.join(os.path.dirname(__file__), 'saved_models', 'anomaly_index')
+        self.monitor = None
+        self._source_hash = None
+        self._added = []
+        self._unsaved = 0
+        self._time_index = None
+        self._lock = threading.Lock()
     
     def load_knowledge_base(self):
-        from data.data_loader import DataLoader
-        loader = DataLoader()
-        loader.load_data()
+        from data.data_store import get_data_store
+        store = get_data_store()
+        store.ensure_loaded()
+        loader = store.loader
         if loader.anomalies_data is not None:
+            self._added = self._read_added()
             self.knowledge_base = loader.anomalies_data
+            if self._added:
+                self.knowledge_base = pd.concat([self.knowledge_base, self._to_frame(self._added)], ignore_index=True)
+            self._source_hash = loader.get_source_hash('anomalies_data')
             if len(self.knowledge_base) > 0:
-                symptoms = self.knowledge_base['symptom'].fillna('') + ' ' + self.knowledge_base['root_cause'].fillna('')
-                self.symptom_vectors = self.vectorizer.fit_transform(symptoms)
-            self._generate_active_alerts(loader)
+                if not self._load_index():
+                    self._build_index()
+            self.monitor = KPIMonitor.from_frame(loader.oee_data)
             return True
         return False
     
-    def _generate_active_alerts(self, loader):
-        if loader.oee_data is None: return
-        recent = loader.oee_data[loader.oee_data['timestamp'] >= loader.oee_data['timestamp'].max() - timedelta(days=1)]
-        self.active_alerts = []
-        for line in ['L1', 'L2', 'L3']:
-            line_data = recent[recent['line_id'] == line]
-            if len(line_data) == 0: continue
-            curr = line_data['oee'].iloc[-1]
-            avg = line_data['oee'].mean()
-            if curr < avg - 10:
-                self.active_alerts.append({
-                    'line_id': line, 'severity': 'Critical', 'type': 'Performance_Drop',
-                    'message': f'Baisse critique de performance sur {line}', 'current': round(curr, 2),
-                    'expected': round(avg, 2), 'timestamp': datetime.now().isoformat()
-                })
-            elif curr < 70:
-                self.active_alerts.append({
-                    'line_id': line, 'severity': 'High', 'type': 'Low_OEE',
-                    'message': f'OEE en dessous du seuil sur {line}', 'current': round(curr, 2),
-                    'timestamp': datetime.now().isoformat()
-                })
+    def _documents(self, start=0):
+        kb = self.knowledge_base.iloc[start:]
+        return (kb['symptom'].fillna('') + ' ' + kb['root_cause'].fillna('')).tolist()
+    
+    def _build_index(self):
+        self.encoder = StreamingTfidf()
+        self.index = SIMILARITY_INDEXES[self.index_type]()
+        self.index.add(self.encoder.partial_fit_transform(self._documents()))
+        self.save_index()
+    
+    def _manifest(self):
+        return {'format_version': INDEX_FORMAT_VERSION, 'source_hash': self._source_hash, 'index_type': self.index_type}
+    
+    def save_index(self):
+        """Instantané de l'index (encodeur, vecteurs, anomalies ajoutées) ; le manifeste est écrit
+        en dernier, puis le journal, désormais couvert par l'instantané, est vidé"""
+        try:
+            os.makedirs(self.index_path, exist_ok=True)
+            vectors = self.index.vectors()
+            tmp = os.path.join(self.index_path, 'vectors.tmp.npz')
+            np.savez(tmp, data=vectors.data, indices=vectors.indices, indptr=vectors.indptr)
+            os.replace(tmp, os.path.join(self.index_path, 'vectors.npz'))
+            tmp = os.path.join(self.index_path, 'encoder.tmp.json')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.encoder.state(), f)
+            os.replace(tmp, os.path.join(self.index_path, 'encoder.json'))
+            tmp = os.path.join(self.index_path, 'added.tmp.json')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._added, f, ensure_ascii=False)
+            os.replace(tmp, os.path.join(self.index_path, 'added.json'))
+            manifest = dict(self._manifest(), n_docs=self.index.size, saved_at=datetime.now().isoformat())
+            tmp = os.path.join(self.index_path, 'manifest.tmp.json')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp, os.path.join(self.index_path, 'manifest.json'))
+            open(self._journal_path(), 'w').close()
+            self._unsaved = 0
+            return True
+        except OSError as e:
+            print(f"Index des anomalies non persisté: {e}")
+            return False
+    
+    def _load_index(self):
+        """Recharge l'instantané puis rejoue les anomalies du journal ajoutées depuis"""
+        try:
+            with open(os.path.join(self.index_path, 'manifest.json'), encoding='utf-8') as f:
+                manifest = json.load(f)
+            n_docs = manifest.pop('n_docs')
+            manifest.pop('saved_at', None)
+            if manifest != self._manifest() or n_docs > len(self.knowledge_base): return False
+            with open(os.path.join(self.index_path, 'encoder.json'), encoding='utf-8') as f:
+                encoder = StreamingTfidf.from_state(json.load(f))
+            with np.load(os.path.join(self.index_path, 'vectors.npz')) as z:
+                vectors = sparse.csr_matrix((z['data'], z['indices'], z['indptr']), shape=(n_docs, DIMENSION))
+        except (OSError, ValueError, KeyError):
+            return False
+        self.encoder = encoder
+        self.index = SIMILARITY_INDEXES[self.index_type]()
+        self.index.add(vectors)
+        if n_docs < len(self.knowledge_base):
+            self.index.add(self.encoder.partial_fit_transform(self._documents(n_docs)))
+            self._unsaved = len(self.knowledge_base) - n_docs
+            if self._unsaved >= SNAPSHOT_EVERY:
+                self.save_index()
+        return True
+    
+    def _journal_path(self):
+        return os.path.join(self.index_path, 'added.jsonl')
+    
+    def _read_added(self):
+        """Anomalies ajoutées via l'API : celles de l'instantané, puis celles du journal qui le suivent"""
+        try:
+            with open(os.path.join(self.index_path, 'added.json'), encoding='utf-8') as f:
+                added = json.load(f)
+        except (OSError, ValueError):
+            added = []
+        # Une sauvegarde interrompue avant la troncature laisse dans le journal des lignes déjà reprises
+        known = {row['anomaly_id'] for row in added}
+        try:
+            with open(self._journal_path(), encoding='utf-8') as f:
+                added += [row for row in (json.loads(line) for line in f if line.strip()) if row['anomaly_id'] not in known]
+        except OSError:
+            pass
+        return added
+    
+    @staticmethod
+    def _to_frame(rows):
+        df = pd.DataFrame(rows)
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        return df
+    
+    def add_anomaly(self, record):
+        """Ajoute une anomalie résolue : indexée immédiatement et journalisée sur disque"""
+        if not isinstance(record, dict):
+            raise ValueError("Objet JSON attendu")
+        missing = [k for k in REQUIRED_FIELDS if not str(record.get(k) or '').strip()]
+        if missing:
+            raise ValueError(f"Champs obligatoires manquants: {', '.join(missing)}")
+        if self.knowledge_base is None:
+            raise ValueError("Base de connaissances non chargée")
+        row = {k: str(record[k]).strip() for k in REQUIRED_FIELDS}
+        timestamp = naive_datetimes(pd.Series([record.get('timestamp') or datetime.now()]))[0]
+        if pd.isna(timestamp):
+            raise ValueError(f"Date invalide: {record.get('timestamp')}")
+        row['timestamp'] = timestamp.isoformat()
+        for field, default in (('resolution_time_minutes', 0), ('impact_oee', 0), ('recurrence_count', 1)):
+            value = record.get(field)
+            if value is None:
+                row[field] = default
+                continue
+            try:
+                if isinstance(value, bool): raise TypeError
+                row[field] = int(value)
+            except (ValueError, TypeError, OverflowError):
+                raise ValueError(f"{field}: entier attendu ({value!r})")
+        for field, allowed, default in (('priority', PRIORITIES, 'Medium'), ('status', STATUSES, 'Resolved')):
+            value = record.get(field) or default
+            if value not in allowed:
+                raise ValueError(f"{field} invalide: {value!r} (valeurs possibles: {', '.join(allowed)})")
+            row[field] = value
+        with self._lock:
+            if self.index is None:
+                # Base initialement vide : l'index est créé au premier ajout
+                self.encoder = StreamingTfidf()
+                self.index = SIMILARITY_INDEXES[self.index_type]()
+            kb = self.knowledge_base
+            row['anomaly_id'] = int(kb['anomaly_id'].max()) + 1 if len(kb) else 1
+            # la base est étendue avant l'index : une recherche concurrente ne voit jamais d'indice orphelin
+            self.knowledge_base = pd.concat([kb, self._to_frame([row])], ignore_index=True)
+            self.index.add(self.encoder.partial_fit_transform([_document(row)]))
+            self._added.append(row)
+            try:
+                os.makedirs(self.index_path, exist_ok=True)
+                with open(self._journal_path(), 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            except OSError as e:
+                print(f"Anomalie non journalisée: {e}")
+            self._unsaved += 1
+            if self._unsaved >= SNAPSHOT_EVERY:
+                self.save_index()
+        return row
+    
+    @property
+    def active_alerts(self):
+        return self.monitor.alerts() if self.monitor is not None else []
+
+    def observe(self, oee):
+        """Fait suivre de nouveaux enregistrements OEE horaires au moniteur de KPI"""
+        if self.monitor is not None:
+            self.monitor.update_frame(oee)
     
     def find_similar(self, description):
-        if self.knowledge_base is None or self.symptom_vectors is None: return []
-        query_vector = self.vectorizer.transform([description])
-        sims = cosine_similarity(query_vector, self.symptom_vectors)[0]
-        top_indices = np.argsort(sims)[-5:][::-1]
+        if self.knowledge_base is None or self.index is None: return []
+        query_vector = self.encoder.transform([description])
+        top_indices, sims = self.index.search(query_vector, k=5)
         results = []
-        for idx in top_indices:
-            if sims[idx] > 0.1:
+        for idx, sim in zip(top_indices, sims):
+            if sim > 0.1:
                 row = self.knowledge_base.iloc[idx]
                 results.append({
-                    'similarity': round(float(sims[idx]) * 100, 1),
+                    'similarity': round(float(sim) * 100, 1),
                     'line': row['line_id'], 'machine': row['machine_id'],
                     'symptom': row['symptom'], 'cause': row['root_cause'], 'solution': row['solution_applied']
                 })
         return results
     
+    def _index_for(self, kb):
+        """Index temporel associé à cet état de la base (reconstruit après un ajout)"""
+        cached = self._time_index
+        if cached is None or cached[0] is not kb:
+            cached = self._time_index = (kb, TimeIndex.from_frame(kb))
+        return cached[1]
+    
+    def page_recent_anomalies(self, days=30, limit=None, cursor=None, layout='records'):
+        """Anomalies des `days` derniers jours, de la plus récente à la plus ancienne.
+
+        `cursor` (renvoyé sous `next_cursor`) reprend après le dernier élément de la page
+        précédente ; il reste valide quand de nouvelles anomalies sont ajoutées.
+        """
+        if limit is not None and int(limit) < 1:
+            raise ValueError(f"limit doit être un entier positif: {limit}")
+        kb = self.knowledge_base
+        if kb is None: return {'anomalies': [], 'next_cursor': None, 'total': 0}
+        index = self._index_for(kb)
+        lo, hi = index.bounds(start=datetime.now() - timedelta(days=days))
+        total = hi - lo
+        if cursor:
+            try:
+                ts_ns, position = (int(v) for v in str(cursor).split(':'))
+            except ValueError:
+                raise ValueError(f"Curseur invalide: {cursor}")
+            hi = max(lo, min(hi, index.rank(ts_ns, position)))
+        start = lo if limit is None else max(lo, hi - int(limit))
+        positions = index.order[start:hi][::-1]
+        data = serialize_columns(kb.iloc[positions], list(ANOMALY_FIELDS))
+        anomalies = ({ANOMALY_FIELDS[k]: v for k, v in data.items()} if layout == 'columns'
+                     else records_from_columns(data, ANOMALY_FIELDS))
+        next_cursor = f'{index.ts[start]}:{index.order[start]}' if lo < start < len(index.ts) else None
+        return {'anomalies': anomalies, 'next_cursor': next_cursor, 'total': total}
+    
     def get_recent_anomalies(self, days=30):
-        if self.knowledge_base is None: return []
-        cutoff = datetime.now() - timedelta(days=days)
-        recent = self.knowledge_base[pd.to_datetime(self.knowledge_base['timestamp']) >= cutoff]
-        anomalies = []
-        for _, row in recent.iterrows():
-            anomalies.append({
-                'id': int(row['anomaly_id']), 'date': row['timestamp'], 'line': row['line_id'],
-                'machine': row['machine_id'], 'symptom': row['symptom'], 'cause': row['root_cause'],
-                'solution': row['solution_applied'], 'priority': row['priority'], 'status': row['status']
-            })
-        return sorted(anomalies, key=lambda x: str(x['date']), reverse=True)
+        return self.page_recent_anomalies(days)['anomalies']
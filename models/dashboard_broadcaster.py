@@ -0,0 +1,135 @@
+"""
+Diffusion Server-Sent Events du tableau de bord : un seul producteur, une file par client connecté
+"""
+
+import json
+import queue
+import threading
+import time
+
+def _normalize(payload):
+    """Forme JSON canonique (types NumPy, dates) pour comparer deux états successifs"""
+    return json.loads(json.dumps(payload, default=str))
+
+def diff_payload(old, new):
+    """Delta entre deux états : clés de premier niveau remplacées, ou sous-clés fusionnées pour les dictionnaires"""
+    merge, replace = {}, {}
+    for key, value in new.items():
+        if key == 'timestamp' or old.get(key) == value: continue
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict) and set(previous) <= set(value):
+            merge[key] = {k: v for k, v in value.items() if previous.get(k) != v}
+        else:
+            replace[key] = value
+    return {'merge': merge, 'replace': replace} if merge or replace else None
+
+def _event(name, data, event_id=None):
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {name}\ndata: {json.dumps(data, default=str)}\n\n'
+
+class DashboardBroadcaster:
+    """Calcule le tableau de bord une fois par mise à jour et le diffuse à tous les abonnés.
+
+    Le producteur (thread démon) recalcule quand `version()` change, et au plus tard toutes les
+    `refresh_interval` secondes ; il n'émet un delta que si une valeur a changé. Le coût serveur
+    ne dépend donc pas du nombre d'écrans connectés. Un client trop lent pour vider sa file
+    est resynchronisé par un instantané complet.
+    """
+    def __init__(self, build_payload, version=None, poll_interval=2.0, refresh_interval=30.0,
+                 heartbeat=15.0, queue_size=32):
+        self.build_payload = build_payload
+        self.version = version or (lambda: None)
+        self.poll_interval = poll_interval
+        self.refresh_interval = refresh_interval
+        self.heartbeat = heartbeat
+        self.queue_size = queue_size
+        self.snapshot = None
+        self.event_id = 0
+        self.computations = 0
+        self.last_error = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def _compute(self):
+        payload = _normalize(self.build_payload())
+        self.computations += 1
+        with self._lock:
+            delta = diff_payload(self.snapshot, payload) if self.snapshot is not None else None
+            first = self.snapshot is None
+            self.snapshot = payload
+            if not first and delta is None: return
+            self.event_id += 1
+            message = ('snapshot', payload) if first else ('delta', dict(delta, timestamp=payload.get('timestamp')))
+            for q in list(self._subscribers):
+                try:
+                    q.put_nowait((self.event_id, message))
+                except queue.Full:
+                    self._resync(q)
+
+    def _resync(self, q):
+        while True:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                break
+        q.put_nowait((self.event_id, ('snapshot', self.snapshot)))
+
+    def _loop(self):
+        last_version, last_compute = object(), 0.0
+        while True:
+            with self._lock:
+                idle = not self._subscribers
+            if idle:
+                # Aucun écran connecté : on attend le prochain abonnement sans rien calculer
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            try:
+                current = self.version()
+                if current != last_version or time.monotonic() - last_compute >= self.refresh_interval:
+                    self._compute()
+                    last_version, last_compute = current, time.monotonic()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Erreur lors du calcul du flux du tableau de bord: {e}")
+            time.sleep(self.poll_interval)
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='dashboard-stream', daemon=True)
+                self._thread.start()
+
+    def subscribe(self):
+        """Générateur SSE d'un client : instantané initial, puis deltas et battements de cœur"""
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(q)
+            if self.snapshot is not None:
+                q.put_nowait((self.event_id, ('snapshot', self.snapshot)))
+        self._ensure_started()
+        self._wakeup.set()
+        try:
+            yield f'retry: {int(self.poll_interval * 1000) + 1000}\n\n'
+            while True:
+                try:
+                    event_id, (name, data) = q.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield _event(name, data, event_id)
+        finally:
+            with self._lock:
+                self._subscribers.discard(q)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers), 'computations': self.computations,
+                'event_id': self.event_id, 'last_error': self.last_error,
+                'running': self._thread is not None and self._thread.is_alive()
+            }
@@ -0,0 +1,166 @@
+"""
+Routeur d'intentions de l'agent : une expression régulière compilée extrait intentions et entités
+(ligne, machine, produit, quantité, horizon, vitesse) en un seul parcours de la requête
+"""
+
+import argparse
+import re
+import time
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+from data.products_catalog import PRODUCTS_CATALOG
+
+# Lexiques d'intention (sans accents, minuscules) ; un terme reconnaît aussi ses suffixes (pannes, arrêts...)
+INTENT_LEXICON = {
+    'forecast': ['prevoir', 'prevision', 'prediction', 'predire', 'futur', 'oee', 'semaine', 'tendance'],
+    'recommend': ['recommand', 'choisir', 'quelle ligne', 'meilleure'],
+    'downtime': ['arret', 'pareto', 'mtbf', 'mttr', 'defaut', 'disponibilite'],
+    'anomaly': ['probleme', 'panne', 'erreur', 'anomalie', 'solution'],
+    'speed': ['vitesse', 'optimiser', 'sweet spot', 'rapide', 'cadence']
+}
+# Ordre des actions planifiées, quel que soit l'ordre d'apparition dans la requête
+INTENT_ORDER = ('forecast', 'recommend', 'downtime', 'anomaly', 'speed')
+
+# Alias courts en complément des noms, types et codes du catalogue
+PRODUCT_ALIASES = {
+    'carre': 'Fond_Carre_Sans_Poignees', 'sans poignees': 'Fond_Carre_Sans_Poignees',
+    'poignees plates': 'Fond_Carre_Poignees_Plates', 'poignees torsadees': 'Fond_Carre_Poignees_Torsadees',
+    'torsadees': 'Fond_Carre_Poignees_Torsadees'
+}
+HORIZON_UNITS = {'j': 1, 'jour': 1, 'jours': 1, 'day': 1, 'days': 1, 'sem': 7, 'semaine': 7, 'semaines': 7, 'week': 7, 'weeks': 7}
+HORIZON_WORDS = {'demain': 1, 'semaine': 7, 'mois': 30}
+# Horizon maximal d'une prévision : « 999 semaines » est ramené à 90 jours
+MAX_HORIZON_DAYS = 90
+
+RoutedQuery = namedtuple('RoutedQuery', 'intents line machine product quantity horizon_days speed')
+
+def normalize(text):
+    """Minuscules sans accents : les lexiques et la requête sont comparés sous cette forme"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+def _alternation(terms):
+    return '|'.join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+
+class IntentRouter:
+    """Automate unique construit à partir du catalogue, des lignes, des machines et des lexiques.
+
+    `route` parcourt la requête une seule fois avec `finditer` ; les requêtes déjà vues sont
+    servies depuis un cache LRU (le résultat est un tuple nommé immuable).
+    """
+    def __init__(self, lines=('L1', 'L2', 'L3'), machines=(), products=PRODUCTS_CATALOG, cache_size=1024):
+        self.lines = {normalize(l): l for l in lines}
+        self.machines = {normalize(m): m for m in machines}
+        self.products = {}
+        for p in products:
+            for alias in (p['name'], p['type'].replace('_', ' '), p['code']):
+                self.products[normalize(alias)] = p['type']
+        for alias, product_type in PRODUCT_ALIASES.items():
+            if any(p['type'] == product_type for p in products):
+                self.products.setdefault(alias, product_type)
+        self.intents = {term: intent for intent, terms in INTENT_LEXICON.items() for term in terms}
+
+        B, E = r'(?<![a-z0-9])', r'(?![a-z0-9])'
+        patterns = [
+            rf"{B}(?P<speed>\d{{2,5}})\s*(?:pcs|pieces|sacs|p)?\s*(?:/\s*h|par heure){E}",
+            rf"{B}(?P<horizon>\d{{1,3}})\s*(?P<unit>{_alternation(HORIZON_UNITS)}){E}",
+            rf"{B}(?P<quantity>\d{{1,3}}(?:[ .]\d{{3}})+|\d+)\s*(?:pieces?|pcs|sacs?|unites?){E}",
+            rf"{B}(?P<line>{_alternation(self.lines)}){E}",
+            rf"{B}(?:ligne|line)\s*(?P<line_number>\d{{1,2}}){E}",
+        ]
+        if self.machines:
+            patterns.append(rf"{B}(?P<machine>{_alternation(self.machines)}){E}")
+        patterns += [
+            rf"{B}(?P<product>{_alternation(self.products)}){E}",
+            rf"{B}(?P<horizon_word>{_alternation(HORIZON_WORDS)}){E}",
+            rf"{B}(?P<intent>{_alternation(self.intents)})",
+        ]
+        self.pattern = re.compile('|'.join(patterns))
+        self.route = lru_cache(maxsize=cache_size)(self._route)
+
+    def _route(self, query):
+        intents, entities, product_alias = [], {}, ''
+        for m in self.pattern.finditer(normalize(query)):
+            kind = m.lastgroup
+            if kind == 'intent':
+                intent = self.intents[m.group('intent')]
+                if intent not in intents: intents.append(intent)
+            elif kind == 'speed':
+                entities.setdefault('speed', int(m.group('speed')))
+            elif kind == 'unit':
+                entities.setdefault('horizon_days', max(1, min(int(m.group('horizon')) * HORIZON_UNITS[m.group('unit')], MAX_HORIZON_DAYS)))
+            elif kind == 'quantity':
+                entities.setdefault('quantity', int(re.sub(r'\D', '', m.group('quantity'))))
+            elif kind == 'line':
+                entities.setdefault('line', self.lines[m.group('line')])
+            elif kind == 'line_number':
+                entities.setdefault('line', self.lines.get(f"l{int(m.group('line_number'))}"))
+            elif kind == 'machine':
+                entities.setdefault('machine', self.machines[m.group('machine')])
+            elif kind == 'product':
+                # L'alias le plus long est le plus spécifique (« poignées plates » plutôt que « carré »)
+                if len(m.group('product')) > len(product_alias):
+                    product_alias = m.group('product')
+                    entities['product'] = self.products[product_alias]
+            elif kind == 'horizon_word':
+                word = m.group('horizon_word')
+                entities.setdefault('horizon_days', HORIZON_WORDS[word])
+                # « semaine » porte à la fois un horizon et l'intention de prévision
+                if word in self.intents and self.intents[word] not in intents: intents.append(self.intents[word])
+        ordered = tuple(i for i in INTENT_ORDER if i in intents)
+        return RoutedQuery(ordered, entities.get('line'), entities.get('machine'), entities.get('product'),
+                           entities.get('quantity'), entities.get('horizon_days'), entities.get('speed'))
+
+    @classmethod
+    def from_store(cls, store):
+        """Lignes et machines connues des données chargées"""
+        stops = store.stops_data
+        machines = sorted(stops['machine_id'].astype(str).unique()) if stops is not None else ()
+        return cls(lines=store.lines or ('L1', 'L2', 'L3'), machines=machines)
+
+    def cache_info(self):
+        return self.route.cache_info()._asdict()
+
+SAMPLE_QUERIES = [
+    "Quelle est la prédiction OEE pour la ligne 2 sur 14 jours ?",
+    "Recommande-moi une ligne pour 5 000 sacs fond carré poignées torsadées",
+    "Pareto des arrêts sur L3 ce mois",
+    "Vibrations anormales sur M2-1, quelle solution ?",
+    "Est-ce que 1200 pcs/h est la meilleure vitesse pour P003 sur L1 ?",
+    "prévision L2, vitesse optimale et anomalies connues",
+    "Bonjour",
+]
+
+def _legacy_route(q):
+    """Chaîne de tests de sous-chaînes d'origine (référence du microbenchmark)"""
+    q = q.lower()
+    line = "L2" if "l2" in q else "L3" if "l3" in q else "L1"
+    product = "Fond_Carre_Sans_Poignees" if "carre" in q else "Fond_Plat"
+    for words in (["prévoir", "prediction", "futur", "oee", "semaine"], ["recommander", "choisir", "quelle ligne", "meilleure"],
+                  ["problème", "panne", "erreur", "anomalie", "solution"], ["vitesse", "optimiser", "sweet spot", "rapide"]):
+        if any(w in q for w in words): break
+    return line, product
+
+def benchmark(iterations=20000):
+    """Coût moyen par requête (µs) : routeur compilé sans cache, avec cache, et chaîne d'origine"""
+    router = IntentRouter(machines=[f'M{l}-{m}' for l in range(1, 4) for m in range(1, 5)])
+    queries = SAMPLE_QUERIES * (iterations // len(SAMPLE_QUERIES))
+    results = {}
+    for name, fn in (('compiled', router._route), ('compiled_cached', router.route), ('legacy_substring', _legacy_route)):
+        start = time.perf_counter()
+        for q in queries: fn(q)
+        results[name] = round((time.perf_counter() - start) / len(queries) * 1e6, 2)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Routeur d'intentions : analyse de requêtes et microbenchmark")
+    parser.add_argument('query', nargs='*', help="requête à analyser (sinon exemples intégrés)")
+    parser.add_argument('--bench', action='store_true', help="mesure le coût par requête")
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+    router = IntentRouter(machines=[f'M{l}-{m}' for l in range(1, 4) for m in range(1, 5)])
+    for q in [' '.join(args.query)] if args.query else SAMPLE_QUERIES:
+        print(f"{q}\n  -> {router.route(q)}")
+    if args.bench:
+        print("Coût moyen par requête (µs):", benchmark(args.iterations))
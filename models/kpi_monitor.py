@@ -0,0 +1,166 @@
+"""
+Détection d'anomalies en continu sur les KPI horaires : cartes de contrôle EWMA + CUSUM par ligne et par KPI
+"""
+
+import math
+import threading
+import pandas as pd
+
+# KPI surveillés (seules les baisses sont signalées) : colonne -> (libellé, préfixe du type d'alerte).
+# La vitesse n'en fait pas partie : elle varie avec le produit et la consigne, pas avec les défauts.
+MONITORED_KPIS = {
+    'oee': ('OEE', 'OEE'), 'availability': ('Disponibilité', 'Availability'),
+    'performance': ('Performance', 'Performance'), 'quality': ('Qualité', 'Quality')
+}
+# Seuils de l'ancienne règle (OEE < 70 %), appliqués à la moyenne EWMA : une valeur commune
+# à toutes les lignes, ou un dictionnaire {ligne: seuil}
+FLOORS = {'oee': 70.0}
+# Écart sous le niveau habituel d'une ligne en deçà duquel `from_frame` abaisse son seuil
+FLOOR_MARGIN = 5.0
+SEVERITY_RANK = {'Critical': 0, 'High': 1, 'Medium': 2}
+
+class KPIMonitor:
+    """État constant par (ligne, KPI) : moyenne et variance EWMA, somme CUSUM basse.
+
+    Chaque enregistrement coûte O(1) par KPI. Le score z est calculé contre la référence EWMA
+    avant de l'y intégrer, et la valeur intégrée est écrêtée à ±`clip` écarts-types pour que
+    la dérive ne contamine pas la référence. Une alerte s'ouvre quand -z ≥ `z_alert` ou que
+    la somme CUSUM dépasse `h`, pendant `min_run` enregistrements consécutifs (une alerte
+    critique s'ouvre immédiatement) ; elle est unique par (ligne, KPI), mise à jour tant que
+    la condition persiste et fermée quand -z < `z_clear` et CUSUM < h/2 (hystérésis).
+    """
+    def __init__(self, span=48, warmup=24, k=0.5, h=8.0, z_alert=3.5, z_clear=2.0, clip=3.0, min_run=3,
+                 kpis=MONITORED_KPIS, floors=FLOORS):
+        self.alpha = 2.0 / (span + 1)
+        self.warmup = warmup
+        self.k = k
+        self.h = h
+        self.z_alert = z_alert
+        self.z_clear = z_clear
+        self.clip = clip
+        self.min_run = min_run
+        self.kpis = dict(kpis)
+        self.floors = dict(floors)
+        self.updates = 0
+        self.opened = 0
+        self._state = {}
+        self._alerts = {}
+        self._lock = threading.Lock()
+
+    def _update(self, line_id, kpi, value, timestamp):
+        key = (line_id, kpi)
+        s = self._state.get(key)
+        if s is None:
+            # [n, moyenne, variance, cusum bas, enregistrements consécutifs hors contrôle]
+            self._state[key] = [1, value, 0.0, 0.0, 0]
+            return
+        n, mean, var = s[0], s[1], s[2]
+        if n < self.warmup:
+            # Amorçage : moyenne et variance cumulées, aucune alerte
+            delta = value - mean
+            mean += delta / (n + 1)
+            s[0], s[1], s[2] = n + 1, mean, var + (delta * (value - mean) - var) / (n + 1)
+            return
+        sigma = max(math.sqrt(var), 1e-3 * max(abs(mean), 1.0))
+        z = (value - mean) / sigma
+        # Somme plafonnée à 2h (seuil critique) : le retour à la normale est détecté en h/k enregistrements au plus
+        s[3] = min(2 * self.h, max(0.0, s[3] - z - self.k))
+        clipped = mean + max(-self.clip, min(self.clip, z)) * sigma
+        delta = clipped - mean
+        s[1] = mean + self.alpha * delta
+        s[2] = (1 - self.alpha) * (var + self.alpha * delta * delta)
+        s[0] = n + 1
+        self._evaluate(line_id, kpi, value, mean, z, s, timestamp)
+
+    def floor(self, line_id, kpi):
+        """Seuil fixe du KPI pour la ligne (None si aucun)"""
+        floor = self.floors.get(kpi)
+        return floor.get(line_id, FLOORS.get(kpi)) if isinstance(floor, dict) else floor
+
+    def _evaluate(self, line_id, kpi, value, expected, z, s, timestamp):
+        label, name = self.kpis[kpi]
+        drop, cusum = -z, s[3]
+        floor = self.floor(line_id, kpi)
+        key = (line_id, kpi)
+        alert = self._alerts.get(key)
+
+        if drop >= self.z_alert or cusum >= self.h:
+            severity = 'Critical' if drop >= self.z_alert + 1 or cusum >= 2 * self.h else 'High' if drop >= self.z_alert else 'Medium'
+            kind, message = f'{name}_Drop', f'Baisse de {label} sur {line_id}'
+        elif floor is not None and s[1] < floor:
+            severity, kind, message = 'High', f'Low_{name}', f'{label} en dessous du seuil sur {line_id}'
+        elif alert is not None and (drop >= self.z_clear or cusum >= self.h / 2):
+            # Hystérésis : l'alerte reste ouverte, ramenée au niveau le plus bas
+            severity, kind, message = 'Medium', alert['type'], alert['message']
+        else:
+            s[4] = 0
+            self._alerts.pop(key, None)
+            return
+        if alert is None:
+            s[4] += 1
+            if severity != 'Critical' and s[4] < self.min_run: return
+            self.opened += 1
+            alert = self._alerts[key] = {'line_id': line_id, 'kpi': kpi, 'since': timestamp, 'observations': 0}
+        alert.update({
+            'severity': severity, 'type': kind, 'message': message, 'current': round(float(value), 2),
+            'expected': round(float(expected), 2), 'z_score': round(float(z), 2), 'cusum': round(float(cusum), 2),
+            'timestamp': timestamp
+        })
+        alert['observations'] += 1
+
+    def update(self, line_id, timestamp, values):
+        """Intègre un enregistrement horaire ; `values` associe chaque KPI surveillé à sa valeur"""
+        timestamp = pd.Timestamp(timestamp).isoformat()
+        with self._lock:
+            for kpi in self.kpis:
+                value = values.get(kpi)
+                if value is None or value != value: continue
+                self._update(str(line_id), kpi, float(value), timestamp)
+            self.updates += 1
+
+    def update_frame(self, df):
+        """Intègre un lot (dans l'ordre chronologique) : un seul parcours Python sur des tableaux NumPy"""
+        if df is None or len(df) == 0: return
+        df = df.sort_values('timestamp', kind='stable')
+        kpis = [k for k in self.kpis if k in df.columns]
+        lines = df['line_id'].astype(str).to_numpy()
+        stamps = [ts.isoformat() for ts in pd.to_datetime(df['timestamp'])]
+        values = df[kpis].to_numpy(dtype=float)
+        with self._lock:
+            for line_id, timestamp, row in zip(lines, stamps, values):
+                for kpi, value in zip(kpis, row):
+                    if value == value:
+                        self._update(line_id, kpi, value, timestamp)
+            self.updates += len(df)
+
+    @classmethod
+    def from_frame(cls, oee, seed_hours=24 * 14, floors=None, **kwargs):
+        """Moniteur amorcé sur les `seed_hours` dernières heures de chaque ligne.
+
+        Sans `floors` explicites, le seuil de chaque ligne est abaissé à son niveau moyen
+        sur tout l'historique moins FLOOR_MARGIN : une ligne dont l'OEE habituel est sous
+        le seuil commun (L3, ~69 %) ne reste pas en alerte permanente.
+        """
+        if floors is None:
+            floors = dict(FLOORS)
+            if oee is not None and len(oee):
+                kpis = [k for k in floors if k in oee.columns]
+                baselines = oee.groupby(oee['line_id'].astype(str))[kpis].mean()
+                for kpi in kpis:
+                    floors[kpi] = {line: min(FLOORS[kpi], float(level) - FLOOR_MARGIN) for line, level in baselines[kpi].items()}
+        monitor = cls(floors=floors, **kwargs)
+        if oee is not None and len(oee):
+            start = oee['timestamp'].max() - pd.Timedelta(hours=seed_hours)
+            monitor.update_frame(oee[oee['timestamp'] >= start])
+        return monitor
+
+    def alerts(self, line_id=None):
+        """Alertes ouvertes, des plus graves aux moins graves"""
+        with self._lock:
+            alerts = [dict(a) for (line, _), a in self._alerts.items() if line_id in (None, 'all', line)]
+        return sorted(alerts, key=lambda a: (SEVERITY_RANK[a['severity']], a['line_id'], a['kpi']))
+
+    def stats(self):
+        with self._lock:
+            return {'series': len(self._state), 'updates': self.updates, 'open_alerts': len(self._alerts),
+                    'opened_total': self.opened}
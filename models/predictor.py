@@ -4,13 +4,24 @@ Modèle de prédiction OEE utilisant des algorithmes de Machine Learning
 
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.model_selection import train_test_split
+from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import mean_absolute_error, r2_score
 import joblib
+import copy
+import hashlib
+import json
 import os
-from datetime import datetime, timedelta
+import shutil
+import threading
+import uuid
+from datetime import timedelta
+from models.result_cache import TTLCache
+from models.tree_compiler import compile_ensemble, CompiledEnsemble
+from models.intent_router import MAX_HORIZON_DAYS
+
+FORECAST_HOURS = list(range(8, 21))
+# Artefacts d'une version du modèle, écrits ensemble dans `oee_artifacts/<version>/`
+ARTIFACT_FILES = {'model': 'oee_model.pkl', 'scaler': 'scaler.pkl', 'features': 'features.pkl'}
 
 class OEEPredictor:
     def __init__(self):
@@ -19,6 +30,10 @@ class OEEPredictor:
         self.feature_columns = []
         self.models_path = os.path.join(os.path.dirname(__file__), 'saved_models')
         self.trained = False
+        self.model_version = None
+        self.training_report = None
+        self.forecast_cache = TTLCache(maxsize=256, ttl=300)
+        self._swap_lock = threading.Lock()
         
         if not os.path.exists(self.models_path):
             os.makedirs(self.models_path)
@@ -45,109 +60,269 @@ class OEEPredictor:
                 
         return features[numeric_features]
     
-    def train(self):
-        from data.data_loader import DataLoader
+    def train(self, search=False, n_folds=3, max_workers=None):
+        """Entraîne l'ensemble avec validation croisée temporelle (et recherche d'hyperparamètres si `search`)"""
+        from data.data_store import get_data_store
+        from models.training_pipeline import TrainingPipeline, DEFAULT_CANDIDATES, SEARCH_CANDIDATES
         print("Entraînement du modèle de prédiction OEE...")
-        loader = DataLoader()
-        loader.load_data()
-        df = loader.get_data_for_training()
+        store = get_data_store()
+        store.ensure_loaded()
+        df = store.loader.get_data_for_training()
         
         if df is None or len(df) == 0:
             print("Erreur: Pas de données disponibles pour l'entraînement")
             return False
         
         X = self.prepare_features(df)
-        y = df['oee']
-        self.feature_columns = X.columns.tolist()
-        
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
+        feature_columns = X.columns.tolist()
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
         
-        rf_model = RandomForestRegressor(n_estimators=100, max_depth=15, random_state=42, n_jobs=-1)
-        rf_model.fit(X_train_scaled, y_train)
+        pipeline = TrainingPipeline(SEARCH_CANDIDATES if search else DEFAULT_CANDIDATES, n_folds=n_folds, max_workers=max_workers)
+        models, weights, report = pipeline.run(X_scaled, df['oee'].to_numpy(), df['timestamp'].to_numpy())
+        print(f"  - MAE (dernier pli réservé, {report['folds']} plis): {report['cv_mae']:.2f}% | R²: {report['cv_r2']:.3f} | "
+              f"MAE de sélection: {report['selection_mae']:.2f}% | poids: {report['weights']}")
+        print(f"  - Durées (s): {report['timings_seconds']}")
         
-        gb_model = GradientBoostingRegressor(n_estimators=100, max_depth=7, random_state=42)
-        gb_model.fit(X_train_scaled, y_train)
+        model = {'rf': models['rf'], 'gb': models['gb'], 'weights': weights,
+                 'trained_until': df['timestamp'].max(), 'training_report': report}
+        self.training_report = report
+        self._install(model, scaler, feature_columns)
+        return True
+    
+    def train_incremental(self, window_days=60, new_trees=10, extra_boosting=10, max_boosting=300):
+        """Met à jour l'ensemble avec les seules données arrivées depuis le dernier entraînement.
+
+        La forêt remplace ses `new_trees` plus anciens arbres par des arbres ajustés sur la
+        fenêtre récente ; le boosting ajoute `extra_boosting` étapes (warm start) sur cette même
+        fenêtre. Retourne None si rien n'est à faire et False si un réentraînement complet est
+        nécessaire (pas d'historique d'entraînement, ou boosting arrivé à `max_boosting`).
+        """
+        from data.data_store import get_data_store
+        if not self.trained and not self._load_model(): return False
+        model, scaler, feature_columns = self._state()
+        if 'compiled' in model:
+            # Servi depuis l'export compilé : les arbres scikit-learn sont rechargés pour la mise à jour
+            model = dict(joblib.load(self._artifact_paths()['model']), trained_until=model['trained_until'])
+        trained_until = model.get('trained_until')
+        if trained_until is None or model['gb'].n_estimators + extra_boosting > max_boosting:
+            return False
         
-        rf_pred = rf_model.predict(X_test_scaled)
-        gb_pred = gb_model.predict(X_test_scaled)
-        y_pred = 0.6 * rf_pred + 0.4 * gb_pred
+        store = get_data_store()
+        store.ensure_loaded()
+        df = store.loader.get_data_for_training()
+        if df is None or df['timestamp'].max() <= trained_until:
+            return None
+        window = df[df['timestamp'] > df['timestamp'].max() - timedelta(days=window_days)]
+        new_rows = int((df['timestamp'] > trained_until).sum())
+        X_window = scaler.transform(self.prepare_features(window)[feature_columns])
+        y_window = window['oee'].to_numpy()
         
-        mae = mean_absolute_error(y_test, y_pred)
-        r2 = r2_score(y_test, y_pred)
-        print(f"  - MAE: {mae:.2f}% | R²: {r2:.3f}")
+        # On travaille sur des copies : les requêtes en cours continuent sur l'ancien modèle
+        rf_model = copy.deepcopy(model['rf'])
+        fresh = RandomForestRegressor(n_estimators=new_trees, max_depth=rf_model.max_depth, random_state=len(df), n_jobs=-1)
+        fresh.fit(X_window, y_window)
+        rf_model.estimators_ = rf_model.estimators_[new_trees:] + fresh.estimators_
         
-        self.model = {'rf': rf_model, 'gb': gb_model, 'weights': [0.6, 0.4]}
-        self.trained = True
+        gb_model = copy.deepcopy(model['gb'])
+        gb_model.set_params(warm_start=True, n_estimators=gb_model.n_estimators + extra_boosting)
+        gb_model.fit(X_window, y_window)
         
-        joblib.dump(self.model, os.path.join(self.models_path, 'oee_model.pkl'))
-        joblib.dump(self.scaler, os.path.join(self.models_path, 'scaler.pkl'))
-        joblib.dump(self.feature_columns, os.path.join(self.models_path, 'features.pkl'))
+        updated = dict(model, rf=rf_model, gb=gb_model, trained_until=df['timestamp'].max())
+        self._install(updated, scaler, feature_columns)
+        print(f"Mise à jour incrémentale du modèle OEE: {new_rows} nouvelles lignes, fenêtre de {len(window)} lignes")
         return True
     
+    def _state(self):
+        """Instantané cohérent (modèle, scaler, colonnes) pour une prédiction"""
+        with self._swap_lock:
+            return self.model, self.scaler, self.feature_columns
+    
+    def _install(self, model, scaler, feature_columns, persist=True, version=None):
+        """Persiste les artefacts puis bascule le modèle actif.
+
+        Les trois fichiers sont écrits dans un nouveau répertoire `oee_artifacts/<version>/`,
+        puis le pointeur `current.json` est remplacé en dernier, atomiquement : un autre
+        processus lit soit l'ancien jeu complet, soit le nouveau, jamais un mélange.
+        """
+        if persist:
+            root = os.path.join(self.models_path, 'oee_artifacts')
+            name = uuid.uuid4().hex[:12]
+            target = os.path.join(root, name)
+            os.makedirs(target, exist_ok=True)
+            for key, obj in (('features', feature_columns), ('scaler', scaler), ('model', model)):
+                joblib.dump(obj, os.path.join(target, ARTIFACT_FILES[key]))
+            m_path = os.path.join(target, ARTIFACT_FILES['model'])
+            version = self._artifact_hash(m_path)
+            self._export_compiled(model, version, m_path)
+            previous = os.path.basename(self._artifact_dir())
+            pointer = os.path.join(root, 'current.json')
+            with open(pointer + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({'version': name}, f)
+            os.replace(pointer + '.tmp', pointer)
+            # La version précédente est conservée pour les lectures en cours, les plus anciennes sont supprimées
+            for entry in os.listdir(root):
+                if entry not in (name, previous) and os.path.isdir(os.path.join(root, entry)):
+                    shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+        version = version or self._artifact_hash()
+        with self._swap_lock:
+            self.model, self.scaler, self.feature_columns = model, scaler, feature_columns
+            self.model_version = version
+            self.trained = True
+    
     def predict(self, features_df):
         if not self.trained and not self._load_model(): return None
+        model, scaler, feature_columns = self._state()
         X = self.prepare_features(features_df)
-        for col in self.feature_columns:
+        for col in feature_columns:
             if col not in X.columns: X[col] = 0
-        X = X[self.feature_columns]
-        X_scaled = self.scaler.transform(X)
+        X = X[feature_columns]
+        X_scaled = scaler.transform(X)
+        return self._ensemble_predict(X_scaled, model)
+    
+    def _ensemble_predict(self, X_scaled, model):
+        if 'compiled' in model:
+            return np.clip(model['compiled'].predict(X_scaled), 40, 95)
+        w_rf, w_gb = model.get('weights', [0.6, 0.4])
+        rf_pred = model['rf'].predict(X_scaled)
+        gb_pred = model['gb'].predict(X_scaled)
+        return np.clip(w_rf * rf_pred + w_gb * gb_pred, 40, 95)
+    
+    def _future_feature_matrix(self, lines, last_timestamps, days, feature_columns):
+        """Matrice de features (lignes × jours × heures, colonnes) construite directement en NumPy"""
+        base = np.array([np.datetime64(ts, 'ns') for ts in last_timestamps])[:, None, None]
+        offsets = (np.arange(1, days + 1)[None, :, None] * 24 + np.array(FORECAST_HOURS)[None, None, :]).astype('timedelta64[h]')
+        ts = pd.DatetimeIndex((base + offsets).ravel())
+        columns = {
+            'hour': ts.hour.to_numpy(),
+            'day_of_week': ts.dayofweek.to_numpy(),
+            'month': ts.month.to_numpy(),
+            'day_of_year': ts.dayofyear.to_numpy(),
+            'week_of_year': ts.isocalendar().week.to_numpy(dtype=np.int64)
+        }
+        line_of_row = np.repeat(np.array(lines), days * len(FORECAST_HOURS))
+        for line in ['L1', 'L2', 'L3']:
+            columns[f'line_{line}'] = (line_of_row == line).astype(int)
         
-        rf_pred = self.model['rf'].predict(X_scaled)
-        gb_pred = self.model['gb'].predict(X_scaled)
-        return np.clip(0.6 * rf_pred + 0.4 * gb_pred, 40, 95)
+        X = np.zeros((len(ts), len(feature_columns)))
+        for j, col in enumerate(feature_columns):
+            if col in columns: X[:, j] = columns[col]
+        return X
     
-    def predict_next_days(self, days=7):
-        from data.data_loader import DataLoader
+    def predict_next_days(self, days=7, lines=None):
+        """Prévision OEE journalière par ligne ; `lines` restreint le calcul aux lignes demandées"""
+        from data.data_store import get_data_store
+        if isinstance(days, bool) or not isinstance(days, (int, np.integer)) or not 1 <= days <= MAX_HORIZON_DAYS:
+            raise ValueError(f"Horizon invalide: {days!r} (entier de 1 à {MAX_HORIZON_DAYS} jours)")
         if not self.trained and not self._load_model(): return {}
-        loader = DataLoader()
-        loader.load_data()
-        recent_data = loader.oee_data.tail(168)
+        oee_data = get_data_store().oee_data
+        if oee_data is None: return {}
+        recent_data = oee_data.tail(168)
+        model, scaler, feature_columns = self._state()
+        model_version = self.model_version
         
         predictions = {}
-        for line in ['L1', 'L2', 'L3']:
+        pending = []
+        for line in [l for l in ['L1', 'L2', 'L3'] if lines is None or l in lines]:
             line_data = recent_data[recent_data['line_id'] == line]
             if len(line_data) == 0: continue
             
             last_timestamp = line_data['timestamp'].max()
-            future_features = []
-            for d in range(days):
-                date = last_timestamp + timedelta(days=d+1)
-                for hour in range(8, 21):
-                    future_features.append({
-                        'timestamp': date + timedelta(hours=hour),
-                        'line_id': line
-                    })
-            
-            future_df = pd.DataFrame(future_features)
-            preds = self.predict(future_df)
+            # La prévision ne change qu'avec le modèle ou le dernier horodatage des données
+            cache_key = (line, days, model_version, last_timestamp)
+            cached = self.forecast_cache.get(cache_key)
+            if cached is not None:
+                predictions[line] = cached
+            else:
+                pending.append((line, last_timestamp, cache_key))
+        
+        if pending:
+            # Une seule passe d'inférence pour toutes les lignes × jours × heures manquantes
+            X = self._future_feature_matrix([p[0] for p in pending], [p[1] for p in pending], days, feature_columns)
+            X_scaled = (X - scaler.mean_) / scaler.scale_
+            preds = self._ensemble_predict(X_scaled, model).reshape(len(pending), days, len(FORECAST_HOURS))
+            daily_means = preds.mean(axis=2)
+            trends = self._calculate_trends(preds)
             
-            if preds is not None:
+            for i, (line, last_timestamp, cache_key) in enumerate(pending):
                 daily_preds = []
-                for i in range(days):
-                    day_values = preds[i*13:(i+1)*13]
+                for d in range(days):
                     daily_preds.append({
-                        'date': (last_timestamp + timedelta(days=i+1)).strftime('%Y-%m-%d'),
-                        'oee_predicted': round(float(np.mean(day_values)), 2),
-                        'trend': self._calculate_trend(day_values)
+                        'date': (last_timestamp + timedelta(days=d+1)).strftime('%Y-%m-%d'),
+                        'oee_predicted': round(float(daily_means[i, d]), 2),
+                        'trend': trends[i, d]
                     })
                 predictions[line] = daily_preds
-        return predictions
+                self.forecast_cache.set(cache_key, daily_preds)
+        return {line: predictions[line] for line in ['L1', 'L2', 'L3'] if line in predictions}
     
-    def _calculate_trend(self, p):
-        if len(p) < 2: return 'Stable'
-        slope = np.polyfit(np.arange(len(p)), p, 1)[0]
-        return 'Augmentation' if slope > 0.5 else 'Diminution' if slope < -0.5 else 'Stable'
+    def _calculate_trends(self, p):
+        """Tendance de chaque journée (pente des moindres carrés sur le dernier axe)"""
+        if p.shape[-1] < 2: return np.full(p.shape[:-1], 'Stable', dtype=object)
+        x = np.arange(p.shape[-1]) - (p.shape[-1] - 1) / 2
+        slope = (p * x).sum(axis=-1) / (x * x).sum()
+        return np.where(slope > 0.5, 'Augmentation', np.where(slope < -0.5, 'Diminution', 'Stable')).astype(object)
     
+    def _artifact_dir(self):
+        """Répertoire de la version courante (pointeur `oee_artifacts/current.json`), sinon l'ancien emplacement à plat"""
+        root = os.path.join(self.models_path, 'oee_artifacts')
+        try:
+            with open(os.path.join(root, 'current.json'), encoding='utf-8') as f:
+                return os.path.join(root, json.load(f)['version'])
+        except (OSError, ValueError, KeyError):
+            return self.models_path
+
+    def _artifact_paths(self):
+        directory = self._artifact_dir()
+        return {key: os.path.join(directory, name) for key, name in ARTIFACT_FILES.items()}
+
     def _load_model(self):
         try:
-            m_path = os.path.join(self.models_path, 'oee_model.pkl')
-            s_path = os.path.join(self.models_path, 'scaler.pkl')
-            f_path = os.path.join(self.models_path, 'features.pkl')
+            paths = self._artifact_paths()
+            m_path, s_path, f_path = paths['model'], paths['scaler'], paths['features']
             if os.path.exists(m_path):
-                self.model, self.scaler, self.feature_columns = joblib.load(m_path), joblib.load(s_path), joblib.load(f_path)
-                self.trained = True
+                if self._load_compiled(m_path, s_path, f_path):
+                    return True
+                self._install(joblib.load(m_path), joblib.load(s_path), joblib.load(f_path), persist=False,
+                              version=self._artifact_hash(m_path))
                 return True
         except: pass
         return False
+    
+    def _export_compiled(self, model, version, source_path):
+        """Exporte l'ensemble en tableaux de nœuds plats (chargement mmap en quelques millisecondes)"""
+        try:
+            compiled = compile_ensemble(model)
+            stat = os.stat(source_path)
+            compiled.meta.update(
+                weights=list(model.get('weights', [0.6, 0.4])),
+                trained_until=str(model['trained_until']) if model.get('trained_until') is not None else None,
+                source_dir=os.path.basename(os.path.dirname(source_path)), source_size=stat.st_size,
+                source_mtime_ns=stat.st_mtime_ns)
+            compiled.save(os.path.join(self.models_path, 'oee_compiled'), version)
+        except Exception as e:
+            print(f"Export compilé du modèle OEE impossible: {e}")
+    
+    def _load_compiled(self, m_path, s_path, f_path):
+        compiled = CompiledEnsemble.load(os.path.join(self.models_path, 'oee_compiled'))
+        if compiled is None: return False
+        # L'export n'est servi que s'il provient exactement du pickle présent (même empreinte SHA-1) ;
+        # l'empreinte n'est recalculée que si le répertoire, la taille ou la date de modification du pickle diffèrent
+        meta, stat = compiled.meta, os.stat(m_path)
+        source = (os.path.basename(os.path.dirname(m_path)), stat.st_size, stat.st_mtime_ns)
+        if (meta.get('source_dir'), meta.get('source_size'), meta.get('source_mtime_ns')) != source \
+                and meta.get('source_hash') != self._artifact_hash(m_path):
+            return False
+        trained_until = compiled.meta.get('trained_until')
+        model = {'compiled': compiled, 'weights': compiled.meta['weights'],
+                 'trained_until': pd.Timestamp(trained_until) if trained_until else None}
+        self._install(model, joblib.load(s_path), joblib.load(f_path), persist=False, version=compiled.meta['source_hash'])
+        return True
+    
+    def _artifact_hash(self, path=None):
+        """Empreinte SHA-1 de l'artefact du modèle (clé de version du cache de prévisions)"""
+        h = hashlib.sha1()
+        with open(path or self._artifact_paths()['model'], 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
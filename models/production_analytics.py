@@ -0,0 +1,238 @@
+"""
+Analyse des arrêts et de la qualité : Pareto des temps d'arrêt, MTBF/MTTR, défauts par équipe
+et attribution des pertes de disponibilité
+"""
+
+import threading
+import numpy as np
+import pandas as pd
+
+# Types d'arrêt comptés comme défaillances pour le MTBF / MTTR
+FAILURE_TYPES = ('Panne_Mecanique', 'Panne_Electrique')
+
+STOP_KEYS = ['day', 'line_id', 'machine_id', 'stop_type']
+QUALITY_KEYS = ['day', 'line_id', 'shift', 'defect_type']
+OEE_KEYS = ['day', 'line_id']
+
+def _days(values):
+    return np.asarray(values, dtype='datetime64[ns]').astype('datetime64[D]').astype('datetime64[ns]')
+
+def _rollup(frame, keys, values):
+    """Agrège un lot par jour et par clés catégorielles (groupby vectorisé sur les codes)"""
+    for key in keys[1:]:
+        frame[key] = frame[key].astype('category')
+    return frame.groupby(keys, observed=True, sort=False)[values].sum().reset_index()
+
+def _merge(current, new, keys):
+    """Fusionne un lot agrégé dans les cumuls : seuls les jours présents dans le lot sont regroupés.
+
+    Les catégories des cumuls sont étendues aux nouvelles valeurs du lot (sans conversion en
+    texte), de sorte que la concaténation conserve des colonnes catégorielles cohérentes.
+    """
+    if current is None or current.empty: return new
+    if new.empty: return current
+    updates = {}
+    for key in keys[1:]:
+        categories = current[key].cat.categories
+        missing = new[key].cat.categories.difference(categories)
+        if len(missing):
+            categories = categories.append(missing)
+            updates[key] = current[key].cat.add_categories(missing)
+        new[key] = new[key].cat.set_categories(categories)
+    if updates:
+        current = current.assign(**updates)
+    affected = current['day'].isin(new['day'].unique())
+    if not affected.any():
+        return pd.concat([current, new], ignore_index=True)
+    regrouped = pd.concat([current[affected], new], ignore_index=True)
+    regrouped = regrouped.groupby(keys, observed=True, sort=False).sum().reset_index()
+    return pd.concat([current[~affected], regrouped], ignore_index=True)
+
+class ProductionAnalytics:
+    """Agrégats journaliers des arrêts, de la qualité et de l'OEE, interrogés par fenêtre glissante.
+
+    Les tables brutes ne sont parcourues qu'une fois ; les lots ajoutés ensuite (`add_stops`,
+    `add_quality`, `add_oee`) sont agrégés puis fusionnés dans les cumuls existants, dont la
+    taille dépend du nombre de jours × machines × causes et non du nombre d'événements.
+    """
+    def __init__(self):
+        self.stops = None
+        self.quality = None
+        self.oee = None
+        self.version = None
+        self._lock = threading.Lock()
+
+    def build(self, store):
+        """(Re)construit les cumuls depuis le DataStore si ses données ont changé"""
+        store.ensure_loaded()
+        if self.version == store.version: return self
+        with self._lock:
+            if self.version == store.version: return self
+            self._rebuild(store)
+        return self
+
+    def _rebuild(self, store):
+        version, (stops, quality, oee) = store.snapshot('stops', 'quality', 'oee')
+        self.stops = self.quality = self.oee = None
+        self.add_stops(stops, lock=False)
+        self.add_quality(quality, lock=False)
+        self.add_oee(oee, lock=False)
+        self.version = version
+
+    def _add(self, attr, new, keys, lock):
+        if lock:
+            with self._lock:
+                setattr(self, attr, _merge(getattr(self, attr), new, keys))
+        else:
+            setattr(self, attr, _merge(getattr(self, attr), new, keys))
+
+    def add_stops(self, stops, lock=True):
+        if stops is None or len(stops) == 0: return
+        frame = pd.DataFrame({
+            'day': _days(stops['start_time']), 'line_id': stops['line_id'].to_numpy(),
+            'machine_id': stops['machine_id'].to_numpy(), 'stop_type': stops['stop_type'].to_numpy(),
+            'events': np.ones(len(stops), dtype=np.int64), 'minutes': stops['duration_minutes'].to_numpy(dtype=np.int64)
+        })
+        self._add('stops', _rollup(frame, STOP_KEYS, ['events', 'minutes']), STOP_KEYS, lock)
+
+    def add_quality(self, quality, lock=True):
+        if quality is None or len(quality) == 0: return
+        frame = pd.DataFrame({
+            'day': _days(quality['timestamp']), 'line_id': quality['line_id'].to_numpy(),
+            'shift': quality['shift'].to_numpy(), 'defect_type': quality['defect_type'].to_numpy(),
+            'batches': np.ones(len(quality), dtype=np.int64)
+        })
+        for col in ('total_produced', 'total_defects', 'rework_count', 'scrap_count'):
+            frame[col] = quality[col].to_numpy(dtype=np.int64)
+        values = ['batches', 'total_produced', 'total_defects', 'rework_count', 'scrap_count']
+        self._add('quality', _rollup(frame, QUALITY_KEYS, values), QUALITY_KEYS, lock)
+
+    def add_oee(self, oee, lock=True):
+        if oee is None or len(oee) == 0: return
+        frame = pd.DataFrame({
+            'day': _days(oee['timestamp']), 'line_id': oee['line_id'].to_numpy(),
+            'hours': np.ones(len(oee), dtype=np.int64),
+            'planned_minutes': oee['planned_production_time'].to_numpy(dtype=np.int64),
+            'availability_sum': oee['availability'].to_numpy(dtype=np.float64)
+        })
+        self._add('oee', _rollup(frame, OEE_KEYS, ['hours', 'planned_minutes', 'availability_sum']), OEE_KEYS, lock)
+
+    def ingest(self, kind, df, version, store):
+        """Fusionne le lot qui a produit la `version` du store.
+
+        Un lot déjà couvert par une reconstruction (version atteinte) est ignoré ; si une
+        version intermédiaire manque, les cumuls sont reconstruits depuis le store.
+        """
+        with self._lock:
+            if self.version is None or self.version >= version: return
+            if self.version == version - 1:
+                {'stops': self.add_stops, 'quality': self.add_quality, 'oee': self.add_oee}[kind](df, lock=False)
+                self.version = version
+            else:
+                self._rebuild(store)
+
+    def _window(self, rollup, line_id='all', days=30):
+        """Sous-ensemble des `days` derniers jours (relatifs au dernier jour connu de la table)"""
+        if rollup is None or rollup.empty: return rollup
+        mask = rollup['day'] > rollup['day'].max() - np.timedelta64(days, 'D')
+        if line_id and line_id != 'all':
+            mask &= rollup['line_id'] == line_id
+        return rollup[mask]
+
+    @staticmethod
+    def _period(window):
+        if window is None or window.empty: return None
+        return {'start': window['day'].min().strftime('%Y-%m-%d'), 'end': window['day'].max().strftime('%Y-%m-%d')}
+
+    def pareto(self, by='stop_type', line_id='all', days=30, top=None):
+        """Pareto des temps d'arrêt par cause (`stop_type`) ou par machine (`machine_id`)"""
+        if by not in ('stop_type', 'machine_id'):
+            raise ValueError(f"Regroupement inconnu: {by} (stop_type ou machine_id)")
+        if top is not None and (isinstance(top, bool) or int(top) != top or top < 1):
+            raise ValueError(f"top doit être un entier >= 1: {top}")
+        window = self._window(self.stops, line_id, days)
+        if window is None or window.empty: return {'by': by, 'total_minutes': 0, 'items': [], 'period': None}
+        grouped = window.groupby(by, observed=True)[['events', 'minutes']].sum().sort_values('minutes', ascending=False)
+        total = int(grouped['minutes'].sum())
+        share = grouped['minutes'] / max(total, 1) * 100
+        grouped = grouped.assign(share=share.round(2), cumulative_share=share.cumsum().round(2))
+        if top: grouped = grouped.head(int(top))
+        items = [{by: str(key), 'events': int(row.events), 'minutes': int(row.minutes), 'share': float(row.share),
+                  'cumulative_share': float(row.cumulative_share)} for key, row in zip(grouped.index, grouped.itertuples())]
+        return {'by': by, 'total_minutes': total, 'items': items, 'period': self._period(window)}
+
+    def reliability(self, line_id='all', days=30, failure_types=FAILURE_TYPES):
+        """MTBF et MTTR (heures / minutes) par machine sur la fenêtre.
+
+        Le temps de fonctionnement d'une machine est le temps planifié de sa ligne moins
+        l'ensemble de ses arrêts ; seuls les `failure_types` comptent comme défaillances.
+        """
+        window = self._window(self.stops, line_id, days)
+        if window is None or window.empty: return {'machines': [], 'period': None}
+        failures = window[window['stop_type'].isin(failure_types)] if failure_types else window
+        per_machine = window.groupby(['line_id', 'machine_id'], observed=True)['minutes'].sum().rename('downtime').to_frame()
+        per_machine = per_machine.join(failures.groupby(['line_id', 'machine_id'], observed=True)[['events', 'minutes']]
+                                       .sum().rename(columns={'events': 'failures', 'minutes': 'repair'})).fillna(0)
+        oee = self._window(self.oee, line_id, days)
+        planned = oee.groupby('line_id', observed=True)['planned_minutes'].sum() if oee is not None else pd.Series(dtype=float)
+        planned.index = planned.index.astype(str)
+        lines = per_machine.index.get_level_values('line_id').astype(str)
+        uptime = planned.reindex(lines).fillna(0).to_numpy() - per_machine['downtime'].to_numpy()
+        failures_n = per_machine['failures'].to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mtbf = np.where(failures_n > 0, uptime / 60 / failures_n, np.nan)
+            mttr = np.where(failures_n > 0, per_machine['repair'].to_numpy() / failures_n, np.nan)
+        machines = [{
+            'line_id': str(line), 'machine_id': str(machine), 'failures': int(n),
+            'downtime_minutes': int(down), 'mtbf_hours': None if np.isnan(b) else round(float(b), 1),
+            'mttr_minutes': None if np.isnan(r) else round(float(r), 1)
+        } for (line, machine), n, down, b, r in zip(per_machine.index, failures_n, per_machine['downtime'], mtbf, mttr)]
+        machines.sort(key=lambda m: (m['mtbf_hours'] is None, m['mtbf_hours'] or 0))
+        return {'machines': machines, 'failure_types': list(failure_types or []), 'period': self._period(window)}
+
+    def defects_by_shift(self, line_id='all', days=30):
+        """Répartition des défauts par type pour chaque équipe"""
+        window = self._window(self.quality, line_id, days)
+        if window is None or window.empty: return {'shifts': [], 'period': None}
+        by_shift = window.groupby('shift')[['total_produced', 'total_defects', 'rework_count', 'scrap_count']].sum()
+        by_type = window.groupby(['shift', 'defect_type'], observed=True)['total_defects'].sum()
+        shifts = []
+        for shift, row in by_shift.iterrows():
+            types = by_type.loc[shift].sort_values(ascending=False)
+            shifts.append({
+                'shift': int(shift), 'produced': int(row['total_produced']), 'defects': int(row['total_defects']),
+                'defect_rate': round(float(row['total_defects'] / max(row['total_produced'], 1) * 100), 2),
+                'rework': int(row['rework_count']), 'scrap': int(row['scrap_count']),
+                'by_type': [{'defect_type': str(t), 'defects': int(d), 'share': round(float(d / max(row['total_defects'], 1) * 100), 2)}
+                            for t, d in types.items()]
+            })
+        return {'shifts': shifts, 'period': self._period(window)}
+
+    def availability_losses(self, line_id='all', days=30):
+        """Attribue la perte de disponibilité de chaque ligne aux causes d'arrêt, au prorata des minutes"""
+        oee = self._window(self.oee, line_id, days)
+        stops = self._window(self.stops, line_id, days)
+        if oee is None or oee.empty: return {'lines': [], 'period': None}
+        per_line = oee.groupby('line_id', observed=True)[['hours', 'availability_sum']].sum()
+        causes = (stops.groupby(['line_id', 'stop_type'], observed=True)['minutes'].sum()
+                  if stops is not None and not stops.empty else pd.Series(dtype=float))
+        lines = []
+        for line, row in per_line.iterrows():
+            availability = row['availability_sum'] / row['hours']
+            loss = 100 - availability
+            line_causes = causes.loc[line].sort_values(ascending=False) if line in causes.index.get_level_values(0) else pd.Series(dtype=float)
+            total = line_causes.sum()
+            lines.append({
+                'line_id': str(line), 'availability': round(float(availability), 2), 'loss_points': round(float(loss), 2),
+                'stop_minutes': int(total),
+                'causes': [{'stop_type': str(t), 'minutes': int(m), 'loss_points': round(float(loss * m / total), 2)}
+                           for t, m in line_causes.items()] if total else []
+            })
+        return {'lines': lines, 'period': self._period(oee)}
+
+    def summary(self, line_id='all', days=30):
+        """Synthèse courte pour l'agent : première cause d'arrêt et machine la moins fiable"""
+        pareto = self.pareto('stop_type', line_id, days, top=3)
+        reliability = self.reliability(line_id, days)
+        worst = next((m for m in reliability['machines'] if m['mtbf_hours'] is not None), None)
+        return {'top_causes': pareto['items'], 'total_minutes': pareto['total_minutes'], 'least_reliable': worst, 'period': pareto['period']}
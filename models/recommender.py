@@ -2,10 +2,6 @@
 Système de recommandation de ligne optimale pour la production
 """
 
-import numpy as np
-import pandas as pd
-from datetime import datetime, timedelta
-
 class LineRecommender:
     def __init__(self):
         self.lines = ['L1', 'L2', 'L3']
@@ -16,26 +12,27 @@ class LineRecommender:
         }
         self.predictor = None
     
-    def initialize(self):
-        from models.predictor import OEEPredictor
-        self.predictor = OEEPredictor()
-        self.predictor._load_model()
+    def initialize(self, predictor=None):
+        """Réutilise le prédicteur de l'application s'il est fourni (évite de charger le modèle deux fois)"""
+        if predictor is None:
+            from models.predictor import OEEPredictor
+            predictor = OEEPredictor()
+            predictor._load_model()
+        self.predictor = predictor
     
     def get_best_line(self):
-        from data.data_loader import DataLoader
-        loader = DataLoader()
-        loader.load_data()
-        recent_data = loader.oee_data[loader.oee_data['timestamp'] >= loader.oee_data['timestamp'].max() - timedelta(days=7)]
+        from data.data_store import get_data_store
+        kpi_index = get_data_store().kpi_index
         
         scores = {}
         for line in self.lines:
-            line_data = recent_data[recent_data['line_id'] == line]
-            if len(line_data) > 0:
-                oee = line_data['oee'].mean()
-                avail = line_data['availability'].mean()
-                qual = line_data['quality'].mean()
-                perf = line_data['performance'].mean()
-                stab = 100 - line_data['oee'].std() * 2
+            stats = kpi_index.stats(line, '7d')
+            if stats is not None:
+                oee = stats['mean']['oee']
+                avail = stats['mean']['availability']
+                qual = stats['mean']['quality']
+                perf = stats['mean']['performance']
+                stab = 100 - stats['std']['oee'] * 2
                 
                 total_score = oee * 0.4 + avail * 0.2 + qual * 0.2 + perf * 0.1 + stab * 0.1
                 scores[line] = {
@@ -52,9 +49,6 @@ class LineRecommender:
         }
     
     def recommend(self, product_type='standard', quantity=1000):
-        from data.data_loader import DataLoader
-        loader = DataLoader()
-        loader.load_data()
         predictions = self.predictor.predict_next_days(days=1) if self.predictor and self.predictor.trained else None
         
         recommendations = []
@@ -0,0 +1,97 @@
+"""
+Cache de résultats en mémoire avec expiration (TTL), éviction LRU et regroupement des calculs concurrents
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class _InFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class TTLCache:
+    """Cache LRU borné dont les entrées expirent après `ttl` secondes (thread-safe)"""
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute, timeout=None):
+        """Valeur en cache, sinon calculée une seule fois même si plusieurs threads la demandent.
+
+        Les appels concurrents sur une clé absente attendent le calcul du premier (au plus
+        `timeout` secondes, sinon TimeoutError) et partagent son résultat (ou son exception) ;
+        seuls les succès sont mis en cache.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING: return value
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InFlight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            if not call.event.wait(timeout):
+                raise TimeoutError(f"Calcul en cours non terminé après {timeout} s")
+            if call.error is not None: raise call.error
+            return call.value
+        try:
+            call.value = compute()
+            self.set(key, call.value)
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data), 'maxsize': self.maxsize, 'ttl_seconds': self.ttl,
+            'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'coalesced': self.coalesced,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0
+        }
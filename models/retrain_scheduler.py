@@ -0,0 +1,72 @@
+"""
+Planificateur de réentraînement en arrière-plan du modèle de prédiction OEE
+"""
+
+import threading
+import time
+from datetime import datetime
+
+class RetrainScheduler:
+    """Lance périodiquement `train_incremental` dans un thread démon.
+
+    Un réentraînement complet est déclenché quand la mise à jour incrémentale le demande
+    (ou toutes les `full_retrain_every` mises à jour). Le prédicteur bascule ses artefacts
+    de façon atomique : les requêtes ne sont jamais bloquées pendant l'entraînement.
+    """
+    def __init__(self, predictor, interval=3600, full_retrain_every=24):
+        self.predictor = predictor
+        self.interval = interval
+        self.full_retrain_every = full_retrain_every
+        self.runs = 0
+        self.last_run = None
+        self.last_mode = None
+        self.last_duration = None
+        self.last_error = None
+        self._incremental_runs = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        start = time.perf_counter()
+        result = self.predictor.train_incremental()
+        if result is False or (self.full_retrain_every and self._incremental_runs >= self.full_retrain_every):
+            self.predictor.train()
+            self._incremental_runs = 0
+            self.last_mode = 'full'
+        elif result:
+            self._incremental_runs += 1
+            self.last_mode = 'incremental'
+        else:
+            self.last_mode = 'skipped'
+        self.runs += 1
+        self.last_run = datetime.now().isoformat()
+        self.last_duration = round(time.perf_counter() - start, 3)
+        return self.last_mode
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Erreur lors du réentraînement planifié: {e}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='oee-retrain', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def status(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'interval_seconds': self.interval, 'runs': self.runs, 'last_run': self.last_run,
+            'last_mode': self.last_mode, 'last_duration_seconds': self.last_duration, 'last_error': self.last_error
+        }
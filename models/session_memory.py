@@ -0,0 +1,145 @@
+"""
+Mémoire de conversation de l'agent, bornée et isolée par session
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+DEFAULT_MAX_TURNS = 20
+DEFAULT_MAX_BYTES = 64 * 1024
+DEFAULT_MAX_SESSIONS = 1000
+DEFAULT_IDLE_TTL = 3600
+
+def _size(content):
+    return len(content.encode('utf-8'))
+
+class SessionMemory:
+    """Anneau de messages par session, sessions évincées par ancienneté d'usage (LRU).
+
+    Chaque session garde au plus `max_turns` messages et `max_bytes` octets de contenu ;
+    au-delà, les plus anciens sont oubliés. Les sessions inactives depuis `idle_ttl`
+    secondes, ou en surnombre au-delà de `max_sessions`, sont supprimées.
+    """
+    def __init__(self, max_turns=DEFAULT_MAX_TURNS, max_bytes=DEFAULT_MAX_BYTES,
+                 max_sessions=DEFAULT_MAX_SESSIONS, idle_ttl=DEFAULT_IDLE_TTL):
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.evicted_sessions = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - session['last_seen'] <= self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self.evicted_sessions += 1
+
+    def append(self, session_id, role, content):
+        now = time.time()
+        size = _size(content)
+        with self._lock:
+            session = self._sessions.pop(session_id, None) or {'turns': deque(maxlen=self.max_turns), 'bytes': 0}
+            if len(session['turns']) == self.max_turns:
+                session['bytes'] -= session['turns'][0]['bytes']
+            session['turns'].append({'role': role, 'content': content, 'bytes': size, 'timestamp': now})
+            session['bytes'] += size
+            while session['bytes'] > self.max_bytes and len(session['turns']) > 1:
+                session['bytes'] -= session['turns'].popleft()['bytes']
+            session['last_seen'] = now
+            self._sessions[session_id] = session
+            self._evict(now)
+
+    def history(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return [{'role': t['role'], 'content': t['content']} for t in session['turns']] if session else []
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory', 'sessions': len(self._sessions), 'evicted_sessions': self.evicted_sessions,
+                'bytes': sum(s['bytes'] for s in self._sessions.values()),
+                'max_turns': self.max_turns, 'max_bytes': self.max_bytes
+            }
+
+class SQLiteSessionMemory:
+    """Même interface que SessionMemory, persistée dans SQLite : les sessions survivent aux redémarrages"""
+    def __init__(self, path, max_turns=DEFAULT_MAX_TURNS, max_bytes=DEFAULT_MAX_BYTES, idle_ttl=DEFAULT_IDLE_TTL):
+        self.path = path
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.evicted_sessions = 0
+        self._appends = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS messages (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, role TEXT NOT NULL,
+                content TEXT NOT NULL, bytes INTEGER NOT NULL, created_at REAL NOT NULL)''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, seq)')
+
+    def append(self, session_id, role, content):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute('INSERT INTO messages (session_id, role, content, bytes, created_at) VALUES (?, ?, ?, ?, ?)',
+                               (session_id, role, content, _size(content), now))
+            # Conserve les messages les plus récents dans les budgets de tours et d'octets (au moins un)
+            rows = self._conn.execute('SELECT seq, bytes FROM messages WHERE session_id = ? ORDER BY seq DESC',
+                                      (session_id,)).fetchall()
+            kept, total = 0, 0
+            for seq, size in rows:
+                if kept and (kept >= self.max_turns or total + size > self.max_bytes):
+                    self._conn.execute('DELETE FROM messages WHERE session_id = ? AND seq <= ?', (session_id, seq))
+                    break
+                kept, total = kept + 1, total + size
+            self._appends += 1
+            if self._appends % 100 == 0:
+                self._evict_idle(now)
+
+    def _evict_idle(self, now):
+        idle = [r[0] for r in self._conn.execute(
+            'SELECT session_id FROM messages GROUP BY session_id HAVING MAX(created_at) < ?', (now - self.idle_ttl,))]
+        self._conn.executemany('DELETE FROM messages WHERE session_id = ?', [(s,) for s in idle])
+        self.evicted_sessions += len(idle)
+
+    def history(self, session_id):
+        with self._lock:
+            rows = self._conn.execute('SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq',
+                                      (session_id,)).fetchall()
+        return [{'role': role, 'content': content} for role, content in rows]
+
+    def clear(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
+
+    def stats(self):
+        with self._lock:
+            sessions, size = self._conn.execute('SELECT COUNT(DISTINCT session_id), COALESCE(SUM(bytes), 0) FROM messages').fetchone()
+        return {
+            'backend': 'sqlite', 'path': self.path, 'sessions': sessions, 'evicted_sessions': self.evicted_sessions,
+            'bytes': size, 'max_turns': self.max_turns, 'max_bytes': self.max_bytes
+        }
+
+def create_session_memory():
+    """Backend choisi par l'environnement : TECPAP_MEMORY_DB (chemin SQLite), TECPAP_MEMORY_TURNS, TECPAP_MEMORY_BYTES"""
+    max_turns = int(os.environ.get('TECPAP_MEMORY_TURNS', DEFAULT_MAX_TURNS))
+    max_bytes = int(os.environ.get('TECPAP_MEMORY_BYTES', DEFAULT_MAX_BYTES))
+    path = os.environ.get('TECPAP_MEMORY_DB')
+    if path:
+        return SQLiteSessionMemory(path, max_turns=max_turns, max_bytes=max_bytes)
+    return SessionMemory(max_turns=max_turns, max_bytes=max_bytes)
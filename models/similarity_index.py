@@ -0,0 +1,171 @@
+"""
+Index de similarité pour la recherche de cas d'anomalies (vecteurs TF-IDF normalisés)
+"""
+
+import threading
+import time
+from collections import deque
+import numpy as np
+from scipy import sparse
+
+class SimilarityIndex:
+    """Interface commune : ajout incrémental de vecteurs et recherche des k plus similaires.
+
+    Les vecteurs sont supposés normalisés L2 (sortie de TfidfVectorizer), le produit
+    scalaire est donc la similarité cosinus. La latence des requêtes est mesurée.
+    """
+    def __init__(self):
+        self.size = 0
+        self._latencies = deque(maxlen=1000)
+        self.queries = 0
+
+    def add(self, vectors):
+        raise NotImplementedError
+
+    def _search(self, query, k):
+        raise NotImplementedError
+
+    def vectors(self):
+        """Matrice CSR de tous les vecteurs indexés (pour la persistance)"""
+        raise NotImplementedError
+
+    def search(self, query, k=5):
+        """Retourne (indices, scores) des k vecteurs les plus similaires, par score décroissant"""
+        start = time.perf_counter()
+        ids, scores = self._search(sparse.csr_matrix(query), k)
+        self._latencies.append(time.perf_counter() - start)
+        self.queries += 1
+        return ids, scores
+
+    def stats(self):
+        lat = np.array(self._latencies) * 1000
+        return {
+            'type': type(self).__name__, 'size': self.size, 'queries': self.queries,
+            'latency_ms': {
+                'mean': round(float(lat.mean()), 4), 'p50': round(float(np.percentile(lat, 50)), 4),
+                'p95': round(float(np.percentile(lat, 95)), 4)
+            } if len(lat) else None
+        }
+
+def _top_k(ids, scores, k):
+    """Top-k par score décroissant ; à score égal, l'entrée la plus récente passe en premier"""
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[keep], scores[keep]
+    order = np.lexsort((-ids, -scores))
+    return ids[order], scores[order]
+
+class BruteForceIndex(SimilarityIndex):
+    """Produit scalaire contre toute la base (référence, coût linéaire)"""
+    def __init__(self):
+        super().__init__()
+        self._blocks = []
+        self._matrix = None
+
+    def add(self, vectors):
+        vectors = sparse.csr_matrix(vectors)
+        self._blocks.append(vectors)
+        self._matrix = None
+        self.size += vectors.shape[0]
+
+    def vectors(self):
+        if self._matrix is None:
+            self._matrix = sparse.vstack(self._blocks).tocsr()
+            self._blocks = [self._matrix]
+        return self._matrix
+
+    def _search(self, query, k):
+        if self.size == 0: return np.zeros(0, dtype=np.int64), np.zeros(0)
+        sims = (self.vectors() @ query.T).toarray().ravel()
+        return _top_k(np.arange(self.size), sims, k)
+
+class InvertedIndex(SimilarityIndex):
+    """Index inversé creux : seuls les documents partageant un terme avec la requête sont scorés.
+
+    Comme `max_df` de TfidfVectorizer, les termes de la requête présents dans plus de `max_df`
+    des documents indexés sont ignorés (sauf si tous le sont) : leurs listes couvrent presque
+    toute la base alors que leur idf, donc leur poids, est le plus faible. Le coût d'une
+    requête ne dépend plus que des termes discriminants ; en contrepartie, deux documents qui
+    ne se distinguent que par un terme très fréquent peuvent être classés différemment de la
+    recherche exhaustive, et un document qui ne partage que des termes très fréquents avec la
+    requête n'est pas retourné. `max_df=1.0` rend la recherche exacte.
+
+    Les listes de postings sont triées par poids décroissant ; `max_postings_per_term` les
+    tronque aux documents les plus marquants pour chaque terme (recherche approchée à coût
+    borné même sur les termes discriminants).
+    """
+    def __init__(self, max_df=0.5, max_postings_per_term=None):
+        super().__init__()
+        self.max_df = max_df
+        self.max_postings_per_term = max_postings_per_term
+        self.skipped_terms = 0
+        self._pending = {}
+        self._postings = {}
+        self._lock = threading.Lock()
+        self._width = 0
+
+    def add(self, vectors):
+        coo = sparse.csr_matrix(vectors).tocoo()
+        order = np.argsort(coo.col, kind='stable')
+        terms, rows, weights = coo.col[order], coo.row[order] + self.size, coo.data[order]
+        bounds = np.flatnonzero(np.diff(terms)) + 1
+        with self._lock:
+            for t_ids, t_weights, term in zip(np.split(rows, bounds), np.split(weights, bounds), terms[np.r_[0, bounds]] if len(terms) else []):
+                self._pending.setdefault(int(term), []).append((t_ids, t_weights))
+            self.size += coo.shape[0]
+            self._width = max(self._width, coo.shape[1])
+
+    def _term_postings(self, term):
+        with self._lock:
+            return self._merge_postings(term)
+
+    def _merge_postings(self, term):
+        pending = self._pending.pop(term, None)
+        if pending is not None:
+            ids, weights = self._postings.get(term, (np.zeros(0, dtype=np.int64), np.zeros(0)))
+            ids = np.concatenate([ids] + [p[0] for p in pending])
+            weights = np.concatenate([weights] + [p[1] for p in pending])
+            order = np.argsort(-weights, kind='stable')
+            self._postings[term] = (ids[order], weights[order])
+        ids, weights = self._postings.get(term, (None, None))
+        if ids is not None and self.max_postings_per_term:
+            return ids[:self.max_postings_per_term], weights[:self.max_postings_per_term]
+        return ids, weights
+
+    def _document_frequency(self, term):
+        """Nombre de documents contenant le terme (listes complètes, même si la recherche les tronque)"""
+        return len(self._postings[term][0])
+
+    def stats(self):
+        return dict(super().stats(), max_df=self.max_df, max_postings_per_term=self.max_postings_per_term,
+                    skipped_terms=self.skipped_terms)
+
+    def vectors(self):
+        with self._lock:
+            for term in list(self._pending):
+                self._merge_postings(term)
+            # postings non tronqués, même si la recherche l'est
+            terms = [np.full(len(ids), term, dtype=np.int64) for term, (ids, _) in self._postings.items()]
+            rows = [ids for ids, _ in self._postings.values()]
+            data = [weights for _, weights in self._postings.values()]
+            shape = (self.size, self._width)
+        if not terms: return sparse.csr_matrix(shape)
+        return sparse.csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(terms))), shape=shape)
+
+    def _search(self, query, k):
+        lists = []
+        for term, q_weight in zip(query.indices, query.data):
+            ids, weights = self._term_postings(int(term))
+            if ids is not None:
+                lists.append((ids, weights * q_weight, self._document_frequency(int(term))))
+        if not lists: return np.zeros(0, dtype=np.int64), np.zeros(0)
+        selective = [l for l in lists if l[2] <= self.max_df * self.size]
+        if selective:
+            self.skipped_terms += len(lists) - len(selective)
+            lists = selective
+        all_ids, all_scores = [l[0] for l in lists], [l[1] for l in lists]
+        ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        return _top_k(ids, scores, k)
+
+SIMILARITY_INDEXES = {'brute_force': BruteForceIndex, 'inverted': InvertedIndex}
@@ -3,11 +3,18 @@ Optimiseur de vitesse machine (Sweet Spot Finder)
 """
 
 import numpy as np
-import pandas as pd
 from sklearn.ensemble import GradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler
 import joblib
+import json
 import os
+from datetime import datetime
+
+ARTIFACT_VERSION = 1
+
+def _check_step(step):
+    if isinstance(step, bool) or not isinstance(step, (int, np.integer)) or step < 1:
+        raise ValueError(f"Le pas doit être un entier >= 1: {step}")
 
 class SpeedOptimizer:
     def __init__(self):
@@ -15,6 +22,9 @@ class SpeedOptimizer:
         self.model_quality = None
         self.scaler = StandardScaler()
         self.is_trained = False
+        self.response_surface = None
+        self.data_hash = None
+        self.models_path = os.path.join(os.path.dirname(__file__), 'saved_models')
         self.speed_ranges = {
             'L1': {'min': 700, 'max': 1300, 'optimal_estimate': 1000},
             'L2': {'min': 800, 'max': 1400, 'optimal_estimate': 1100},
@@ -35,12 +45,29 @@ class SpeedOptimizer:
         for product in self.product_characteristics.keys():
             features[f'product_{product}'] = (features['product_type'] == product).astype(int)
         
-        def get_speed_ratio(row):
-            return row['machine_speed'] / self.speed_ranges[row['line_id']]['optimal_estimate']
-        features['speed_ratio'] = features.apply(get_speed_ratio, axis=1)
+        optimal = {line: r['optimal_estimate'] for line, r in self.speed_ranges.items()}
+        features['speed_ratio'] = features['machine_speed'] / features['line_id'].astype(str).map(optimal).astype(float)
         
-        cols = ['machine_speed', 'speed_ratio', 'line_L1', 'line_L2', 'line_L3'] + [f'product_{p}' for p in self.product_characteristics.keys()]
-        return features[cols]
+        return features[self.feature_columns]
+    
+    @property
+    def feature_columns(self):
+        return ['machine_speed', 'speed_ratio', 'line_L1', 'line_L2', 'line_L3'] + [f'product_{p}' for p in self.product_characteristics.keys()]
+    
+    def _feature_matrix(self, line_ids, product_types, speeds):
+        """Matrice de features NumPy pour des tableaux alignés (ligne, produit, vitesse)"""
+        line_ids, product_types = np.asarray(line_ids), np.asarray(product_types)
+        speeds = np.asarray(speeds, dtype=float)
+        optimal = np.array([self.speed_ranges[l]['optimal_estimate'] for l in line_ids], dtype=float)
+        columns = [speeds, speeds / optimal] + [(line_ids == l).astype(float) for l in ['L1', 'L2', 'L3']]
+        columns += [(product_types == p).astype(float) for p in self.product_characteristics.keys()]
+        return np.column_stack(columns)
+    
+    def _predict_grid(self, line_ids, product_types, speeds):
+        """Production et qualité prédites pour tout un lot en un appel `predict` par modèle"""
+        X = self._feature_matrix(line_ids, product_types, speeds)
+        X_s = (X - self.scaler.mean_) / self.scaler.scale_
+        return self.model_production.predict(X_s), self.model_quality.predict(X_s)
     
     def train(self, data):
         data['production_rate'] = data['total_pieces']
@@ -55,25 +82,173 @@ class SpeedOptimizer:
         self.model_quality.fit(X_scaled, data['quality_rate'])
         
         self.is_trained = True
+        self._build_response_surface()
+        return True
+    
+    def ensure_trained(self, loader):
+        """Recharge les modèles persistés s'ils correspondent aux données, sinon réentraîne et persiste"""
+        data_hash = loader.get_source_hash('oee_data')
+        if self.load(data_hash):
+            return True
+        print("Entraînement de l'optimiseur de vitesse (artefacts absents ou périmés)...")
+        self.data_hash = data_hash
+        self.train(loader.get_data_for_training())
+        self.save(data_hash)
+        return True
+    
+    def _manifest(self, data_hash):
+        return {
+            'artifact_version': ARTIFACT_VERSION, 'data_hash': data_hash,
+            'feature_columns': self.feature_columns, 'speed_ranges': self.speed_ranges,
+            'products': list(self.product_characteristics.keys())
+        }
+    
+    def save(self, data_hash):
+        """Persiste modèles, scaler et manifeste (le manifeste est écrit en dernier, de façon atomique)"""
+        if not self.is_trained: return False
+        try:
+            os.makedirs(self.models_path, exist_ok=True)
+            tmp = os.path.join(self.models_path, 'speed_models.tmp.pkl')
+            joblib.dump({'production': self.model_production, 'quality': self.model_quality, 'scaler': self.scaler}, tmp)
+            os.replace(tmp, os.path.join(self.models_path, 'speed_models.pkl'))
+            manifest = dict(self._manifest(data_hash), trained_at=datetime.now().isoformat())
+            tmp = os.path.join(self.models_path, 'speed_manifest.tmp.json')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp, os.path.join(self.models_path, 'speed_manifest.json'))
+            return True
+        except OSError as e:
+            print(f"Modèles de vitesse non persistés: {e}")
+            return False
+    
+    def is_stale(self, data_hash):
+        """Vrai si le manifeste persisté ne correspond plus aux données ou au schéma de features"""
+        try:
+            with open(os.path.join(self.models_path, 'speed_manifest.json'), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return True
+        manifest.pop('trained_at', None)
+        return manifest != json.loads(json.dumps(self._manifest(data_hash)))
+    
+    def load(self, data_hash):
+        if self.is_stale(data_hash): return False
+        try:
+            artifacts = joblib.load(os.path.join(self.models_path, 'speed_models.pkl'))
+        except Exception:
+            return False
+        self.model_production, self.model_quality, self.scaler = artifacts['production'], artifacts['quality'], artifacts['scaler']
+        self.is_trained = True
+        self.data_hash = data_hash
+        if not self._load_response_surface(data_hash):
+            self._build_response_surface()
+        return True
+    
+    def _build_response_surface(self):
+        """Précalcule production/qualité au pas de 1 pcs/h pour chaque ligne × produit et les persiste.
+
+        Le fichier porte l'empreinte des données et la version des artefacts, vérifiées au chargement.
+        """
+        products = list(self.product_characteristics.keys())
+        line_ids, product_types, speeds = [], [], []
+        for line_id, r in self.speed_ranges.items():
+            grid = np.arange(r['min'], r['max'] + 1)
+            for product_type in products:
+                line_ids.append(np.full(len(grid), line_id))
+                product_types.append(np.full(len(grid), product_type))
+                speeds.append(grid)
+        p, q = self._predict_grid(np.concatenate(line_ids), np.concatenate(product_types), np.concatenate(speeds))
+        
+        surface, offset = {}, 0
+        for line_id, r in self.speed_ranges.items():
+            n = r['max'] - r['min'] + 1
+            size = n * len(products)
+            surface[line_id] = {
+                'speeds': np.arange(r['min'], r['max'] + 1),
+                'production': p[offset:offset + size].reshape(len(products), n),
+                'quality': q[offset:offset + size].reshape(len(products), n)
+            }
+            offset += size
+        self.response_surface = {'products': products, 'lines': surface}
+        
+        arrays = {'products': np.array(products), 'data_hash': np.array(self.data_hash or ''),
+                  'artifact_version': np.array(ARTIFACT_VERSION)}
+        for line_id, table in surface.items():
+            for key, values in table.items():
+                arrays[f'{line_id}__{key}'] = values
+        try:
+            os.makedirs(self.models_path, exist_ok=True)
+            tmp = os.path.join(self.models_path, 'speed_surface.tmp.npz')
+            np.savez(tmp, **arrays)
+            os.replace(tmp, os.path.join(self.models_path, 'speed_surface.npz'))
+        except OSError as e:
+            print(f"Table de réponse vitesse non persistée: {e}")
+    
+    def _load_response_surface(self, data_hash):
+        """Table persistée, seulement si elle a été calculée sur ces données avec cette version d'artefacts"""
+        path = os.path.join(self.models_path, 'speed_surface.npz')
+        if not data_hash or not os.path.exists(path): return False
+        with np.load(path) as data:
+            if 'data_hash' not in data or str(data['data_hash']) != data_hash: return False
+            if 'artifact_version' not in data or int(data['artifact_version']) != ARTIFACT_VERSION: return False
+            products = data['products'].tolist()
+            if products != list(self.product_characteristics.keys()): return False
+            surface = {}
+            for line_id in self.speed_ranges.keys():
+                if f'{line_id}__speeds' not in data: return False
+                surface[line_id] = {key: data[f'{line_id}__{key}'] for key in ('speeds', 'production', 'quality')}
+        self.response_surface = {'products': products, 'lines': surface}
         return True
     
-    def find_optimal_speed(self, line_id, product_type):
-        if not self.is_trained: return {}
-        min_s = self.speed_ranges[line_id]['min']
-        max_s = self.speed_ranges[line_id]['max']
-        speeds = np.arange(min_s, max_s + 25, 25)
+    def _load_current_surface(self):
+        """Secours sans modèles chargés : table persistée si le manifeste et la table correspondent aux données actuelles"""
+        if self.data_hash is None:
+            from data.data_store import get_data_store
+            self.data_hash = get_data_store().loader.get_source_hash('oee_data')
+        return not self.is_stale(self.data_hash) and self._load_response_surface(self.data_hash)
+
+    def _response_curve(self, line_id, product_type):
+        """Vitesses, production et qualité au pas de 1 pcs/h (lecture de la table, calcul direct en secours)"""
+        if self.response_surface is not None and product_type in self.response_surface['products']:
+            table = self.response_surface['lines'][line_id]
+            i = self.response_surface['products'].index(product_type)
+            return table['speeds'], table['production'][i], table['quality'][i]
+        r = self.speed_ranges[line_id]
+        speeds = np.arange(r['min'], r['max'] + 1)
+        p, q = self._predict_grid(np.full(len(speeds), line_id), np.full(len(speeds), product_type), speeds)
+        return speeds, p, q
+    
+    def find_optimal_speed(self, line_id, product_type, step=25, refine=False):
+        """Sweet Spot sur la grille [min, max] au pas `step` ; `refine` cherche l'optimum au pas de 1 pcs/h"""
+        _check_step(step)
+        if self.response_surface is None and not self.is_trained and not self._load_current_surface(): return {}
+        speeds, p, q = self._response_curve(line_id, product_type)
+        output = p * (q / 100)
         
-        results = []
-        for s in speeds:
-            X = self.prepare_features(pd.DataFrame([{'line_id': line_id, 'product_type': product_type, 'machine_speed': s}]))
-            X_s = self.scaler.transform(X)
-            p = self.model_production.predict(X_s)[0]
-            q = self.model_quality.predict(X_s)[0]
-            results.append({'speed': int(s), 'output': round(p * (q / 100), 1), 'quality': round(q, 2)})
-            
+        coarse = np.arange(0, len(speeds), step)
+        results = [{'speed': int(speeds[i]), 'output': round(float(output[i]), 1), 'quality': round(float(q[i]), 2)} for i in coarse]
         best = max(results, key=lambda x: x['output'])
+        if refine and step > 1:
+            i = int(np.argmax(output))
+            if round(float(output[i]), 1) > best['output']:
+                best = {'speed': int(speeds[i]), 'output': round(float(output[i]), 1), 'quality': round(float(q[i]), 2)}
         return {
             'optimal_speed': best['speed'], 'max_output': best['output'], 
             'current_speed': self.speed_ranges[line_id]['optimal_estimate'],
-            'curve': results
+            'resolution': 1 if refine else step, 'curve': results
         }
+    
+    def optimize_all(self, step=25):
+        """Sweet Spot de toutes les combinaisons ligne × produit (lecture de la table de réponse)"""
+        _check_step(step)
+        results = {}
+        for line_id in self.speed_ranges.keys():
+            results[line_id] = {}
+            for product_type in self.product_characteristics.keys():
+                res = self.find_optimal_speed(line_id, product_type, step=step)
+                if not res: return {}
+                best = next(c for c in res['curve'] if c['speed'] == res['optimal_speed'])
+                results[line_id][product_type] = {
+                    'optimal_speed': res['optimal_speed'], 'max_output': res['max_output'], 'quality': best['quality']
+                }
+        return results
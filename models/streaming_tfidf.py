@@ -0,0 +1,72 @@
+"""
+Vectorisation TF-IDF incrémentale : vocabulaire et fréquences documentaires mis à jour à chaque ajout
+"""
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Largeur fixe des vecteurs : les indices de termes restent stables quand le vocabulaire grandit
+DIMENSION = 1 << 20
+
+class StreamingTfidf:
+    """Équivalent de TfidfVectorizer (idf lissé, normalisation L2) sans réajustement global.
+
+    `partial_fit_transform` met à jour vocabulaire et fréquences documentaires puis encode les
+    nouveaux documents avec l'idf courant ; les vecteurs déjà indexés gardent l'idf de leur
+    insertion. Sur un premier lot, le résultat est identique à `TfidfVectorizer.fit_transform`.
+    Le vocabulaire n'est pas plafonné (pas d'équivalent de `max_features`) : les vecteurs sont
+    creux et indexés sur une largeur fixe, leur coût ne dépend que des termes présents.
+    """
+    def __init__(self):
+        self.analyzer = TfidfVectorizer().build_analyzer()
+        self.vocabulary = {}
+        self.df = np.zeros(0, dtype=np.int64)
+        self.n_docs = 0
+
+    def idf(self, term_ids):
+        return np.log((1 + self.n_docs) / (1 + self.df[term_ids])) + 1
+
+    def _encode(self, documents, grow):
+        rows, cols, counts = [], [], []
+        for i, doc in enumerate(documents):
+            terms = {}
+            for token in self.analyzer(doc):
+                term = self.vocabulary.get(token)
+                if term is None:
+                    if not grow: continue
+                    term = self.vocabulary[token] = len(self.vocabulary)
+                terms[term] = terms.get(term, 0) + 1
+            rows.extend([i] * len(terms))
+            cols.extend(terms.keys())
+            counts.extend(terms.values())
+        return (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64),
+                np.array(counts, dtype=np.float64))
+
+    def _weighted(self, rows, cols, counts, n):
+        data = counts * self.idf(cols) if len(cols) else counts
+        norms = np.sqrt(np.bincount(rows, weights=data ** 2, minlength=n))
+        data = data / np.where(norms > 0, norms, 1)[rows]
+        return sparse.csr_matrix((data, (rows, cols)), shape=(n, DIMENSION))
+
+    def partial_fit_transform(self, documents):
+        rows, cols, counts = self._encode(documents, grow=True)
+        if len(self.vocabulary) > len(self.df):
+            self.df = np.concatenate([self.df, np.zeros(len(self.vocabulary) - len(self.df), dtype=np.int64)])
+        np.add.at(self.df, cols, 1)
+        self.n_docs += len(documents)
+        return self._weighted(rows, cols, counts, len(documents))
+
+    def transform(self, documents):
+        return self._weighted(*self._encode(documents, grow=False), len(documents))
+
+    def state(self):
+        return {'vocabulary': self.vocabulary, 'df': self.df.tolist(), 'n_docs': self.n_docs}
+
+    @classmethod
+    def from_state(cls, state):
+        encoder = cls()
+        encoder.vocabulary = dict(state['vocabulary'])
+        encoder.df = np.array(state['df'], dtype=np.int64)
+        encoder.n_docs = int(state['n_docs'])
+        return encoder
@@ -0,0 +1,155 @@
+"""
+Pipeline d'entraînement de l'ensemble OEE : validation croisée temporelle, recherche
+d'hyperparamètres en parallèle et apprentissage des poids du mélange
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from scipy.optimize import nnls
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+
+ESTIMATORS = {'rf': RandomForestRegressor, 'gb': GradientBoostingRegressor}
+
+# Configuration historique : un candidat par famille
+DEFAULT_CANDIDATES = {
+    'rf': [{'n_estimators': 100, 'max_depth': 15, 'random_state': 42}],
+    'gb': [{'n_estimators': 100, 'max_depth': 7, 'random_state': 42}]
+}
+
+SEARCH_CANDIDATES = {
+    'rf': [{'n_estimators': 100, 'max_depth': d, 'min_samples_leaf': l, 'random_state': 42} for d in (10, 15) for l in (1, 5)],
+    'gb': [{'n_estimators': n, 'max_depth': d, 'learning_rate': lr, 'random_state': 42} for n, d, lr in ((100, 7, 0.1), (200, 5, 0.05), (100, 5, 0.1))]
+}
+
+def rolling_origin_splits(timestamps, n_folds=3, min_train_fraction=0.5):
+    """Découpages à origine glissante : chaque pli s'entraîne sur le passé et valide sur la période suivante"""
+    ts = np.asarray(timestamps).astype('datetime64[ns]').view(np.int64)
+    lo, hi = ts.min(), ts.max()
+    cuts = lo + (hi - lo) * np.linspace(min_train_fraction, 1, n_folds + 1)
+    splits = []
+    for k in range(n_folds):
+        train_idx = np.flatnonzero(ts < cuts[k])
+        last = k == n_folds - 1
+        val_idx = np.flatnonzero((ts >= cuts[k]) & ((ts <= cuts[k + 1]) if last else (ts < cuts[k + 1])))
+        if len(train_idx) and len(val_idx):
+            splits.append((train_idx, val_idx))
+    return splits
+
+def _fit_and_predict(family, params, X_train, y_train, X_eval, n_jobs=1):
+    """Tâche élémentaire exécutée dans un processus de travail.
+
+    Pendant la validation croisée, le pool fournit déjà le parallélisme (`n_jobs=1`) ; le
+    modèle final garde `n_jobs=-1`, qui sert aussi à ses prédictions en production.
+    """
+    start = time.perf_counter()
+    model = ESTIMATORS[family](**params)
+    if family == 'rf':
+        model.set_params(n_jobs=n_jobs)
+    model.fit(X_train, y_train)
+    pred = model.predict(X_eval) if X_eval is not None else None
+    return model, pred, time.perf_counter() - start
+
+def learn_blend_weights(predictions, y):
+    """Poids positifs de somme 1 minimisant l'erreur quadratique du mélange (NNLS)"""
+    A = np.column_stack(predictions)
+    weights, _ = nnls(A, y)
+    if weights.sum() == 0:
+        return np.full(A.shape[1], 1.0 / A.shape[1])
+    return weights / weights.sum()
+
+class TrainingPipeline:
+    """Sélectionne, mélange et réentraîne les modèles de l'ensemble OEE.
+
+    Tous les couples (candidat, pli) sont ajustés en parallèle sur un pool de processus ;
+    le meilleur candidat de chaque famille est retenu sur la MAE hors-pli des premiers plis,
+    puis les poids du mélange sont appris sur ces mêmes prédictions. Le dernier pli, qui n'a
+    servi ni à la sélection ni aux poids, fournit l'erreur rapportée (`cv_mae`, `cv_r2`) ;
+    `selection_mae` est la MAE optimiste du mélange sur les plis de sélection.
+    """
+    def __init__(self, candidates=None, n_folds=3, min_train_fraction=0.5, max_workers=None):
+        self.candidates = candidates or DEFAULT_CANDIDATES
+        self.n_folds = n_folds
+        self.min_train_fraction = min_train_fraction
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timings = {}
+
+    def _run_tasks(self, tasks):
+        if self.max_workers <= 1 or len(tasks) <= 1:
+            return [_fit_and_predict(*task) for task in tasks]
+        # 'spawn' évite de dupliquer les threads du serveur (préchauffage, réentraînement) par fork
+        try:
+            context = multiprocessing.get_context('spawn')
+            pool = ProcessPoolExecutor(max_workers=min(self.max_workers, len(tasks)), mp_context=context)
+        except (OSError, NotImplementedError) as e:
+            # Pas de sémaphores POSIX (ex: Vercel, sans /dev/shm) : exécution en série
+            print(f"Pool de processus indisponible ({e}) : entraînement en série")
+            return [_fit_and_predict(*task) for task in tasks]
+        with pool:
+            try:
+                return list(pool.map(_fit_and_predict, *zip(*tasks)))
+            except BrokenProcessPool as e:
+                print(f"Pool de processus interrompu ({e}) : entraînement en série")
+        return [_fit_and_predict(*task) for task in tasks]
+
+    def _stage(self, name, start):
+        self.timings[name] = round(time.perf_counter() - start, 3)
+        return time.perf_counter()
+
+    def run(self, X, y, timestamps):
+        X, y = np.asarray(X, dtype=float), np.asarray(y, dtype=float)
+        t0 = t = time.perf_counter()
+        splits = rolling_origin_splits(timestamps, self.n_folds, self.min_train_fraction)
+        if not splits:
+            raise ValueError("Historique insuffisant pour la validation croisée temporelle")
+        t = self._stage('split', t)
+
+        tasks, keys = [], []
+        for family, grid in self.candidates.items():
+            for c, params in enumerate(grid):
+                for f, (train_idx, val_idx) in enumerate(splits):
+                    tasks.append((family, params, X[train_idx], y[train_idx], X[val_idx]))
+                    keys.append((family, c, f))
+        results = self._run_tasks(tasks)
+        t = self._stage('cross_validation', t)
+
+        # Le dernier pli est réservé à l'évaluation (sauf s'il est le seul)
+        n_select = len(splits) - 1 if len(splits) > 1 else 1
+        y_select = y[np.concatenate([v for _, v in splits[:n_select]])]
+        oof = {}
+        for (family, c, f), (_, pred, _) in zip(keys, results):
+            oof.setdefault((family, c), [None] * len(splits))[f] = pred
+        scores = {}
+        best = {}
+        for (family, c), preds in oof.items():
+            pred = np.concatenate(preds[:n_select])
+            mae = mean_absolute_error(y_select, pred)
+            scores.setdefault(family, []).append({'params': self.candidates[family][c], 'mae': round(float(mae), 3)})
+            if family not in best or mae < best[family][1]:
+                best[family] = (c, mae, pred)
+        families = list(best.keys())
+        weights = learn_blend_weights([best[f][2] for f in families], y_select)
+        blend = sum(w * best[f][2] for w, f in zip(weights, families))
+        y_test = y[splits[-1][1]]
+        blend_test = sum(w * oof[(f, best[f][0])][-1] for w, f in zip(weights, families))
+        t = self._stage('blend', t)
+
+        final = self._run_tasks([(f, self.candidates[f][best[f][0]], X, y, None, -1) for f in families])
+        t = self._stage('refit', t)
+        self.timings['total'] = round(t - t0, 3)
+
+        report = {
+            'folds': len(splits), 'held_out_fold': len(splits) > 1,
+            'cv_mae': round(float(mean_absolute_error(y_test, blend_test)), 3),
+            'cv_r2': round(float(r2_score(y_test, blend_test)), 3),
+            'selection_mae': round(float(mean_absolute_error(y_select, blend)), 3), 'candidates': scores,
+            'selected': {f: self.candidates[f][best[f][0]] for f in families},
+            'weights': {f: round(float(w), 4) for f, w in zip(families, weights)},
+            'timings_seconds': dict(self.timings), 'workers': self.max_workers
+        }
+        models = {f: model for f, (model, _, _) in zip(families, final)}
+        return models, [float(w) for w in weights], report
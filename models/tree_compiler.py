@@ -0,0 +1,104 @@
+"""
+Compilation de l'ensemble OEE (forêt + boosting) en tableaux de nœuds NumPy plats
+"""
+
+import json
+import os
+import shutil
+import numpy as np
+
+FORMAT_VERSION = 1
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'tree_weight')
+
+def compile_ensemble(model):
+    """Aplatit tous les arbres du modèle {'rf', 'gb', 'weights'} dans un seul jeu de tableaux.
+
+    La prédiction devient `bias + Σ tree_weight[t] * value[feuille_t(x)]` : chaque arbre de la
+    forêt pèse w_rf / n_arbres, chaque arbre du boosting w_gb * learning_rate.
+    """
+    w_rf, w_gb = model.get('weights', [0.6, 0.4])
+    rf, gb = model['rf'], model['gb']
+    n_features = rf.n_features_in_
+    trees = [(est.tree_, w_rf / len(rf.estimators_)) for est in rf.estimators_]
+    trees += [(est.tree_, w_gb * gb.learning_rate) for est in gb.estimators_[:, 0]]
+    bias = w_gb * float(gb.init_.predict(np.zeros((1, n_features)))[0])
+
+    feature, threshold, left, right, value, roots, tree_weight = [], [], [], [], [], [], []
+    offset, max_depth = 0, 0
+    for tree, weight in trees:
+        leaf = tree.children_left < 0
+        roots.append(offset)
+        tree_weight.append(weight)
+        feature.append(np.where(leaf, -1, tree.feature).astype(np.int32))
+        threshold.append(tree.threshold.astype(np.float64))
+        left.append(np.where(leaf, -1, tree.children_left + offset).astype(np.int32))
+        right.append(np.where(leaf, -1, tree.children_right + offset).astype(np.int32))
+        value.append(tree.value[:, 0, 0].astype(np.float64))
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+    arrays = {
+        'feature': np.concatenate(feature), 'threshold': np.concatenate(threshold),
+        'left': np.concatenate(left), 'right': np.concatenate(right), 'value': np.concatenate(value),
+        'roots': np.array(roots, dtype=np.int32), 'tree_weight': np.array(tree_weight, dtype=np.float64)
+    }
+    return CompiledEnsemble(arrays, {'bias': bias, 'max_depth': max_depth, 'n_features': n_features})
+
+class CompiledEnsemble:
+    """Évaluateur vectorisé : tous les échantillons descendent tous les arbres en parallèle"""
+    def __init__(self, arrays, meta):
+        self.arrays = arrays
+        self.meta = meta
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.bias = meta['bias']
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def predict(self, X):
+        # scikit-learn compare les features en float32 : on reproduit ce cast pour des prédictions identiques
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+        for _ in range(self.meta['max_depth'] + 1):
+            f = self.feature[node]
+            internal = f >= 0
+            if not internal.any(): break
+            go_left = X[rows, np.where(internal, f, 0)] <= self.threshold[node]
+            node = np.where(internal, np.where(go_left, self.left[node], self.right[node]), node)
+        return self.bias + self.value[node] @ self.tree_weight
+
+    def save(self, path, source_hash):
+        """Écrit une version dans `path/<empreinte>/` puis bascule le pointeur `current.json` atomiquement"""
+        version = source_hash[:12]
+        target = os.path.join(path, version)
+        os.makedirs(target, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(target, f'{name}.npy'), np.ascontiguousarray(self.arrays[name]))
+        meta = dict(self.meta, format_version=FORMAT_VERSION, source_hash=source_hash, version=version)
+        with open(os.path.join(target, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        pointer = os.path.join(path, 'current.json')
+        with open(pointer + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'version': version}, f)
+        os.replace(pointer + '.tmp', pointer)
+        for entry in os.listdir(path):
+            old = os.path.join(path, entry)
+            if entry != version and os.path.isdir(old):
+                shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Charge la version courante ; avec `mmap`, les workers partagent les pages en lecture seule"""
+        try:
+            with open(os.path.join(path, 'current.json'), encoding='utf-8') as f:
+                version = json.load(f)['version']
+            with open(os.path.join(path, version, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError, KeyError):
+            return None
+        if meta.get('format_version') != FORMAT_VERSION: return None
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(path, version, f'{name}.npy'), mmap_mode=mode) for name in ARRAYS}
+        return cls(arrays, meta)
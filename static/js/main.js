@@ -13,8 +13,7 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 
-    // Initialize Data
-    fetchDashboard();
+    // Initialize Data (le tableau de bord arrive par l'instantané SSE, ou par le premier appel du polling)
     fetchProducts();
     fetchAnomalies();
 
@@ -117,6 +116,13 @@ document.addEventListener('DOMContentLoaded', () => {
         renderSimilar(data.similar_cases);
     });
 
+    // Les champs saisis par les utilisateurs (anomalies postées) ne doivent jamais être interprétés comme du HTML
+    function escapeHtml(value) {
+        return String(value ?? '').replace(/[&<>"']/g, ch => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[ch]);
+    }
+
     function renderSimilar(cases) {
         const div = document.getElementById('similar-cases');
         div.innerHTML = '<h3>Cas Similaires</h3>';
@@ -124,26 +130,26 @@ document.addEventListener('DOMContentLoaded', () => {
             const item = document.createElement('div');
             item.className = 'similar-case';
             item.innerHTML = `
-                <p><strong>${c.similarity}% Similarité</strong> - ${c.machine} (${c.line})</p>
-                <p>Symptôme: ${c.symptom}</p>
-                <p>Solution: ${c.solution}</p>
+                <p><strong>${escapeHtml(c.similarity)}% Similarité</strong> - ${escapeHtml(c.machine)} (${escapeHtml(c.line)})</p>
+                <p>Symptôme: ${escapeHtml(c.symptom)}</p>
+                <p>Solution: ${escapeHtml(c.solution)}</p>
             `;
             div.appendChild(item);
         });
     }
 
     async function fetchAnomalies() {
-        const res = await fetch('/api/anomalies');
+        const res = await fetch('/api/anomalies?limit=5');
         const data = await res.json();
         const tbody = document.getElementById('anomalies-tbody');
         tbody.innerHTML = '';
         data.anomalies.slice(0, 5).forEach(a => {
             const tr = document.createElement('tr');
             tr.innerHTML = `
-                <td>${new Date(a.date).toLocaleDateString()}</td>
-                <td>${a.line}</td>
-                <td>${a.symptom}</td>
-                <td>${a.solution}</td>
+                <td>${escapeHtml(new Date(a.date).toLocaleDateString())}</td>
+                <td>${escapeHtml(a.line)}</td>
+                <td>${escapeHtml(a.symptom)}</td>
+                <td>${escapeHtml(a.solution)}</td>
             `;
             tbody.appendChild(tr);
         });
@@ -278,8 +284,44 @@ document.addEventListener('DOMContentLoaded', () => {
     sendBtn.addEventListener('click', sendChat);
     chatInput.addEventListener('keypress', (e) => { if (e.key === 'Enter') sendChat(); });
 
-    // Proactive Monitoring
-    setInterval(() => {
-        fetchDashboard(); // Periodically refresh data and alerts
-    }, 10000);
+    // Proactive Monitoring: le serveur pousse l'état du tableau de bord (SSE), sinon repli sur le polling
+    function applyDashboard(data) {
+        dashboardData = data;
+        updateKPIs(data);
+        renderOEEChart(data.current);
+    }
+
+    function startPolling() {
+        fetchDashboard();
+        setInterval(() => {
+            fetchDashboard(); // Periodically refresh data and alerts
+        }, 10000);
+    }
+
+    if (window.EventSource) {
+        const stream = new EventSource('/api/stream');
+        let failures = 0;
+        stream.addEventListener('snapshot', e => {
+            failures = 0;
+            applyDashboard(JSON.parse(e.data));
+        });
+        stream.addEventListener('delta', e => {
+            if (!dashboardData) return;
+            const delta = JSON.parse(e.data);
+            const next = Object.assign({}, dashboardData, delta.replace, { timestamp: delta.timestamp });
+            Object.entries(delta.merge).forEach(([key, value]) => {
+                next[key] = Object.assign({}, dashboardData[key], value);
+            });
+            applyDashboard(next);
+        });
+        stream.onerror = () => {
+            // Hébergement sans connexions longues (ex: serverless) : retour au polling
+            if (++failures >= 3) {
+                stream.close();
+                startPolling();
+            }
+        };
+    } else {
+        startPolling();
+    }
 });
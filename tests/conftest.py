@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Les modules de l'application sont importés depuis la racine du dépôt (data.*, models.*)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,23 @@
+from models.agent_brain import AgentBrain
+
+class FakePredictor:
+    model_version = 1
+    def __init__(self):
+        self.calls = []
+    def predict_next_days(self, days=7, lines=None):
+        self.calls.append((days, lines))
+        return {line: [{'oee_predicted': 70.0}] * days for line in lines or ['L1', 'L2', 'L3']}
+
+def test_forecast_tool_only_computes_requested_line():
+    predictor = FakePredictor()
+    brain = AgentBrain(predictor, None, None, None)
+    result = brain.process_query("prévision OEE L2 sur 2 semaines", session_id='t')
+    assert predictor.calls == [(14, ['L2'])]
+    assert 'L2' in result['observations'][0] and '14 jours' in result['observations'][0]
+
+def test_out_of_range_horizon_is_rejected_before_submission():
+    predictor = FakePredictor()
+    brain = AgentBrain(predictor, None, None, None)
+    observations, timings = brain._run_actions([{'tool': 'oee_forecast', 'params': {'line': 'L1', 'days': 6993}}])
+    assert predictor.calls == [] and timings[0]['status'] == 'invalid'
+    assert 'Horizon invalide' in observations[0]
@@ -0,0 +1,82 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from models.anomaly_expert import AnomalyExpert
+
+COLUMNS = ['anomaly_id', 'timestamp', 'line_id', 'machine_id', 'symptom', 'root_cause', 'solution_applied']
+
+def _record(i):
+    return {'line_id': 'L1', 'machine_id': 'M1-1', 'symptom': f'Vibrations anormales {i}',
+            'root_cause': 'Roulements usés', 'solution_applied': 'Remplacement des roulements'}
+
+def _empty_expert(path):
+    expert = AnomalyExpert(index_path=str(path))
+    expert.knowledge_base = pd.DataFrame({c: pd.Series(dtype='datetime64[ns]' if c == 'timestamp' else object) for c in COLUMNS})
+    return expert
+
+def _reloaded(path, base):
+    expert = AnomalyExpert(index_path=str(path))
+    expert._added = expert._read_added()
+    expert.knowledge_base = pd.concat([base, expert._to_frame(expert._added)], ignore_index=True)
+    assert expert._load_index()
+    return expert
+
+def test_add_to_empty_knowledge_base_creates_index(tmp_path):
+    expert = _empty_expert(tmp_path)
+    row = expert.add_anomaly(_record(1))
+    assert row['anomaly_id'] == 1 and expert.index.size == 1
+    assert expert.find_similar('vibrations roulements')[0]['machine'] == 'M1-1'
+
+def test_add_anomaly_rejects_missing_fields(tmp_path):
+    with pytest.raises(ValueError):
+        _empty_expert(tmp_path).add_anomaly({'line_id': 'L1'})
+
+@pytest.mark.parametrize('record', [
+    ['pas', 'un', 'objet'], dict(_record(1), resolution_time_minutes='vingt'), dict(_record(1), impact_oee=True),
+    dict(_record(1), priority='Urgent'), dict(_record(1), status='Perdu'), dict(_record(1), timestamp='hier')
+])
+def test_add_anomaly_rejects_invalid_values(tmp_path, record):
+    with pytest.raises(ValueError):
+        _empty_expert(tmp_path).add_anomaly(record)
+
+def test_add_anomaly_normalises_optional_fields(tmp_path):
+    expert = _empty_expert(tmp_path)
+    row = expert.add_anomaly(dict(_record(1), resolution_time_minutes=None, timestamp='2026-10-17T10:00:00Z', priority='High'))
+    assert row['resolution_time_minutes'] == 0 and row['priority'] == 'High' and row['status'] == 'Resolved'
+    assert pd.api.types.is_datetime64_dtype(expert.knowledge_base['timestamp'])
+
+def test_snapshot_folds_and_truncates_journal(tmp_path):
+    expert = _empty_expert(tmp_path)
+    base = expert.knowledge_base
+    for i in range(3):
+        expert.add_anomaly(_record(i))
+    assert os.path.getsize(tmp_path / 'added.jsonl') > 0
+    assert expert.save_index()
+    assert os.path.getsize(tmp_path / 'added.jsonl') == 0
+    expert.add_anomaly(_record(3))
+
+    reloaded = _reloaded(tmp_path, base)
+    assert reloaded.knowledge_base['anomaly_id'].tolist() == [1, 2, 3, 4]
+    assert reloaded.index.size == 4
+
+def test_interrupted_save_does_not_duplicate_rows(tmp_path):
+    expert = _empty_expert(tmp_path)
+    base = expert.knowledge_base
+    for i in range(2):
+        expert.add_anomaly(_record(i))
+    journal = (tmp_path / 'added.jsonl').read_text(encoding='utf-8')
+    expert.save_index()
+    # Sauvegarde interrompue après l'instantané, avant la troncature du journal
+    (tmp_path / 'added.jsonl').write_text(journal, encoding='utf-8')
+    assert _reloaded(tmp_path, base).knowledge_base['anomaly_id'].tolist() == [1, 2]
+
+def test_snapshot_every(tmp_path, monkeypatch):
+    monkeypatch.setattr('models.anomaly_expert.SNAPSHOT_EVERY', 2)
+    expert = _empty_expert(tmp_path)
+    for i in range(2):
+        expert.add_anomaly(_record(i))
+    assert json.loads((tmp_path / 'manifest.json').read_text())['n_docs'] == 2
+    assert os.path.getsize(tmp_path / 'added.jsonl') == 0
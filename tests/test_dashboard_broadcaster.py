@@ -0,0 +1,36 @@
+import itertools
+import threading
+
+from models.dashboard_broadcaster import DashboardBroadcaster, diff_payload
+
+def test_diff_payload_merges_and_replaces():
+    old = {'current': {'L1': 1, 'L2': 2}, 'alerts': [1], 'timestamp': 't0'}
+    new = {'current': {'L1': 1, 'L2': 3}, 'alerts': [], 'timestamp': 't1'}
+    assert diff_payload(old, new) == {'merge': {'current': {'L2': 3}}, 'replace': {'alerts': []}}
+    assert diff_payload(new, dict(new, timestamp='t2')) is None
+
+def test_concurrent_first_subscribers_start_one_producer():
+    calls = itertools.count()
+    broadcaster = DashboardBroadcaster(lambda: {'n': next(calls)}, poll_interval=0.01, heartbeat=0.05)
+    started = []
+    original = threading.Thread.start
+    def counting_start(thread):
+        if thread.name == 'dashboard-stream': started.append(thread)
+        original(thread)
+    threading.Thread.start = counting_start
+    try:
+        barrier = threading.Barrier(8)
+        first_events = []
+        def subscribe():
+            stream = broadcaster.subscribe()
+            barrier.wait()
+            next(stream)  # directive `retry`
+            first_events.append(next(stream))
+            stream.close()
+        threads = [threading.Thread(target=subscribe) for _ in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join(5)
+    finally:
+        threading.Thread.start = original
+    assert len(started) == 1
+    assert len(first_events) == 8 and all('event: snapshot' in e for e in first_events)
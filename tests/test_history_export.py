@@ -0,0 +1,29 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from data.data_loader import DataLoader
+from data.data_store import DataStore
+from data.history_export import HistoryExport
+
+def _store():
+    loader = DataLoader()
+    loader.stops_data = pd.DataFrame({
+        'stop_id': [1, 2, 3], 'line_id': ['L1', 'L2', 'L1'],
+        'start_time': pd.to_datetime(['2025-01-01 08:00', '2025-01-01 09:00', '2025-01-01 10:00']),
+        'duration_minutes': [10.0, np.nan, 5.0]
+    })
+    store = DataStore(loader)
+    store._mtimes = store._current_mtimes()
+    return store
+
+def test_export_survives_concurrent_ingest_and_writes_null():
+    store = _store()
+    export = HistoryExport(store, 'stops', fmt='json')
+    extra = pd.DataFrame({'line_id': ['L1'], 'start_time': pd.to_datetime(['2024-12-31 08:00']), 'duration_minutes': [1.0]})
+    store.apply_ingested('stops', extra)
+    body = ''.join(export)
+    assert 'NaN' not in body
+    rows = json.loads(body)
+    assert [r['stop_id'] for r in rows] == [1, 2, 3] and rows[1]['duration_minutes'] is None
@@ -0,0 +1,115 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from data.ingestion import AppendOnlyStore, BackPressureError, IngestionPipeline, validate_records
+
+def _oee(n, **overrides):
+    base = {'line_id': 'L1', 'product_type': 'Fond_Plat', 'machine_speed': 1000,
+            'oee': 70.0, 'availability': 80.0, 'performance': 90.0, 'quality': 97.0}
+    return [dict(base, timestamp=f'2025-01-01 {i % 24:02d}:00:00', **overrides) for i in range(n)]
+
+def test_validation_rejects_bad_rows_and_fills_defaults():
+    records = _oee(3) + [dict(_oee(1)[0], timestamp='hier'), dict(_oee(1)[0], oee=140), dict(_oee(1)[0], line_id=' ')]
+    df, rejected, errors = validate_records('oee', records)
+    assert len(df) == 3 and rejected == 3
+    assert [e['row'] for e in errors] == [3, 4, 5]
+    assert 'oee_range' in errors[1]['error']
+    assert (df['planned_production_time'] == 60).all()
+    assert pd.api.types.is_datetime64_any_dtype(df['timestamp'])
+
+def test_validation_reports_missing_fields_and_unknown_kind():
+    df, rejected, errors = validate_records('stops', [{'line_id': 'L1'}])
+    assert df.empty and rejected == 1 and 'manquants' in errors[0]['error']
+    with pytest.raises(ValueError):
+        validate_records('capteurs', [])
+
+def test_stop_defaults_are_derived():
+    df, _, _ = validate_records('stops', [{'line_id': 'L1', 'machine_id': 'M1-1', 'stop_type': 'Bourrage',
+                                           'start_time': '2025-01-01 08:00', 'duration_minutes': 30}])
+    assert df.loc[0, 'end_time'] == pd.Timestamp('2025-01-01 08:30')
+    assert df.loc[0, 'description'] == 'Bourrage sur M1-1'
+
+def test_append_only_store_roundtrip_and_compaction(tmp_path):
+    store = AppendOnlyStore(str(tmp_path), max_segments=3)
+    frames = [validate_records('oee', _oee(4, machine_speed=1000 + i))[0] for i in range(5)]
+    for df in frames:
+        store.append('oee_data', df)
+    assert store.stats()['oee'] <= 3
+    read = store.read('oee_data')
+    expected = pd.concat(frames, ignore_index=True)
+    assert read['machine_speed'].tolist() == expected['machine_speed'].tolist()
+    assert AppendOnlyStore(str(tmp_path)).read('oee_data')['timestamp'].tolist() == expected['timestamp'].tolist()
+
+def test_back_pressure_and_flush(tmp_path):
+    release = threading.Event()
+    applied = []
+    def apply(kind, df):
+        release.wait(5)
+        applied.append(len(df))
+    pipeline = IngestionPipeline(AppendOnlyStore(str(tmp_path)), apply, max_pending=5, flush_interval=0.01)
+    assert pipeline.submit('oee', _oee(4))['accepted'] == 4
+    with pytest.raises(BackPressureError):
+        pipeline.submit('oee', _oee(4))
+    release.set()
+    assert pipeline.flush(5)
+    assert sum(applied) == 4 and pipeline.stats()['committed']['oee'] == 4
+    # Une file vide accepte un lot plus grand que la limite
+    assert pipeline.submit('oee', _oee(8))['accepted'] == 8
+    assert pipeline.flush(5)
+
+def test_malformed_ndjson_line_is_a_validation_error():
+    from app import app
+    body = '{"line_id": "L1"}\n\n{pas du json\n'
+    response = app.test_client().post('/api/ingest/oee', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 400
+    assert response.json['errors'][0]['row'] == 2
+
+def test_timezone_aware_timestamps_become_naive():
+    records = [dict(_oee(1)[0], timestamp='2026-10-17T10:00:00Z'), dict(_oee(1)[0], timestamp='2026-10-17 11:00:00')]
+    df, rejected, _ = validate_records('oee', records)
+    assert rejected == 0 and df['timestamp'].dt.tz is None
+    assert pd.api.types.is_datetime64_dtype(df['timestamp'])
+
+def test_non_dict_records_are_rejected_per_row():
+    df, rejected, errors = validate_records('oee', [1, 2])
+    assert df.empty and rejected == 2 and [e['row'] for e in errors] == [0, 1]
+    from app import app
+    client = app.test_client()
+    for kind in ('oee', 'anomalies'):
+        response = client.post(f'/api/ingest/{kind}', json=[1, 2])
+        assert response.status_code == 400 and response.json['rejected'] == 2
+
+def _loader():
+    from data.data_loader import DataLoader
+    from data.kpi_aggregates import RollingKPIIndex
+    loader = DataLoader()
+    loader.oee_data = validate_records('oee', _oee(5))[0]
+    loader.kpi_index = RollingKPIIndex.from_frame(loader.oee_data)
+    loader.stops_data = validate_records('stops', [{'line_id': 'L1', 'machine_id': 'M1-1', 'stop_type': 'Bourrage',
+                                                    'start_time': '2025-01-01 07:00', 'end_time': '2025-01-01 07:10',
+                                                    'duration_minutes': 10}])[0].assign(stop_id=1)
+    return loader
+
+def test_append_keeps_store_intact_on_failure():
+    loader = _loader()
+    before, index = loader.oee_data, loader.kpi_index
+    aware = pd.DataFrame(_oee(1)).assign(timestamp=pd.Timestamp('2025-01-02', tz='UTC'))
+    with pytest.raises(ValueError):
+        loader.append_records('oee_data', aware)
+    assert loader.oee_data is before and loader.kpi_index is index
+    loader.append_records('oee_data', validate_records('oee', [dict(_oee(1)[0], timestamp='2025-01-02T00:00:00Z')])[0])
+    assert len(loader.oee_data) == 6 and loader.kpi_index.stats('L1', '30d')['count'] == 6
+
+def test_stop_without_end_time_keeps_datetime_column():
+    import json
+    from data.time_index import serialize_columns
+    loader = _loader()
+    new, _, _ = validate_records('stops', [{'line_id': 'L1', 'machine_id': 'M1-1', 'stop_type': 'Bourrage',
+                                            'start_time': '2025-01-01 08:00', 'duration_minutes': 30}])
+    assert pd.api.types.is_datetime64_dtype(new['end_time'])
+    loader.append_records('stops_data', new)
+    assert pd.api.types.is_datetime64_dtype(loader.stops_data['end_time'])
+    assert loader.stops_data['stop_id'].tolist() == [1, 2]
+    json.dumps(serialize_columns(loader.stops_data))
@@ -0,0 +1,45 @@
+import pytest
+
+from models.intent_router import IntentRouter
+
+# Mots-clés de la chaîne de tests d'origine et l'intention qu'ils déclenchaient
+BASELINE_KEYWORDS = {
+    'forecast': ['prévoir', 'prediction', 'futur', 'oee', 'semaine'],
+    'recommend': ['recommander', 'choisir', 'quelle ligne', 'meilleure'],
+    'anomaly': ['problème', 'panne', 'erreur', 'anomalie', 'solution'],
+    'speed': ['vitesse', 'optimiser', 'sweet spot', 'rapide'],
+}
+
+@pytest.fixture(scope='module')
+def router():
+    return IntentRouter(machines=['M1-1', 'M2-1', 'M3-4'])
+
+@pytest.mark.parametrize('intent,keyword', [(i, k) for i, words in BASELINE_KEYWORDS.items() for k in words])
+def test_baseline_keywords_keep_their_intent(router, intent, keyword):
+    assert intent in router.route(f"Dis-moi {keyword} pour L2 s'il te plaît").intents
+
+@pytest.mark.parametrize('query', [
+    "qu'est-ce qui se passe cette semaine sur L2",
+    "Quelle sera la performance la semaine prochaine ?",
+])
+def test_semaine_routes_to_forecast(router, query):
+    routed = router.route(query)
+    assert routed.intents == ('forecast',)
+    assert routed.horizon_days == 7
+
+def test_entities(router):
+    routed = router.route("Recommande une ligne pour 5 000 sacs fond carré poignées torsadées sur 14 jours")
+    assert routed.intents == ('recommend',)
+    assert routed.quantity == 5000
+    assert routed.product == 'Fond_Carre_Poignees_Torsadees'
+    assert routed.horizon_days == 14
+    routed = router.route("Est-ce que 1200 pcs/h est la meilleure vitesse sur la ligne 3, machine M3-4 ?")
+    assert routed.speed == 1200 and routed.line == 'L3' and routed.machine == 'M3-4'
+    assert routed.intents == ('recommend', 'speed')
+
+def test_no_intent_falls_back(router):
+    assert router.route("Bonjour").intents == ()
+
+@pytest.mark.parametrize('query,days', [("prévision OEE L1 sur 999 semaines", 90), ("prévision OEE L1 sur 0 jours", 1)])
+def test_horizon_is_bounded(router, query, days):
+    assert router.route(query).horizon_days == days
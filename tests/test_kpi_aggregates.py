@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.kpi_aggregates import KPI_COLUMNS, NS_PER_HOUR, RollingKPIIndex
+
+def _frame(hours=900, lines=('L1', 'L2'), seed=0, gaps=True):
+    rng = np.random.default_rng(seed)
+    stamps = pd.date_range('2025-01-01', periods=hours, freq='h') + pd.Timedelta(minutes=20)
+    df = pd.DataFrame({'timestamp': np.repeat(stamps, len(lines)), 'line_id': list(lines) * hours})
+    if gaps:
+        # Heures manquantes (nuits, week-ends) pour exercer les tranches vides de l'anneau
+        df = df[rng.random(len(df)) > 0.3].reset_index(drop=True)
+    for kpi in KPI_COLUMNS:
+        df[kpi] = rng.uniform(40, 95, len(df)).round(2)
+    return df
+
+def _expected(df, line_id, span):
+    hours = df['timestamp'].values.astype('datetime64[ns]').view(np.int64) // NS_PER_HOUR
+    window = df[(hours >= hours.max() - span) & (df['line_id'] == line_id)]
+    return len(window), window[list(KPI_COLUMNS)].mean(), window[list(KPI_COLUMNS)].std()
+
+def _assert_matches(index, df):
+    for line_id in ('L1', 'L2'):
+        for name, span in index.windows.items():
+            count, mean, std = _expected(df, line_id, span)
+            stats = index.stats(line_id, name)
+            assert stats['count'] == count
+            for kpi in KPI_COLUMNS:
+                assert stats['mean'][kpi] == pytest.approx(mean[kpi], abs=1e-6)
+                assert stats['std'][kpi] == pytest.approx(std[kpi], abs=1e-6)
+
+def test_from_frame_matches_brute_force():
+    df = _frame()
+    _assert_matches(RollingKPIIndex.from_frame(df), df)
+
+def test_incremental_adds_roll_the_ring_over():
+    df = _frame(hours=1600)
+    index = RollingKPIIndex.from_frame(df.iloc[:500])
+    for row in df.iloc[500:].itertuples(index=False):
+        index.add(row.line_id, row.timestamp, [getattr(row, k) for k in KPI_COLUMNS])
+    _assert_matches(index, df)
+    assert index.last('L2')['timestamp'] == df[df['line_id'] == 'L2']['timestamp'].iloc[-1]
+
+def test_gap_longer_than_ring_resets_windows():
+    df = _frame(hours=100, gaps=False)
+    index = RollingKPIIndex.from_frame(df)
+    later = df['timestamp'].max() + pd.Timedelta(days=60)
+    index.add('L1', later, [50.0, 60.0, 70.0, 80.0])
+    assert index.stats('L1', '30d')['count'] == 1
+    assert index.stats('L2', '30d') is None
+
+def test_rows_older_than_the_ring_are_ignored():
+    df = _frame(hours=100, gaps=False)
+    index = RollingKPIIndex.from_frame(df)
+    before = index.stats('L1', '30d')['count']
+    assert index.add('L1', df['timestamp'].max() - pd.Timedelta(days=45), [50.0] * 4) is False
+    assert index.stats('L1', '30d')['count'] == before
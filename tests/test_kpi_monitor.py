@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from models.kpi_monitor import KPIMonitor, MONITORED_KPIS
+
+def _clean(hours=2000, lines=('L1', 'L2', 'L3'), seed=0):
+    """KPI stationnaires (bruit gaussien autour d'une moyenne fixe), sans aucun défaut"""
+    rng = np.random.default_rng(seed)
+    stamps = pd.date_range('2025-01-01', periods=hours, freq='h')
+    n = hours * len(lines)
+    frame = pd.DataFrame({'timestamp': np.repeat(stamps, len(lines)), 'line_id': list(lines) * hours})
+    for kpi, mean in (('oee', 80), ('availability', 88), ('performance', 90), ('quality', 96)):
+        frame[kpi] = rng.normal(mean, 3, n)
+    frame['machine_speed'] = rng.choice([900, 1000, 1200], n) + rng.normal(0, 50, n)
+    return frame
+
+def test_false_alarm_rate_on_clean_data_is_bounded():
+    monitor = KPIMonitor()
+    monitor.update_frame(_clean())
+    series_updates = monitor.updates * len(MONITORED_KPIS)
+    # Au plus une alerte pour 1 000 mises à jour (ligne × KPI) sur des données saines
+    assert monitor.opened / series_updates < 1e-3
+    assert 'machine_speed' not in {kpi for _, kpi in monitor._state}
+
+def test_sustained_drop_opens_one_critical_alert_then_closes():
+    clean = _clean(hours=300)
+    monitor = KPIMonitor()
+    monitor.update_frame(clean)
+    opened = monitor.opened
+    last = clean['timestamp'].max()
+    for i in range(6):
+        monitor.update('L2', last + pd.Timedelta(hours=i + 1), {'oee': 80, 'availability': 40, 'performance': 90, 'quality': 96})
+    alerts = [a for a in monitor.alerts('L2') if a['kpi'] == 'availability']
+    assert len(alerts) == 1 and monitor.opened == opened + 1
+    assert alerts[0]['severity'] == 'Critical' and alerts[0]['type'] == 'Availability_Drop'
+    assert alerts[0]['observations'] == 6 and alerts[0]['expected'] > 80
+    for i in range(6, 60):
+        monitor.update('L2', last + pd.Timedelta(hours=i + 1), {'oee': 80, 'availability': 88, 'performance': 90, 'quality': 96})
+    assert not [a for a in monitor.alerts('L2') if a['kpi'] == 'availability']
+
+def test_single_moderate_dip_needs_persistence():
+    monitor = KPIMonitor()
+    monitor.update_frame(_clean(hours=300))
+    opened = monitor.opened
+    baseline = monitor._state[('L1', 'quality')]
+    sigma = baseline[2] ** 0.5
+    # Écart de 4 σ : alerte « High », qui ne s'ouvre pas sur un point isolé
+    monitor.update('L1', '2030-01-01', {'quality': baseline[1] - 4 * sigma})
+    assert monitor.opened == opened
+
+def test_low_oee_floor_uses_smoothed_level():
+    frame = _clean(hours=300, lines=('L3',))
+    frame['oee'] -= 15
+    monitor = KPIMonitor()
+    monitor.update_frame(frame)
+    alerts = monitor.alerts('L3')
+    assert [a['type'] for a in alerts if a['kpi'] == 'oee'] == ['Low_OEE']
+    assert monitor.opened <= 2
+
+def test_floors_follow_each_line_baseline():
+    frame = _clean(hours=600, lines=('L1', 'L3'))
+    frame.loc[frame['line_id'] == 'L3', 'oee'] -= 11  # L3 tourne durablement vers 69 %
+    monitor = KPIMonitor.from_frame(frame)
+    assert monitor.floor('L1', 'oee') == 70.0 and 63 < monitor.floor('L3', 'oee') < 65
+    assert not [a for a in monitor.alerts() if a['type'] == 'Low_OEE']
+    assert KPIMonitor(floors={'oee': {'L3': 60.0}}).floor('L3', 'oee') == 60.0
+    # Seuil commun explicite : l'ancienne règle s'applique à toutes les lignes
+    strict = KPIMonitor.from_frame(frame, floors={'oee': 70.0})
+    assert [a['line_id'] for a in strict.alerts() if a['type'] == 'Low_OEE'] == ['L3']
@@ -0,0 +1,8 @@
+import pytest
+
+from models.predictor import OEEPredictor
+
+@pytest.mark.parametrize('days', [0, 91, 6993, True, '7'])
+def test_forecast_horizon_is_bounded(days):
+    with pytest.raises(ValueError):
+        OEEPredictor().predict_next_days(days)
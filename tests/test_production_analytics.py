@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from models.production_analytics import ProductionAnalytics
+
+def _stops(n, start='2025-01-01', seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'line_id': rng.choice(['L1', 'L2'], n), 'machine_id': rng.choice(['M1-1', 'M1-2'], n),
+        'stop_type': rng.choice(['Bourrage', 'Panne_Mecanique', 'Reglage'], n),
+        'start_time': pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, 72, n), unit='h'),
+        'duration_minutes': rng.integers(5, 120, n)
+    })
+
+def _oee(start='2025-01-01'):
+    stamps = pd.date_range(start, periods=72, freq='h')
+    return pd.DataFrame({'timestamp': np.repeat(stamps, 2), 'line_id': ['L1', 'L2'] * 72,
+                         'planned_production_time': 60, 'availability': 80.0})
+
+class FakeStore:
+    """Store minimal : `apply` ajoute un lot et incrémente la version, comme DataStore.apply_ingested"""
+    def __init__(self):
+        self.version = 1
+        self.tables = {'stops': _stops(200), 'quality': None, 'oee': _oee()}
+
+    def ensure_loaded(self):
+        return True
+
+    def snapshot(self, *tables):
+        return self.version, [self.tables[t] for t in tables]
+
+    def apply(self, kind, df):
+        self.tables[kind] = pd.concat([self.tables[kind], df], ignore_index=True)
+        self.version += 1
+        return self.version
+
+def _total(analytics):
+    return analytics.pareto(days=365)['total_minutes']
+
+def test_incremental_ingest_matches_rebuild():
+    store = FakeStore()
+    analytics = ProductionAnalytics().build(store)
+    for seed in (1, 2):
+        batch = _stops(50, seed=seed)
+        analytics.ingest('stops', batch, store.apply('stops', batch), store)
+    rebuilt = ProductionAnalytics().build(store)
+    assert analytics.version == store.version
+    assert analytics.pareto(days=365) == rebuilt.pareto(days=365)
+    assert analytics.reliability(days=365) == rebuilt.reliability(days=365)
+
+def test_batch_already_covered_by_build_is_not_counted_twice():
+    store = FakeStore()
+    analytics = ProductionAnalytics().build(store)
+    batch = _stops(50, seed=3)
+    version = store.apply('stops', batch)
+    # Une reconstruction s'intercale entre l'ajout au store et la notification
+    analytics.build(store)
+    analytics.ingest('stops', batch, version, store)
+    assert _total(analytics) == int(store.tables['stops']['duration_minutes'].sum())
+
+def test_version_gap_triggers_rebuild():
+    store = FakeStore()
+    analytics = ProductionAnalytics().build(store)
+    missed = _stops(30, seed=4)
+    store.apply('stops', missed)
+    batch = _stops(30, seed=5)
+    analytics.ingest('stops', batch, store.apply('stops', batch), store)
+    assert analytics.version == store.version
+    assert _total(analytics) == int(store.tables['stops']['duration_minutes'].sum())
+
+def test_ingest_with_new_categories_keeps_categorical_rollup():
+    store = FakeStore()
+    analytics = ProductionAnalytics().build(store)
+    batch = _stops(20, start='2025-01-03', seed=4).assign(machine_id='M9-1', stop_type='Nettoyage')
+    analytics.ingest('stops', batch, store.apply('stops', batch), store)
+    rebuilt = ProductionAnalytics().build(store)
+    assert analytics.pareto('machine_id', days=365) == rebuilt.pareto('machine_id', days=365)
+    assert isinstance(analytics.stops['machine_id'].dtype, pd.CategoricalDtype)
+    assert not analytics.stops.duplicated(['day', 'line_id', 'machine_id', 'stop_type']).any()
+
+@pytest.mark.parametrize('top', [0, -2, 1.5, True])
+def test_pareto_rejects_invalid_top(top):
+    analytics = ProductionAnalytics().build(FakeStore())
+    with pytest.raises(ValueError):
+        analytics.pareto(top=top)
+    assert len(analytics.pareto(days=365, top=1)['items']) == 1
@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+
+from models.result_cache import TTLCache
+
+def test_concurrent_misses_compute_once():
+    cache = TTLCache(maxsize=8, ttl=60)
+    calls = []
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return 42
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute))) for _ in range(10)]
+    for t in threads: t.start()
+    for t in threads: t.join(5)
+    assert results == [42] * 10 and len(calls) == 1
+    assert cache.stats()['coalesced'] >= 1
+
+def test_errors_are_shared_but_not_cached():
+    cache = TTLCache(maxsize=8, ttl=60)
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute('k', lambda: (_ for _ in ()).throw(RuntimeError('boom')))
+    assert cache.get_or_compute('k', lambda: 'ok') == 'ok'
+
+def test_ttl_and_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.set('a', 1); cache.set('b', 2); cache.set('c', 3)
+    assert cache.get('a') is None and cache.get('c') == 3
+    time.sleep(0.06)
+    assert cache.get('c') is None
+
+def test_follower_wait_is_bounded():
+    cache = TTLCache(maxsize=8, ttl=60)
+    started, release = threading.Event(), threading.Event()
+    def slow():
+        started.set()
+        release.wait(5)
+        return 1
+    leader = threading.Thread(target=cache.get_or_compute, args=('k', slow))
+    leader.start()
+    started.wait(5)
+    with pytest.raises(TimeoutError):
+        cache.get_or_compute('k', lambda: 2, timeout=0.05)
+    release.set()
+    leader.join(5)
+    assert cache.get('k') == 1
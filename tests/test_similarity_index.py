@@ -0,0 +1,33 @@
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from models.similarity_index import BruteForceIndex, InvertedIndex
+
+def _corpus(n=400, vocabulary=60, seed=0):
+    rng = np.random.default_rng(seed)
+    dense = rng.random((n, vocabulary)) * (rng.random((n, vocabulary)) < 0.08)
+    dense[:, 0] = rng.random(n) * 0.2 + 0.01  # terme présent partout, poids faible (idf bas)
+    return sparse.csr_matrix(normalize(dense))
+
+def test_exact_mode_matches_brute_force():
+    X = _corpus()
+    exact, brute = InvertedIndex(max_df=1.0), BruteForceIndex()
+    exact.add(X[:250]); exact.add(X[250:]); brute.add(X)
+    for i in range(0, 400, 37):
+        ids, scores = exact.search(X[i], k=5)
+        ref_ids, ref_scores = brute.search(X[i], k=5)
+        assert ids.tolist() == ref_ids.tolist() and np.allclose(scores, ref_scores)
+
+def test_very_common_terms_are_skipped_unless_alone():
+    X = _corpus()
+    index = InvertedIndex()
+    index.add(X)
+    query = X[3]
+    ids, _ = index.search(query, k=5)
+    assert index.skipped_terms == 1 and 3 in ids
+    # Requête faite uniquement de termes très fréquents : ils sont conservés
+    common = sparse.csr_matrix(([1.0], ([0], [0])), shape=(1, X.shape[1]))
+    ids, _ = index.search(common, k=5)
+    assert len(ids) == 5 and index.skipped_terms == 1
+    assert index.stats()['max_df'] == 0.5
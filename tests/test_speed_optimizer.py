@@ -0,0 +1,64 @@
+import pytest
+
+from models.speed_optimizer import SpeedOptimizer
+
+@pytest.mark.parametrize('step', [0, -5, 2.5, True])
+def test_invalid_step_is_rejected(step):
+    optimizer = SpeedOptimizer()
+    with pytest.raises(ValueError):
+        optimizer.find_optimal_speed('L1', 'Fond_Plat', step=step)
+    with pytest.raises(ValueError):
+        optimizer.optimize_all(step=step)
+
+def _trained(path, data_hash):
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(0)
+    n = 400
+    data = pd.DataFrame({'line_id': rng.choice(['L1', 'L2', 'L3'], n),
+                         'product_type': rng.choice(['Fond_Plat', 'Fond_Carre_Sans_Poignees'], n),
+                         'machine_speed': rng.uniform(600, 1400, n)})
+    data['total_pieces'] = data['machine_speed'] * 0.9
+    data['good_pieces'] = data['total_pieces'] * rng.uniform(0.9, 1.0, n)
+    optimizer = SpeedOptimizer()
+    optimizer.models_path = str(path)
+    optimizer.data_hash = data_hash
+    optimizer.train(data)
+    optimizer.save(data_hash)
+    return optimizer
+
+def _fresh(path):
+    optimizer = SpeedOptimizer()
+    optimizer.models_path = str(path)
+    return optimizer
+
+def test_response_surface_is_tied_to_data_hash(tmp_path):
+    _trained(tmp_path, 'aaa')
+    assert _fresh(tmp_path)._load_response_surface('aaa')
+    assert not _fresh(tmp_path)._load_response_surface('bbb')
+    # Manifeste à jour mais table d'une autre version des données : la table est recalculée
+    _trained(tmp_path / 'other', 'bbb')
+    (tmp_path / 'other' / 'speed_surface.npz').replace(tmp_path / 'speed_surface.npz')
+    optimizer = _fresh(tmp_path)
+    assert optimizer.load('aaa') and optimizer._load_response_surface('aaa')
+
+def test_fallback_ignores_stale_surface(tmp_path):
+    _trained(tmp_path, 'aaa')
+    optimizer = _fresh(tmp_path)
+    optimizer.data_hash = 'bbb'
+    assert optimizer.find_optimal_speed('L1', 'Fond_Plat') == {}
+    optimizer = _fresh(tmp_path)
+    optimizer.data_hash = 'aaa'
+    assert optimizer.find_optimal_speed('L1', 'Fond_Plat')['optimal_speed'] > 0
+
+@pytest.mark.parametrize('method,url,body', [
+    ('post', '/api/speed/optimize', {'step': True}), ('post', '/api/speed/optimize', {'step': '25'}),
+    ('post', '/api/speed/optimize', {'step': 2.5}), ('get', '/api/speed/optimize/all?step=abc', None),
+    ('get', '/api/speed/optimize/all?step=0', None), ('get', '/api/speed/optimize/all?step=true', None)
+])
+def test_routes_reject_invalid_steps(monkeypatch, method, url, body):
+    import app as app_module
+    monkeypatch.setitem(app_module._components, 'speed_optimizer', SpeedOptimizer())
+    client = app_module.app.test_client()
+    response = client.post(url, json=body) if method == 'post' else client.get(url)
+    assert response.status_code == 400 and 'pas' in response.json['error']
@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+from data.synthetic_generator import SyntheticEvoconGenerator
+
+def _generator():
+    return SyntheticEvoconGenerator(days=40, n_lines=4, start_date=pd.Timestamp('2025-01-06').to_pydatetime(), seed=7)
+
+@pytest.mark.parametrize('table', SyntheticEvoconGenerator.TABLES)
+def test_output_does_not_depend_on_chunk_size(table):
+    whole = _generator().generate(table)
+    assert len(whole) > 0
+    for chunk_days in (1, 7, 13):
+        chunked = pd.concat(list(_generator().iter_frames(table, chunk_days)), ignore_index=True)
+        pd.testing.assert_frame_equal(chunked, whole)
+
+def test_write_csv_matches_generate(tmp_path):
+    rows = _generator().write_csv(str(tmp_path), chunk_days=9)
+    stops = pd.read_csv(tmp_path / 'stops_data.csv')
+    expected = _generator().generate('stops_data')
+    assert rows['stops_data'] == len(expected)
+    assert stops['stop_id'].tolist() == expected['stop_id'].tolist()
+    assert stops['duration_minutes'].tolist() == expected['duration_minutes'].tolist()
+
+def test_seed_changes_output():
+    other = SyntheticEvoconGenerator(days=40, n_lines=4, start_date=pd.Timestamp('2025-01-06').to_pydatetime(), seed=8)
+    assert not other.generate('oee_data')['oee'].equals(_generator().generate('oee_data')['oee'])
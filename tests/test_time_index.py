@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.time_index import TimeIndex, serialize_columns
+from models.anomaly_expert import AnomalyExpert
+
+def _knowledge_base(n=25):
+    now = datetime.now()
+    # Dates volontairement désordonnées, avec des doublons
+    stamps = [now - timedelta(hours=(i * 7) % 13) for i in range(n)]
+    return pd.DataFrame({
+        'anomaly_id': np.arange(n), 'timestamp': stamps, 'line_id': ['L1', 'L2'] * (n // 2) + ['L1'] * (n % 2),
+        'machine_id': 'M1-1', 'symptom': 's', 'root_cause': 'c', 'solution_applied': 'x', 'priority': 'High', 'status': 'Resolu'
+    })
+
+def _expert(kb):
+    expert = AnomalyExpert(index_path='/nonexistent')
+    expert.knowledge_base = kb
+    return expert
+
+def test_positions_match_mask():
+    kb = _knowledge_base()
+    index = TimeIndex.from_frame(kb)
+    start, end = kb['timestamp'].min() + timedelta(hours=2), kb['timestamp'].max()
+    expected = kb.index[(kb['timestamp'] >= start) & (kb['timestamp'] < end)]
+    assert sorted(index.positions(start, end)) == sorted(expected)
+    line = kb.index[(kb['timestamp'] >= start) & (kb['timestamp'] < end) & (kb['line_id'] == 'L2')]
+    assert sorted(index.positions(start, end, 'L2')) == sorted(line)
+
+@pytest.mark.parametrize('limit', [1, 4, 7, 25, 100])
+def test_cursor_pagination_visits_every_row_once(limit):
+    expert = _expert(_knowledge_base())
+    seen, cursor = [], None
+    while True:
+        page = expert.page_recent_anomalies(days=1, limit=limit, cursor=cursor)
+        assert len(page['anomalies']) <= limit
+        seen += [a['id'] for a in page['anomalies']]
+        cursor = page['next_cursor']
+        if cursor is None: break
+    assert sorted(seen) == list(range(25))
+    dates = [expert.knowledge_base.loc[i, 'timestamp'] for i in seen]
+    assert dates == sorted(dates, reverse=True)
+
+def test_cursor_survives_new_rows():
+    kb = _knowledge_base()
+    expert = _expert(kb)
+    first = expert.page_recent_anomalies(days=1, limit=10)
+    newer = kb.iloc[:1].assign(anomaly_id=99, timestamp=datetime.now())
+    expert.knowledge_base = pd.concat([kb, newer], ignore_index=True)
+    rest = expert.page_recent_anomalies(days=1, limit=100, cursor=first['next_cursor'])
+    ids = [a['id'] for a in first['anomalies']] + [a['id'] for a in rest['anomalies']]
+    assert sorted(ids) == list(range(25))
+
+@pytest.mark.parametrize('limit', [0, -2])
+def test_non_positive_limit_is_rejected(limit):
+    with pytest.raises(ValueError):
+        _expert(_knowledge_base()).page_recent_anomalies(days=400, limit=limit)
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        _expert(_knowledge_base()).page_recent_anomalies(limit=5, cursor='abc')
+
+def test_serialized_missing_values_are_null():
+    df = pd.DataFrame({'x': [1.5, np.nan], 't': pd.to_datetime(['2025-01-01', None]),
+                       'c': pd.Categorical(['a', None])})
+    assert serialize_columns(df) == {'x': [1.5, None], 't': ['2025-01-01T00:00:00', None], 'c': ['a', None]}
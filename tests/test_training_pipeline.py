@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from models.training_pipeline import TrainingPipeline, learn_blend_weights, rolling_origin_splits
+
+SMALL = {
+    'rf': [{'n_estimators': 5, 'max_depth': 4, 'random_state': 0}],
+    'gb': [{'n_estimators': 10, 'max_depth': 2, 'random_state': 0}, {'n_estimators': 20, 'max_depth': 3, 'random_state': 0}]
+}
+
+def test_rolling_origin_splits_never_look_ahead():
+    stamps = pd.date_range('2025-01-01', periods=1000, freq='h').to_numpy()[np.random.default_rng(0).permutation(1000)]
+    splits = rolling_origin_splits(stamps, n_folds=4, min_train_fraction=0.5)
+    assert len(splits) == 4
+    validated = np.concatenate([v for _, v in splits])
+    assert len(validated) == len(set(validated))
+    for train_idx, val_idx in splits:
+        assert stamps[train_idx].max() < stamps[val_idx].min()
+    # Les plis de validation couvrent la seconde moitié de l'historique, jusqu'au dernier point
+    assert len(validated) >= 499 and stamps.argmax() in validated
+
+def test_blend_weights_are_convex_and_recover_mixture():
+    rng = np.random.default_rng(1)
+    a, b, c = rng.normal(size=(3, 500))
+    weights = learn_blend_weights([a, b, c], 0.7 * a + 0.3 * b)
+    np.testing.assert_allclose(weights, [0.7, 0.3, 0.0], atol=1e-6)
+    assert np.isclose(weights.sum(), 1)
+    # Aucun modèle utile : poids uniformes
+    np.testing.assert_allclose(learn_blend_weights([a, b], -(a + b)), [0.5, 0.5])
+
+def test_pipeline_selects_blends_and_refits_for_serving():
+    rng = np.random.default_rng(2)
+    X = rng.normal(size=(600, 4))
+    y = 3 * X[:, 0] + np.sin(X[:, 1]) + rng.normal(0, 0.1, 600)
+    stamps = pd.date_range('2025-01-01', periods=600, freq='h')
+    models, weights, report = TrainingPipeline(SMALL, n_folds=3, max_workers=1).run(X, y, stamps)
+    assert set(models) == {'rf', 'gb'} and np.isclose(sum(weights), 1)
+    assert report['folds'] == 3 and len(report['candidates']['gb']) == 2
+    assert report['selected']['gb'] in SMALL['gb']
+    assert models['rf'].n_jobs == -1
+    assert report['held_out_fold'] and report['selection_mae'] > 0 and report['cv_mae'] > 0
+
+def test_pipeline_runs_serially_without_process_pool(monkeypatch):
+    import models.training_pipeline as tp
+    def unavailable(*args, **kwargs):
+        raise OSError('pas de /dev/shm')
+    monkeypatch.setattr(tp, 'ProcessPoolExecutor', unavailable)
+    rng = np.random.default_rng(3)
+    X = rng.normal(size=(300, 3))
+    models, _, report = TrainingPipeline(SMALL, n_folds=2, max_workers=4).run(X, X[:, 0], pd.date_range('2025-01-01', periods=300, freq='h'))
+    assert set(models) == {'rf', 'gb'} and report['workers'] == 4
@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+
+from models.predictor import OEEPredictor
+from models.tree_compiler import CompiledEnsemble, compile_ensemble
+
+@pytest.fixture(scope='module')
+def ensemble():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 6))
+    y = 70 + 5 * X[:, 0] - 3 * X[:, 1] ** 2 + rng.normal(0, 1, 400)
+    rf = RandomForestRegressor(n_estimators=15, max_depth=6, random_state=0).fit(X, y)
+    gb = GradientBoostingRegressor(n_estimators=30, max_depth=3, random_state=0).fit(X, y)
+    return {'rf': rf, 'gb': gb, 'weights': [0.65, 0.35]}, rng.normal(size=(200, 6))
+
+def test_compiled_matches_sklearn(ensemble, tmp_path):
+    model, X = ensemble
+    expected = 0.65 * model['rf'].predict(X) + 0.35 * model['gb'].predict(X)
+    compiled = compile_ensemble(model)
+    np.testing.assert_allclose(compiled.predict(X), expected, rtol=0, atol=1e-9)
+    compiled.save(str(tmp_path), 'a' * 40)
+    np.testing.assert_allclose(CompiledEnsemble.load(str(tmp_path)).predict(X), expected, rtol=0, atol=1e-9)
+
+def test_compiled_export_is_keyed_on_model_hash(ensemble, tmp_path):
+    model, _ = ensemble
+    predictor = OEEPredictor()
+    predictor.models_path = str(tmp_path)
+    predictor._install(dict(model, trained_until=None), predictor.scaler, ['f'] * 6)
+    paths = predictor._artifact_paths()
+    args = (paths['model'], paths['scaler'], paths['features'])
+    assert predictor._load_compiled(*args)
+
+    # Nouveau pickle de même taille (un octet modifié, date de modification différente) : l'export n'est plus servi
+    m_path = paths['model']
+    data = bytearray(open(m_path, 'rb').read())
+    data[-2] ^= 0xFF
+    open(m_path, 'wb').write(bytes(data))
+    stat = os.stat(m_path)
+    os.utime(m_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert not predictor._load_compiled(*args)
+
+def test_unchanged_pickle_is_not_rehashed(ensemble, tmp_path, monkeypatch):
+    model, _ = ensemble
+    predictor = OEEPredictor()
+    predictor.models_path = str(tmp_path)
+    predictor._install(dict(model, trained_until=None), predictor.scaler, ['f'] * 6)
+    version = predictor.model_version
+    monkeypatch.setattr(OEEPredictor, '_artifact_hash', lambda self, path=None: pytest.fail('pickle relu'))
+    fresh = OEEPredictor()
+    fresh.models_path = str(tmp_path)
+    assert fresh._load_model() and fresh.model_version == version and 'compiled' in fresh.model
+
+def test_install_swaps_a_single_pointer(ensemble, tmp_path):
+    model, _ = ensemble
+    predictor = OEEPredictor()
+    predictor.models_path = str(tmp_path)
+    directories = []
+    for _ in range(3):
+        predictor._install(dict(model, trained_until=None), predictor.scaler, ['f'] * 6)
+        directories.append(predictor._artifact_dir())
+    assert len(set(directories)) == 3
+    # Version courante et précédente conservées, les plus anciennes supprimées
+    assert [os.path.isdir(d) for d in directories] == [False, True, True]
+    assert sorted(os.listdir(directories[-1])) == ['features.pkl', 'oee_model.pkl', 'scaler.pkl']